@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Load test for a pipeline configuration: replays a corpus of user utterances against the
+pipeline from a `conf/*.yaml` file and reports throughput, latency percentiles, peak memory
+and a per-component time breakdown.
+
+Two modes are supported:
+ - closed loop (default): `--concurrency` simulated users, each sends its next utterance
+   as soon as it gets the previous reply
+ - open loop: utterances arrive at the given `--rate` per second (Poisson arrivals),
+   regardless of how fast the pipeline replies; latency includes the time spent waiting
+   in the queue
+
+The turns run through `dialmonkey.session.SessionManager`, i.e. the same way as with the
+HTTP and Telegram front-ends. Each simulated user session gets `--dialogue-length` turns.
+
+Results can be saved as JSON (`--output`) and compared to a previous run (`--compare`):
+
+    ./benchmarks/load.py --conf conf/hw03.yaml --corpus hw03/examples.tsv -c 8 -o new.json --compare old.json
+"""
+
+import argparse
+import io
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# add the main project path to import path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dialmonkey.component import Component  # noqa: E402
+from dialmonkey.conversation_handler import ConversationHandler  # noqa: E402
+from dialmonkey.input.text import _iter_json_array, _open_binary, _strip_compression  # noqa: E402
+from dialmonkey.session import SessionManager  # noqa: E402
+from dialmonkey.utils import load_conf  # noqa: E402
+
+
+def load_corpus(path):
+    """
+    Loads user utterances from a corpus file:
+     - TSV (e.g. `hw03/examples.tsv`, `data/solar-expressions.tsv`): the first column
+     - JSON list or JSON lines (e.g. `nlu_test_data.json`, DSTC2 data): the 'usr' key
+     - any other file: one utterance per line
+    Compressed (.gz, .xz) files are supported.
+    :return: list of utterances
+    """
+    name = _strip_compression(path)
+    stream, raw = _open_binary(path)
+    with raw, io.TextIOWrapper(stream, encoding='UTF-8') as text:
+        if name.endswith('.json'):
+            utterances = [item['usr'] for item in _iter_json_array(text) if 'usr' in item]
+        elif name.endswith('.jsonl'):
+            utterances = [json.loads(line)['usr'] for line in text if line.strip()]
+        elif name.endswith('.tsv'):
+            utterances = [line.split('\t')[0] for line in text if line.strip()]
+        else:
+            utterances = [line for line in text if line.strip()]
+    return [u.strip().lower() for u in utterances]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(times):
+    times = sorted(times)
+    if not times:
+        return {'count': 0}
+    return {'count': len(times), 'mean': sum(times) / len(times), 'p50': percentile(times, 50),
+            'p95': percentile(times, 95), 'p99': percentile(times, 99), 'max': times[-1]}
+
+
+class TimedComponent(Component):
+    """Wraps a pipeline component and records the duration of each of its calls."""
+
+    def __init__(self, component):
+        super(TimedComponent, self).__init__(component.config)
+        self.component = component
+        self.name = type(component).__module__ + '.' + type(component).__name__
+        self.times = []  # list.append is atomic, no lock needed
+
+    def init_dialogue(self, dial):
+        return self.component.init_dialogue(dial)
+
+    def __call__(self, dial, logger):
+        start = time.perf_counter()
+        try:
+            return self.component(dial, logger)
+        finally:
+            self.times.append(time.perf_counter() - start)
+
+    def reset(self):
+        return self.component.reset()
+
+
+class LoadTest:
+
+    def __init__(self, handler, utterances, dialogue_length=5, seed=42):
+        self.handler = handler
+        self.utterances = utterances
+        self.dialogue_length = dialogue_length
+        self.random = random.Random(seed)
+        self.timed = [TimedComponent(c) for c in handler.components]
+        handler.components = self.timed
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def _sessions(self, turns):
+        """Splits the first `turns` utterances (cycling the corpus) into user sessions."""
+        stream = itertools.islice(itertools.cycle(self.utterances), turns)
+        session = 0
+        while True:
+            chunk = list(itertools.islice(stream, self.dialogue_length))
+            if not chunk:
+                return
+            yield session, chunk
+            session += 1
+
+    def _record(self, start, future):
+        latency = time.perf_counter() - start
+        with self._lock:
+            if future.exception() is not None:
+                self.errors += 1
+            else:
+                self.latencies.append(latency)
+
+    def run_closed(self, turns, concurrency):
+        sessions = SessionManager(self.handler, concurrency)
+        queue = self._sessions(turns)
+        queue_lock = threading.Lock()
+
+        def user():
+            while True:
+                with queue_lock:
+                    session = next(queue, None)
+                if session is None:
+                    return
+                session_id, chunk = session
+                for utterance in chunk:
+                    start = time.perf_counter()
+                    future = sessions.submit(session_id, utterance)
+                    future.add_done_callback(lambda f, start=start: self._record(start, f))
+                    try:
+                        future.result()
+                    except Exception:
+                        pass
+                sessions.end_session(session_id)
+
+        users = [threading.Thread(target=user) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        sessions.close()
+        return time.perf_counter() - start
+
+    @staticmethod
+    def _interleave(active, drain=False):
+        """Takes turns round-robin from the active sessions until one of them (or all, if
+        `drain` is set) runs out; finished sessions are removed from `active`."""
+        turns = []
+        while active:
+            for session in active:
+                turns.append(session.pop(0))
+            running = [session for session in active if session]
+            finished = len(running) < len(active)
+            active[:] = running
+            if finished and not drain:
+                break
+        return turns
+
+    def run_open(self, turns, rate, concurrency):
+        """Sends turns at Poisson arrival times; users interleave their sessions, so that
+        about `concurrency` sessions are active at any time."""
+        sessions = SessionManager(self.handler, concurrency)
+        schedule = []
+        active = []
+        for session_id, chunk in self._sessions(turns):
+            active.append([(session_id, u) for u in chunk])
+            if len(active) == concurrency:
+                schedule.extend(self._interleave(active))
+        schedule.extend(self._interleave(active, drain=True))
+
+        start = time.perf_counter()
+        arrival = start
+        futures = []
+        for session_id, utterance in schedule:
+            arrival += self.random.expovariate(rate)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            # latency counts from the planned arrival, not the (possibly late) submission
+            future = sessions.submit(session_id, utterance)
+            future.add_done_callback(lambda f, arrival=arrival: self._record(arrival, f))
+            futures.append(future)
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+        sessions.close()
+        return time.perf_counter() - start
+
+    def results(self, wall_time):
+        return {
+            'turns': len(self.latencies) + self.errors,
+            'errors': self.errors,
+            'wall_time': wall_time,
+            'throughput': len(self.latencies) / wall_time if wall_time else None,
+            'latency': summarize(self.latencies),
+            'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+            'components': {c.name: dict(summarize(c.times), total=sum(c.times)) for c in self.timed},
+        }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(old, new):
+    """Prints a table of all numeric metrics of two runs with relative changes."""
+    old, new = _flatten(old), _flatten(new)
+    print('%-60s %12s %12s %8s' % ('metric', 'old', 'new', 'change'))
+    for key in sorted(set(old) | set(new)):
+        if key.startswith('settings.'):
+            continue
+        a, b = old.get(key), new.get(key)
+        change = '%+.1f%%' % (100.0 * (b - a) / a) if a and b is not None else ''
+        print('%-60s %12s %12s %8s' % (key, '%.4g' % a if a is not None else '-',
+                                       '%.4g' % b if b is not None else '-', change))
+
+
+def main(args):
+    conf = load_conf(args.conf)
+    # only the components are used; the configured streams could e.g. truncate an output file
+    for key in ('user_stream_type', 'output_stream_type', 'special_stream_type', 'input_file', 'output_file'):
+        conf.pop(key, None)
+    utterances = []
+    for corpus in args.corpus:
+        utterances.extend(load_corpus(corpus))
+    if not utterances:
+        print('No utterances found in the corpus.')
+        return
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    logger = logging.getLogger('dialmonkey-load')
+    logger.setLevel(logging.ERROR)
+    handler = ConversationHandler(conf, logger)
+    test = LoadTest(handler, utterances, args.dialogue_length, args.seed)
+    turns = args.turns or len(utterances)
+
+    for _ in range(args.warmup):
+        test.handler.get_response(handler.new_dialogue(), utterances[0])
+    for component in test.timed:
+        component.times.clear()
+
+    if args.rate:
+        wall_time = test.run_open(turns, args.rate, args.concurrency)
+    else:
+        wall_time = test.run_closed(turns, args.concurrency)
+
+    results = {
+        'settings': {'conf': args.conf, 'corpus': args.corpus, 'turns': turns, 'concurrency': args.concurrency,
+                     'rate': args.rate, 'dialogue_length': args.dialogue_length, 'seed': args.seed},
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    results.update(test.results(wall_time))
+
+    latency = results['latency']
+    print('Turns: %d (errors: %d), wall time %.2fs, throughput %.1f turns/s' %
+          (results['turns'], results['errors'], wall_time, results['throughput'] or 0))
+    if latency['count']:
+        print('Latency: mean %.2fms, p50 %.2fms, p95 %.2fms, p99 %.2fms, max %.2fms' %
+              tuple(1000 * latency[k] for k in ['mean', 'p50', 'p95', 'p99', 'max']))
+    if results['peak_rss_kb'] is not None:
+        print('Peak RSS: %.1f MB' % (results['peak_rss_kb'] / 1024))
+    for name, stats in results['components'].items():
+        if stats['count']:
+            print('  %-55s total %8.3fs, mean %.3fms, p95 %.3fms' %
+                  (name, stats['total'], 1000 * stats['mean'], 1000 * stats['p95']))
+
+    if args.output:
+        with open(args.output, 'wt') as fd:
+            json.dump(results, fd, indent=4)
+    if args.compare:
+        with open(args.compare, 'rt') as fd:
+            compare(json.load(fd), results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a corpus against a pipeline and measure its performance')
+    parser.add_argument('--conf', type=str, required=True, help='Path to YAML configuration file')
+    parser.add_argument('--corpus', type=str, nargs='+', required=True,
+                        help='Corpus files (TSV, JSON/JSONL with the "usr" key, or plain text)')
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help='Number of simultaneous users')
+    parser.add_argument('-r', '--rate', type=float, help='Open-loop arrival rate (turns per second)')
+    parser.add_argument('-n', '--turns', type=int, help='Number of turns (default: corpus size)')
+    parser.add_argument('-l', '--dialogue-length', type=int, default=5, help='Turns per user session')
+    parser.add_argument('--warmup', type=int, default=10, help='Untimed warm-up turns')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('-o', '--output', type=str, help='Save the results as JSON')
+    parser.add_argument('--compare', type=str, help='Compare with results of a previous run (JSON)')
+    main(parser.parse_args())
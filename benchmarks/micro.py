@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of functions that show up in profiles. Each case times one function in
+isolation on a fixed batch of inputs generated from a fixed seed, so that runs are comparable.
+
+Timings are compared to a stored baseline (`benchmarks/baseline.json` by default) and the
+script exits with a non-zero status if any case got slower than the baseline by more than
+`--threshold` and, so that noise in sub-millisecond cases is not reported, by more than
+`--min-delta` seconds per batch. Baselines are machine-specific -- regenerate them with `--save-baseline`
+on the machine used for the comparison (e.g. before starting a change).
+
+    ./benchmarks/micro.py                      # run all cases, compare to the baseline
+    ./benchmarks/micro.py -k da. -k dst.        # run selected cases only
+    ./benchmarks/micro.py --save-baseline      # store the current timings as the baseline
+
+Cases whose dependencies cannot be loaded (e.g. data files not checked out from Git LFS)
+are skipped and listed at the end of the output; with `--strict`, skipped cases are an error.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from collections import OrderedDict
+
+# add the main project path to import path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dialmonkey.da import DA, DAI  # noqa: E402
+from dialmonkey.dialogue import Dialogue  # noqa: E402
+
+SEED = 1234
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SOLAR_EXPRESSIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'solar-expressions.tsv')
+
+CASES = OrderedDict()
+_logger = logging.getLogger('dialmonkey-micro')
+_logger.setLevel(logging.ERROR)
+
+
+def case(name):
+    """Registers a benchmark case. The decorated function gets a seeded `random.Random`,
+    prepares its inputs and returns a function without arguments that runs one batch."""
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+_WORDS = ['chci', 'jet', 'z', 'do', 'na', 've', 'k', 'um', 'erm', 'zítra', 'ráno', 'večer', 'autobusem',
+          'tramvají', 'metrem', 'prosím', 'odkud', 'kam', 'přestup', 'jaké', 'bude', 'počasí', 'i\'m',
+          'ze', 'ku', 'hlavní', 'nádraží', 'náměstí', 'míru', '5', '12', '30']
+
+
+def _utterances(rnd, count, length):
+    return [' '.join(rnd.choice(_WORDS) for _ in range(rnd.randint(length // 2, length))) for _ in range(count)]
+
+
+@case('token_list.phrase_pos')
+def token_list_phrase_pos(rnd):
+    from dialmonkey.nlu.public_transport_cs.string_func import TokenList
+    utts = [TokenList(u) for u in _utterances(rnd, 200, 20)]
+    phrases = [[rnd.choice(_WORDS) for _ in range(rnd.randint(1, 3))] for _ in range(20)]
+
+    def run():
+        for utt in utts:
+            for phrase in phrases:
+                utt.phrase_pos(phrase)
+    return run
+
+
+@case('token_list.replace_all')
+def token_list_replace_all(rnd):
+    from dialmonkey.nlu.public_transport_cs.string_func import TokenList
+    utts = [TokenList(u) for u in _utterances(rnd, 200, 20)]
+    replacements = [([rnd.choice(_WORDS) for _ in range(rnd.randint(1, 2))], ['X']) for _ in range(20)]
+
+    def run():
+        for utt in utts:
+            for orig, repl in replacements:
+                utt.replace_all(orig, repl)
+    return run
+
+
+@case('preprocessing.normalize')
+def preprocessing_normalize(rnd):
+    from dialmonkey.nlu.public_transport_cs.preprocessing import Preprocessing
+    from dialmonkey.nlu.public_transport_cs.string_func import TokenList
+    preprocessing = Preprocessing(None)
+    utts = [TokenList(u) for u in _utterances(rnd, 100, 20)]
+
+    def run():
+        for utt in utts:
+            preprocessing.normalize(utt)
+    return run
+
+
+@case('public_transport_cs.abstract_utterance')
+def public_transport_abstract_utterance(rnd):
+    from dialmonkey.nlu.public_transport_cs import PublicTransportCSNLU
+    from dialmonkey.nlu.public_transport_cs.string_func import TokenList
+    nlu = PublicTransportCSNLU({})
+    forms = sorted(nlu.cldb.form2value2cl.keys())
+    utts = []
+    for utt in _utterances(rnd, 50, 10):
+        tokens = utt.split()
+        for _ in range(3):  # insert a few database entries into each utterance
+            tokens[rnd.randrange(len(tokens)):0] = list(rnd.choice(forms))
+        utts.append(nlu.preprocessing.normalize(TokenList(tokens)))
+
+    def run():
+        for utt in utts:
+            nlu.abstract_utterance(utt)
+    return run
+
+
+_INTENTS = ['inform', 'request', 'confirm', 'deny', 'affirm', 'negate']
+_SLOTS = ['food', 'area', 'pricerange', 'name', 'phone', 'addr', 'postcode']
+_VALUES = ['north', 'south', 'cheap', 'expensive', 'italian', 'chinese', 'dontcare', '"the golden house"']
+
+
+def _random_da(rnd, max_dais=5):
+    dais = []
+    for _ in range(rnd.randint(1, max_dais)):
+        intent, slot = rnd.choice(_INTENTS), rnd.choice(_SLOTS)
+        dais.append('%s(%s=%s)' % (intent, slot, rnd.choice(_VALUES)) if intent != 'request'
+                    else '%s(%s)' % (intent, slot))
+    return '&'.join(dais)
+
+
+@case('da.parse_cambridge_da')
+def da_parse_cambridge_da(rnd):
+    texts = [_random_da(rnd) for _ in range(500)]
+
+    def run():
+        for text in texts:
+            DA.parse_cambridge_da(text)
+    return run
+
+
+@case('da.merge_duplicate_dais')
+def da_merge_duplicate_dais(rnd):
+    dais = [[(rnd.choice(_INTENTS[:2]), rnd.choice(_SLOTS[:3]), rnd.choice(_VALUES[:3]), rnd.random())
+             for _ in range(20)] for _ in range(100)]
+
+    def run():
+        for da in dais:  # merging works in place, so the DAs are rebuilt in each batch
+            DA([DAI(*dai) for dai in da]).merge_duplicate_dais()
+    return run
+
+
+class _SolarRepository:
+    """Fixed list of bodies, so that the Solar System NLU does not need the network."""
+
+    NAMES = ['Sun', 'Mercury', 'Venus', 'Earth', 'Moon', 'Mars', 'Phobos', 'Deimos', 'Jupiter', 'Io', 'Europa',
+             'Ganymede', 'Callisto', 'Saturn', 'Titan', 'Enceladus', 'Uranus', 'Neptune', 'Triton', 'Pluto']
+
+    def bodies(self):
+        return [dict(englishName=name, isPlanet=name in ['Mercury', 'Venus', 'Earth', 'Mars', 'Jupiter',
+                                                         'Saturn', 'Uranus', 'Neptune'])
+                for name in self.NAMES]
+
+
+@case('solar_nlu._evaluate')
+def solar_nlu_evaluate(rnd):
+    from dialmonkey.nlu.solar.parser import SolarSystemNLU
+    nlu = SolarSystemNLU(repo=_SolarRepository())
+    with open(SOLAR_EXPRESSIONS, 'rt', encoding='UTF-8') as fd:
+        templates = [line.split('\t')[0] for line in fd if line.strip()]
+    utts = []
+    for _ in range(200):
+        utt = rnd.choice(templates)
+        while '<object>' in utt:
+            utt = utt.replace('<object>', rnd.choice(_SolarRepository.NAMES).lower(), 1)
+        utts.append(utt)
+
+    def run():
+        for utt in utts:
+            nlu._evaluate(utt, _logger)
+    return run
+
+
+@case('solar_nlg.lookup')
+def solar_nlg_lookup(rnd):
+    from dialmonkey.nlg import solar
+    nlg = solar.SolarNLG()
+    templates = solar.read_templates(os.path.join(os.path.dirname(solar.__file__), '..', 'data',
+                                                  'solar-nlg-templates.yaml'))
+    keys = sorted(set(key for key, _ in templates))
+    das = []
+    for _ in range(200):
+        da = DA.parse_cambridge_da(rnd.choice(keys))
+        for dai in da:
+            if solar.is_placeholder(dai.value):
+                dai.value = rnd.choice(_SolarRepository.NAMES)
+        das.append(da)
+
+    def run():
+        random.seed(SEED)  # templates are chosen randomly
+        for da in das:
+            nlg._nlg(da)
+    return run
+
+
+@case('ir_agent.__call__')
+def ir_agent_call(rnd):
+    from dialmonkey.policy.ir_kulhanek import IrAgent
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    # same as IrAgent._initialize, but trained on generated dialogues instead of DailyDialog
+    agent = IrAgent.__new__(IrAgent)
+    super(IrAgent, agent).__init__()
+    dialogues = [[' '.join(rnd.choice(_WORDS) for _ in range(8)) for _ in range(6)] for _ in range(2000)]
+    keys = [key for dial in dialogues for key in dial[:-1]]
+    agent._values = [value for dial in dialogues for value in dial[1:]]
+    agent.vectorizer = TfidfVectorizer(ngram_range=(1, 3))
+    agent._keys_mat = agent.vectorizer.fit_transform(keys)
+    utts = _utterances(rnd, 20, 10)
+    dial = Dialogue()
+
+    def run():
+        random.seed(SEED)
+        for utt in utts:
+            dial.user = utt
+            agent(dial, _logger)
+    return run
+
+
+@case('dst.rule.__call__')
+def dst_rule_call(rnd):
+    from dialmonkey.dst.rule import DST
+    dst = DST()
+    turns = []
+    for _ in range(20):
+        das = []
+        for _ in range(rnd.randint(1, 4)):
+            das.append(DAI('inform', rnd.choice(_SLOTS), rnd.choice(_VALUES), rnd.random() / 4))
+        turns.append(DA(das))
+
+    def run():
+        dial = Dialogue()
+        for da in turns:
+            dial.nlu = da
+            dst(dial, _logger)
+    return run
+
+
+def measure(run, min_time=0.2, repeat=5):
+    """
+    Times the given function, like `timeit`: calibrates the number of calls so that
+    one measurement takes at least `min_time` and returns the best of `repeat` measurements.
+    :return: seconds per call
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / elapsed))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def run_cases(patterns=None, min_time=0.2, repeat=5):
+    """
+    Runs all cases whose names contain any of the given patterns.
+    :return: tuple (dict case name -> seconds per batch, dict case name -> reason for skipping)
+    """
+    results, skipped = OrderedDict(), OrderedDict()
+    for name, setup in CASES.items():
+        if patterns and not any(p in name for p in patterns):
+            continue
+        try:
+            run = setup(random.Random(SEED))
+        except (ImportError, OSError, ValueError) as e:
+            skipped[name] = '%s: %s' % (type(e).__name__, e)
+            continue
+        results[name] = measure(run, min_time, repeat)
+    return results, skipped
+
+
+def main(args):
+    results, skipped = run_cases(args.case, args.min_time, args.repeat)
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'rt') as fd:
+            baseline = json.load(fd)['cases']
+
+    regressions = []
+    print('%-42s %12s %12s %8s' % ('case', 'baseline', 'current', 'change'))
+    for name, seconds in results.items():
+        old = baseline.get(name)
+        change = (seconds - old) / old if old else None
+        flag = ''
+        if change is not None and change > args.threshold and seconds - old > args.min_delta:
+            flag = '  <-- REGRESSION'
+            regressions.append(name)
+        print('%-42s %12s %10.3fms %8s%s' % (name, '%10.3fms' % (1000 * old) if old else '-', 1000 * seconds,
+                                             '%+.1f%%' % (100 * change) if change is not None else 'new', flag))
+    for name, reason in skipped.items():
+        print('%-42s skipped (%s)' % (name, reason))
+
+    if args.save_baseline:
+        stored = {}
+        if os.path.exists(args.baseline):  # keep the cases that were not run this time
+            with open(args.baseline, 'rt') as fd:
+                stored = json.load(fd)['cases']
+        stored.update(results)
+        with open(args.baseline, 'wt') as fd:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'cases': stored}, fd, indent=4)
+        print('Baseline saved to %s' % args.baseline)
+
+    if skipped:
+        print('\nWARNING: %d case(s) were skipped, their timings were not checked: %s' %
+              (len(skipped), ', '.join(skipped)))
+        print('(data files stored in Git LFS may be missing -- run `git lfs pull`)')
+    if regressions:
+        print('\n%d case(s) are more than %.0f%% and %.3fms slower than the baseline: %s' %
+              (len(regressions), 100 * args.threshold, 1000 * args.min_delta, ', '.join(regressions)))
+    if regressions or (skipped and args.strict):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run micro-benchmarks and compare them to a stored baseline')
+    parser.add_argument('-k', '--case', type=str, action='append',
+                        help='Run only the cases whose names contain this (can be repeated)')
+    parser.add_argument('-b', '--baseline', type=str, default=DEFAULT_BASELINE, help='Baseline file (JSON)')
+    parser.add_argument('-t', '--threshold', type=float, default=0.25,
+                        help='Allowed slowdown relative to the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-delta', type=float, default=0.001,
+                        help='Allowed absolute slowdown (s per batch), whatever the relative one')
+    parser.add_argument('--strict', action='store_true', help='Fail if any of the selected cases was skipped')
+    parser.add_argument('--save-baseline', action='store_true', help='Store the current timings as the baseline')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum duration of one measurement (s)')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measurements, the best one is used')
+    main(parser.parse_args())
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Measures the throughput of an NLU component (by default the hw03 rule-based one) on the
+utterances of a TSV file (first column), plus random word sequences made of the same
+vocabulary, most of which match no rule and so go through the whole rule table.
+"""
+
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+# add the main project path to import path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dialmonkey.dialogue import Dialogue  # noqa: E402
+from dialmonkey.utils import dynload_class  # noqa: E402
+
+PROJECT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def throughput(component, inputs, repeat):
+    logger = logging.getLogger('benchmark')
+    logger.setLevel(logging.WARNING)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for x in inputs:
+            dial = Dialogue()
+            dial.user = x
+            component(dial, logger)
+    return repeat * len(inputs) / (time.perf_counter() - start)
+
+
+def main(args):
+    with open(args.data, 'rt', encoding='UTF-8') as fd:
+        utterances = [line.split('\t')[0] for line in fd if line.strip()]
+    rnd = random.Random(args.seed)
+    words = ' '.join(utterances).split()
+    noise = [' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 15))) for _ in range(args.random)]
+
+    component = dynload_class(args.component)(None)
+    for name, inputs in [(os.path.basename(args.data), utterances), ('random', noise)]:
+        per_second = throughput(component, inputs, args.repeat)
+        print('%-16s %10.0f utt/s %8.1fus/utt' % (name, per_second, 1e6 / per_second))
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Benchmark the throughput of an NLU component')
+    argparser.add_argument('-c', '--component', default='dialmonkey.nlu.hw03RuleBased.RuleBased',
+                           help='NLU component class')
+    argparser.add_argument('-d', '--data', default=os.path.join(PROJECT, 'hw03', 'examples.tsv'),
+                           help='TSV file with utterances in the first column')
+    argparser.add_argument('-r', '--repeat', type=int, default=200, help='Number of passes over the data')
+    argparser.add_argument('--random', type=int, default=1000, help='Number of random inputs')
+    argparser.add_argument('--seed', type=int, default=42, help='Random seed')
+    main(argparser.parse_args())
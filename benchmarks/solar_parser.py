@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Compares the rule-by-rule (`Sequential`) and the compiled single-pass (`Compiled`) versions
+of the Solar System NLU parser on `data/solar-expressions.tsv`, plus random word sequences
+made of the same vocabulary (most of which match no rule or one of the last rules).
+
+Also compares the two object tokenizers (regex alternation and word trie) with growing numbers
+of (generated) body names: the regex is faster for small catalogues, the trie for large ones,
+where its latency does not grow with the size of the catalogue (see `parser.TRIE_MIN_NAMES`).
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# add the main project path to import path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dialmonkey.nlu.solar import parser  # noqa: E402
+
+EXPRESSIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'solar-expressions.tsv')
+
+
+def main(args):
+    with open(EXPRESSIONS, 'rt', encoding='UTF-8') as fd:
+        expressions = [parser.simplify(line.split('\t')[0]) for line in fd if line.strip()]
+    rnd = random.Random(args.seed)
+    words = ' '.join(expressions).split()
+    noise = [' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 15))) for _ in range(args.random)]
+
+    sequential = parser.build_parser(compiled=False)
+    compiled = parser.build_parser(compiled=True)
+    for name, inputs in [('solar-expressions.tsv', expressions), ('random', noise)]:
+        mismatches = [x for x in inputs if sequential(x) != compiled(x)]
+        if mismatches:
+            print('Outputs differ for %d inputs, e.g. "%s"' % (len(mismatches), mismatches[0]))
+            sys.exit(1)
+        times = []
+        for parse in [sequential, compiled]:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for x in inputs:
+                    parse(x)
+            times.append((time.perf_counter() - start) / (args.repeat * len(inputs)))
+        print('%-22s sequential %8.1fus/utt, compiled %8.1fus/utt, speedup %.1fx' %
+              (name, 1e6 * times[0], 1e6 * times[1], times[0] / times[1]))
+    benchmark_tokenize(args, expressions)
+
+
+class _GeneratedRepository:
+    """Real planet names plus generated minor-body-like names (e.g. "2004 xr190 gubo")."""
+
+    def __init__(self, count, rnd):
+        planets = ['Mercury', 'Venus', 'Earth', 'Mars', 'Jupiter', 'Saturn', 'Uranus', 'Neptune', 'Pluto']
+        syllables = ['ka', 'ru', 'to', 'mi', 'ne', 'sa', 'lo', 'bi', 'gu', 'de']
+        self.names = planets + ['%d %s%d %s' % (rnd.randint(1900, 2020), rnd.choice(syllables), rnd.randint(1, 999),
+                                                ''.join(rnd.choice(syllables) for _ in range(2)))
+                                for _ in range(count)]
+
+    def bodies(self):
+        return [dict(englishName=name) for name in self.names]
+
+
+def benchmark_tokenize(args, expressions):
+    inputs = [x.replace('<object>', 'jupiter') for x in expressions]
+    for count in [10, 100, 200, 1000, 10000, 50000]:
+        repo = _GeneratedRepository(count, random.Random(args.seed))
+        times = []
+        tokenizers = [parser.build_tokenize(repo, trie=False), parser.build_tokenize(repo, trie=True)]
+        mismatches = [x for x in inputs if tokenizers[0](x) != tokenizers[1](x)]
+        if mismatches:
+            print('Tokenizers differ for %d inputs, e.g. "%s"' % (len(mismatches), mismatches[0]))
+            sys.exit(1)
+        for tokenize in tokenizers:
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                for x in inputs:
+                    tokenize(x)
+            times.append((time.perf_counter() - start) / (args.repeat * len(inputs)))
+        print('tokenize, %6d names   regex %8.1fus/utt, trie %8.1fus/utt, used: %s' %
+              (len(repo.names), 1e6 * times[0], 1e6 * times[1],
+               'trie' if len(repo.names) >= parser.TRIE_MIN_NAMES else 'regex'))
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Benchmark the Solar System NLU parser')
+    argparser.add_argument('-r', '--repeat', type=int, default=20, help='Number of passes over the data')
+    argparser.add_argument('--random', type=int, default=1000, help='Number of random inputs')
+    argparser.add_argument('--seed', type=int, default=42, help='Random seed')
+    main(argparser.parse_args())
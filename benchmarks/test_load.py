@@ -0,0 +1,11 @@
+from load import percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    assert percentile(list(range(1, 11)), 50) == 5
+    assert percentile(list(range(1, 11)), 95) == 10
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile(list(range(1, 101)), 50.5) == 51
+    assert percentile([7], 50) == 7 and percentile([1, 2], 0) == 1 and percentile([], 50) is None
+    assert summarize([3, 1, 2, 4]) == {'count': 4, 'mean': 2.5, 'p50': 2, 'p95': 4, 'p99': 4, 'max': 4}
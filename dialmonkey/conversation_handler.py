@@ -2,12 +2,13 @@
 
 import logzero
 import json
+import threading
 import time
 
-from .dialogue import Dialogue
+from .dialogue import Dialogue, UncheckedDialogue
 from .utils import dynload_class
 from .component import Component
-from .da import DA
+from .dialogue_log import DAJSONEncoder, write_log
 
 
 class ConversationHandler(object):
@@ -18,14 +19,21 @@ class ConversationHandler(object):
     def __init__(self, config, logger=None, should_continue=None):
         self.config = config
         self.logger = logger if logger is not None else logzero.logger
-        self.history_fn = 'history-{}.json'.format(int(time.time())) \
+        self.history_format = self.config.get('history_format', 'json')
+        assert self.history_format in ['json', 'binary'], 'Unknown history format "%s"' % self.history_format
+        history_ext = 'json' if self.history_format == 'json' else 'dmlog'
+        self.history_fn = 'history-{}.{}'.format(int(time.time()), history_ext) \
             if 'history_fn' not in self.config else self.config['history_fn']
         self.should_continue = should_continue if should_continue is not None else lambda _: True
+        self.dialogue_cls = Dialogue if self.config.get('validate_dialogue', True) else UncheckedDialogue
 
+        self.special_stream = None
         if 'special_stream_type' in self.config:
             io = dynload_class(self.config['special_stream_type'])(**self.config)
-            self.user_stream = io.input
-            self.output_stream = io.output
+            self.special_stream = io
+            # front-ends with a `serve` method run the dialogues themselves and need no streams
+            self.user_stream = getattr(io, 'input', None)
+            self.output_stream = getattr(io, 'output', None)
         else:
             # setup input stream
             if 'user_stream_type' not in self.config:
@@ -55,20 +63,50 @@ class ConversationHandler(object):
         and maintains the history.
         :return: None
         """
-        class JSONEnc(json.JSONEncoder):
-            """Helper class to ensure encoding of DA objects (as strings)."""
-            def default(self, obj):
-                if isinstance(obj, DA):
-                    return obj.to_cambridge_da_string()
+        if hasattr(self.special_stream, 'serve'):
+            # the front-end runs the dialogues (see `new_dialogue` and `finish_dialogue`) until it stops
+            self.special_stream.serve(self)
+        else:
+            while self.should_continue(self):
+                self.logger.debug('Dialogue %d', self.iterations)
+                dial = self.dialogue_cls()
+                final_dial = self.run_dialogue(dial)
+                self.history.append(final_dial['history'])
+                self.iterations += 1
+        close_output = getattr(self.output_stream, 'close', None)
+        if close_output is not None:
+            close_output()
+        self._save_history()
+
+    def _save_history(self):
+        """Writes the history of all dialogues, either as JSON or as a binary log
+        (see `dialmonkey.dialogue_log`), depending on the `history_format` setting."""
+        if self.history_format == 'binary':
+            write_log(self.history, self.history_fn, self.config.get('history_codec', 'none'))
+            return
+        with open(self.history_fn, 'wt') as of:
+            json.dump(self.history, of, indent=4, ensure_ascii=False, cls=DAJSONEncoder)
+
+    def new_dialogue(self):
+        """
+        Creates a new Dialogue with all components initialized. Used by front-ends that run
+        many dialogues at once and call `get_response` for each turn themselves.
+        :return: the new Dialogue
+        """
+        dial = self.dialogue_cls()
+        self._init_components(dial)
+        return dial
 
-        while self.should_continue(self):
+    def finish_dialogue(self, dial: Dialogue):
+        """
+        Stores the history of a finished dialogue started with `new_dialogue`.
+        :param dial: the finished Dialogue
+        :return: None
+        """
+        with self._history_lock:
             self.logger.debug('Dialogue %d', self.iterations)
-            dial = Dialogue()
-            final_dial = self.run_dialogue(dial)
-            self.history.append(final_dial['history'])
+            self.history.append(dial['history'])
             self.iterations += 1
-        with open(self.history_fn, 'wt') as of:
-            json.dump(self.history, of, indent=4, ensure_ascii=False, cls=JSONEnc)
 
     def _init_components(self, dial: Dialogue):
         for component in self.components:
@@ -106,6 +144,7 @@ class ConversationHandler(object):
         """
         eod = False
         system_response = ""
+        turn = 0
         self._init_components(dial)
 
         while not eod:
@@ -115,9 +154,13 @@ class ConversationHandler(object):
                 self.logger.info('Input file ended.')
                 break
             self.logger.info('USER: %s', user_utterance)
+            start_time = time.perf_counter()
             system_response, eod = self.get_response(dial, user_utterance)
+            duration = time.perf_counter() - start_time
             self.logger.info('SYSTEM: %s', system_response)
-            self.output_stream(system_response)
+            self.output_stream(system_response, user=user_utterance, dialogue=self.iterations,
+                               turn=turn, duration=duration)
+            turn += 1
 
         self.logger.info('Dialogue ended.')
         self._reset_components()
@@ -127,6 +170,7 @@ class ConversationHandler(object):
     def _reset(self):
         self.iterations = 1
         self.history = []
+        self._history_lock = threading.Lock()
 
     def _load_components(self):
         self.components = []
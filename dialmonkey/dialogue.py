@@ -1,11 +1,26 @@
 from .da import DA
-from .utils import dotdict
+from .utils import dotdict, snapshot, state_delta
 
 
 class Dialogue:
     """A representation of the dialogue -- dialogue history, current state, current system
     and user utterances etc. This object is passed to dialogue components to be changed and
-    updated with new information."""
+    updated with new information.
+
+    The conventional attributes live in slots, any other attributes set by components
+    are kept in the instance dictionary. Only the conventional attributes are validated."""
+
+    __slots__ = ('user', 'system', 'nlu', 'action', 'eod', 'state', 'history', '__dict__')
+
+    # attribute -> (expected type, error message)
+    _field_types = {
+        'user': (str, 'Attribute "user" has to be of type "string"'),
+        'system': (str, 'Attribute "system" has to be of type "string"'),
+        'eod': (bool, 'Attribute "eod" has to be of type "bool"'),
+        'nlu': (DA, 'Attribute "nlu" has to be a dialmonkey.DA instance.'),
+        'action': (DA, 'Attribute "action" has to be a dialmonkey.DA instance.'),
+    }
+    _read_only = frozenset(['history', 'state'])
 
     def __init__(self):
         self.user = ''
@@ -20,13 +35,15 @@ class Dialogue:
         """
         Method is called after the turn ends, resets the user and system utterances,
         the nlu and appends to the history.
+        The state is stored as a snapshot sharing all unchanged slots with the previous turn.
         :return: None
         """
+        previous = self.history[-1]['state'] if self.history else None
         self.history.append({
             'user': self.user,
             'system': self.system,
             'nlu': self.nlu,
-            'state': dotdict(self.state),
+            'state': snapshot(self.state, previous),
             'action': self.action,
         })
         self.user = ''
@@ -34,6 +51,19 @@ class Dialogue:
         self.nlu = DA()
         self.action = DA()
 
+    def state_delta(self, turn):
+        """
+        Returns the state slots that changed in the given turn of the history (with no history yet,
+        all slots of the current state are new).
+        :param turn: index into the history
+        :return: tuple (dict of added/changed slots, list of removed slots)
+        """
+        if not self.history:
+            return state_delta(None, self.state)
+        turn = turn % len(self.history)
+        previous = self.history[turn - 1]['state'] if turn > 0 else None
+        return state_delta(previous, self.history[turn]['state'])
+
     def set_system_response(self, response):
         self.system = response
 
@@ -44,22 +74,25 @@ class Dialogue:
         self.eod = True
 
     def __setattr__(self, key, value):
-        if key in ['user', 'system']:
-            assert isinstance(value, str), f'Attribute "{key}" has to be of type "string"'
-        elif key == 'eod':
-            assert isinstance(value, bool), 'Attribute "eod" has to be of type "bool"'
-        elif key in ['nlu', 'action']:
-            assert isinstance(value, DA), 'Attribute "nlu" has to be a dialmonkey.DA instance.'
+        field = self._field_types.get(key)
+        if field is not None:
+            assert isinstance(value, field[0]), field[1]
         else:
-            assert key not in ['history', 'state'],\
+            assert key not in self._read_only,\
                 'Direct modification of attribute "{}" is not allowed!'.format(key)
-        super(Dialogue, self).__setattr__(key, value)
+        object.__setattr__(self, key, value)
 
     def __setitem__(self, key, value):
         setattr(self, key, value)
 
     def __getitem__(self, item):
-        if hasattr(self, item):
-            return getattr(self, item)
-        else:
-            return None
+        return getattr(self, item, None)
+
+
+class UncheckedDialogue(Dialogue):
+    """A Dialogue that skips all attribute validation, for production runs of well-tested
+    pipelines (select it using `validate_dialogue: false` in the configuration)."""
+
+    __slots__ = ()
+
+    __setattr__ = object.__setattr__
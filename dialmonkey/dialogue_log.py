@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Compact binary format for dialogue histories, with random access to dialogues and turns.
+
+File layout (all integers little-endian):
+ - header: magic (8 bytes), codec id (1 byte)
+ - one block per dialogue, compressed by the codec; an uncompressed block is a sequence
+   of length-prefixed turn records (u32 length + payload)
+ - string table block: all interned DA strings
+ - index: number of dialogues, then for each dialogue the block offset and size,
+   the number of turns and the offset of each turn record inside the uncompressed block
+ - footer: offset of the string table, offset of the index, magic
+
+A turn record holds the user and system utterances, the NLU and action DAs as ids into
+the string table and the state as compact JSON.
+"""
+
+import argparse
+import json
+import lzma
+import struct
+
+from .da import DA
+
+MAGIC = b'DMLOG\x00\x01\x00'
+CODECS = ['none', 'lzma', 'zstd']
+
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+_BLOCK_ENTRY = struct.Struct('<QII')  # block offset, block size, number of turns
+_FOOTER = struct.Struct('<QQ8s')  # string table offset, index offset, magic
+
+
+class DAJSONEncoder(json.JSONEncoder):
+    """Helper class to ensure encoding of DA objects (as strings)."""
+    def default(self, obj):
+        if isinstance(obj, DA):
+            return obj.to_cambridge_da_string()
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('The "zstd" codec requires the "zstandard" package (pip install zstandard).')
+    return zstandard
+
+
+def _compress(codec, data):
+    if codec == 'lzma':
+        return lzma.compress(data)
+    if codec == 'zstd':
+        return _zstd().ZstdCompressor().compress(data)
+    return data
+
+
+def _decompress(codec, data):
+    if codec == 'lzma':
+        return lzma.decompress(data)
+    if codec == 'zstd':
+        return _zstd().ZstdDecompressor().decompress(data)
+    return data
+
+
+def _pack_str(text):
+    data = text.encode('UTF-8')
+    return _U32.pack(len(data)) + data
+
+
+def _unpack_str(buf, pos):
+    length, = _U32.unpack_from(buf, pos)
+    pos += _U32.size
+    return buf[pos:pos + length].decode('UTF-8'), pos + length
+
+
+def _da_string(da):
+    if isinstance(da, DA):
+        return da.to_cambridge_da_string()
+    return da if da is not None else ''
+
+
+class DialogueLogWriter:
+    """Writes dialogues to a binary log file. Use as a context manager or call `close()`,
+    the string table and the index are only written at the end."""
+
+    def __init__(self, path, codec='none'):
+        assert codec in CODECS, 'Unknown codec "%s", use one of %s' % (codec, ', '.join(CODECS))
+        if codec == 'zstd':
+            _zstd()
+        self.codec = codec
+        self._fd = open(path, 'wb')
+        self._fd.write(MAGIC + bytes([CODECS.index(codec)]))
+        self._strings = {}
+        self._index = []
+
+    def _intern(self, text):
+        if text not in self._strings:
+            self._strings[text] = len(self._strings)
+        return self._strings[text]
+
+    def _encode_turn(self, turn):
+        return b''.join([
+            _pack_str(turn.get('user') or ''),
+            _pack_str(turn.get('system') or ''),
+            _U32.pack(self._intern(_da_string(turn.get('nlu')))),
+            _U32.pack(self._intern(_da_string(turn.get('action')))),
+            _pack_str(json.dumps(turn.get('state'), ensure_ascii=False, separators=(',', ':'),
+                                 cls=DAJSONEncoder)),
+        ])
+
+    def write_dialogue(self, turns):
+        """
+        Appends one dialogue to the log.
+        :param turns: list of turns, as in `Dialogue.history` (DAs may be objects or strings)
+        :return: None
+        """
+        block, offsets = [], []
+        pos = 0
+        for turn in turns:
+            record = self._encode_turn(turn)
+            offsets.append(pos)
+            block.append(_U32.pack(len(record)))
+            block.append(record)
+            pos += _U32.size + len(record)
+        data = _compress(self.codec, b''.join(block))
+        self._index.append((self._fd.tell(), len(data), offsets))
+        self._fd.write(data)
+
+    def close(self):
+        if self._fd is None:
+            return
+        strings_offset = self._fd.tell()
+        table = [_U32.pack(len(self._strings))]
+        table.extend(_pack_str(text) for text in self._strings)  # dicts keep the insertion (=id) order
+        self._fd.write(_compress(self.codec, b''.join(table)))
+
+        index_offset = self._fd.tell()
+        self._fd.write(_U32.pack(len(self._index)))
+        for block_offset, block_size, offsets in self._index:
+            self._fd.write(_BLOCK_ENTRY.pack(block_offset, block_size, len(offsets)))
+            self._fd.write(struct.pack('<%dI' % len(offsets), *offsets))
+        self._fd.write(_FOOTER.pack(strings_offset, index_offset, MAGIC))
+        self._fd.close()
+        self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class DialogueLogReader:
+    """Random-access reader for binary dialogue logs. Turns are returned as dictionaries
+    in the same form as in the JSON history files (DAs as strings, unless `parse_das` is set)."""
+
+    def __init__(self, path, parse_das=False):
+        self.parse_das = parse_das
+        self._fd = open(path, 'rb')
+        header = self._fd.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError('"%s" is not a dialogue log file.' % path)
+        self.codec = CODECS[header[-1]]
+
+        self._fd.seek(-_FOOTER.size, 2)
+        strings_offset, index_offset, magic = _FOOTER.unpack(self._fd.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError('Dialogue log "%s" is truncated.' % path)
+
+        self._fd.seek(strings_offset)
+        table = _decompress(self.codec, self._fd.read(index_offset - strings_offset))
+        count, = _U32.unpack_from(table, 0)
+        pos = _U32.size
+        self._strings = []
+        for _ in range(count):
+            text, pos = _unpack_str(table, pos)
+            self._strings.append(text)
+
+        index = self._fd.read()
+        dialogues, = _U32.unpack_from(index, 0)
+        pos = _U32.size
+        self._index = []
+        for _ in range(dialogues):
+            block_offset, block_size, turns = _BLOCK_ENTRY.unpack_from(index, pos)
+            pos += _BLOCK_ENTRY.size
+            offsets = struct.unpack_from('<%dI' % turns, index, pos)
+            pos += _U32.size * turns
+            self._index.append((block_offset, block_size, offsets))
+
+    def __len__(self):
+        return len(self._index)
+
+    def num_turns(self, dialogue):
+        return len(self._index[dialogue][2])
+
+    def _read_block(self, dialogue):
+        block_offset, block_size, _ = self._index[dialogue]
+        self._fd.seek(block_offset)
+        return _decompress(self.codec, self._fd.read(block_size))
+
+    def _decode_turn(self, buf, pos):
+        pos += _U32.size  # record length
+        user, pos = _unpack_str(buf, pos)
+        system, pos = _unpack_str(buf, pos)
+        nlu, action = struct.unpack_from('<II', buf, pos)
+        state, _ = _unpack_str(buf, pos + 8)
+        nlu, action = self._strings[nlu], self._strings[action]
+        if self.parse_das:
+            nlu, action = DA.parse_cambridge_da(nlu), DA.parse_cambridge_da(action)
+        return {'user': user, 'system': system, 'nlu': nlu, 'state': json.loads(state), 'action': action}
+
+    def dialogue(self, dialogue):
+        """Returns all turns of the given dialogue."""
+        buf = self._read_block(dialogue)
+        return [self._decode_turn(buf, pos) for pos in self._index[dialogue][2]]
+
+    def turn(self, dialogue, turn):
+        """Returns a single turn; for uncompressed logs, only the turn record is read."""
+        block_offset, _, offsets = self._index[dialogue]
+        if self.codec != 'none':
+            return self._decode_turn(self._read_block(dialogue), offsets[turn])
+        self._fd.seek(block_offset + offsets[turn])
+        length, = _U32.unpack(self._fd.read(_U32.size))
+        return self._decode_turn(_U32.pack(length) + self._fd.read(length), 0)
+
+    def __getitem__(self, dialogue):
+        return self.dialogue(dialogue)
+
+    def __iter__(self):
+        for dialogue in range(len(self)):
+            yield self.dialogue(dialogue)
+
+    def turns(self):
+        """Iterates over all turns of all dialogues, yielding (dialogue index, turn)."""
+        for idx, dialogue in enumerate(self):
+            for turn in dialogue:
+                yield idx, turn
+
+    def close(self):
+        self._fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_log(history, path, codec='none'):
+    """Writes a whole history (list of dialogues) to a binary log file."""
+    with DialogueLogWriter(path, codec) as writer:
+        for dialogue in history:
+            writer.write_dialogue(dialogue)
+
+
+def convert_json(json_path, log_path, codec='none'):
+    """Converts a JSON history file (as produced by `ConversationHandler`) into a binary log."""
+    with open(json_path, 'rt', encoding='UTF-8') as fd:
+        history = json.load(fd)
+    write_log(history, log_path, codec)
+    return len(history)
+
+
+def main(args):
+    if args.command == 'convert':
+        num = convert_json(args.input, args.output, args.codec)
+        print('Converted %d dialogues.' % num)
+    elif args.command == 'dump':
+        with DialogueLogReader(args.input) as reader:
+            if args.dialogue is None:
+                data = list(reader)
+            elif args.turn is None:
+                data = reader.dialogue(args.dialogue)
+            else:
+                data = reader.turn(args.dialogue, args.turn)
+        print(json.dumps(data, indent=4, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert or inspect binary dialogue logs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    convert = subparsers.add_parser('convert', help='Convert a JSON history file into a binary log')
+    convert.add_argument('input', type=str, help='JSON history file')
+    convert.add_argument('output', type=str, help='Output binary log file')
+    convert.add_argument('-c', '--codec', type=str, choices=CODECS, default='lzma', help='Block compression')
+    dump = subparsers.add_parser('dump', help='Print (a part of) a binary log as JSON')
+    dump.add_argument('input', type=str, help='Binary log file')
+    dump.add_argument('-d', '--dialogue', type=int, help='Dialogue index')
+    dump.add_argument('-t', '--turn', type=int, help='Turn index (requires --dialogue)')
+    main(parser.parse_args())
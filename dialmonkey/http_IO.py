@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+from http import HTTPStatus
+from urllib.parse import unquote
+
+from .session import SessionManager
+
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_WS_TEXT, _WS_CLOSE, _WS_PING, _WS_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+class HttpIO:
+    """HTTP and WebSocket front-end (use as `special_stream_type`). Runs one dialogue per session
+    id on a worker pool (see `dialmonkey.session.SessionManager`).
+
+    Endpoints:
+     - `POST /sessions/<id>`: body is the user utterance (plain text or JSON `{"user": "..."}`),
+       the reply is JSON `{"session": id, "system": response, "eod": end of dialogue}`
+     - `DELETE /sessions/<id>`: ends the dialogue of the session
+     - `GET /sessions/<id>/ws`: WebSocket, each text message is a user utterance, replies are sent
+       back as JSON text messages (same as above) as soon as they are ready
+     - `GET /health`: server status
+
+    HTTP/1.1 connections are kept alive and pipelined requests are answered in order.
+
+    Configuration (the `http` section): `host` (default 127.0.0.1), `port` (default 8080),
+    `workers` (default 4), `keep_alive_timeout` in seconds (default 60), `max_body_size` in bytes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.config = kwargs.get('http', {})
+        self.host = self.config.get('host', '127.0.0.1')
+        self.port = self.config.get('port', 8080)
+        self.keep_alive_timeout = self.config.get('keep_alive_timeout', 60)
+        self.max_body_size = self.config.get('max_body_size', 1 << 20)
+        self.sessions = None
+        self.started = threading.Event()
+        self._loop = None
+        self._stop = None
+
+    def serve(self, handler):
+        """Serves the pipeline of the given ConversationHandler until `stop` is called."""
+        self.sessions = SessionManager(handler, self.config.get('workers', 4))
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self.sessions.close()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.sessions.handler.logger.info('Listening on http://%s:%d', self.host, self.port)
+        self.started.set()
+        async with server:
+            await self._stop.wait()
+
+    async def _turn(self, session_id, utterance):
+        response, eod = await asyncio.wrap_future(self.sessions.submit(session_id, utterance))
+        return {'session': session_id, 'system': response, 'eod': eod}
+
+    #
+    # HTTP
+    #
+    async def _handle_connection(self, reader, writer):
+        responses = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send_responses(responses, writer))
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.keep_alive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HttpError as e:
+                    await responses.put(self._error(e, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, path, headers, body, keep_alive = request
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    await responses.put(None)
+                    await sender  # answer all pipelined requests before switching protocols
+                    await self._websocket(reader, writer, path, headers)
+                    return
+                # processed in parallel with the following requests, answered in order
+                await responses.put(asyncio.ensure_future(self._respond(method, path, body, keep_alive)))
+                if not keep_alive:
+                    break
+        finally:
+            if not sender.done():
+                await responses.put(None)
+                await sender
+            writer.close()
+
+    async def _send_responses(self, responses, writer):
+        while True:
+            response = await responses.get()
+            if response is None:
+                return
+            if not isinstance(response, bytes):
+                response = await response
+            writer.write(response)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                return
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HttpError(HTTPStatus.BAD_REQUEST)
+            return None  # connection closed between requests
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, path, version = lines[0].split(' ')
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        if 'chunked' in headers.get('transfer-encoding', ''):
+            raise HttpError(HTTPStatus.NOT_IMPLEMENTED, 'Chunked requests are not supported.')
+        length = headers.get('content-length')
+        if length is None:
+            if method == 'POST':
+                raise HttpError(HTTPStatus.LENGTH_REQUIRED)
+            length = 0
+        elif length.isascii() and length.isdigit():
+            length = int(length)
+        else:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length.')
+        if length > self.max_body_size:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b''
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method, unquote(path), headers, body, keep_alive
+
+    async def _respond(self, method, path, body, keep_alive):
+        try:
+            result = await self._route(method, path, body)
+            return self._response(HTTPStatus.OK, result, keep_alive)
+        except HttpError as e:
+            return self._error(e, keep_alive)
+        except Exception as e:
+            self.sessions.handler.logger.error('Pipeline failed: %s', e)
+            return self._error(HttpError(HTTPStatus.INTERNAL_SERVER_ERROR), keep_alive)
+
+    async def _route(self, method, path, body):
+        parts = [x for x in path.split('?')[0].split('/') if x]
+        if parts == ['health']:
+            return {'status': 'ok', 'sessions': len(self.sessions)}
+        if len(parts) != 2 or parts[0] != 'sessions':
+            raise HttpError(HTTPStatus.NOT_FOUND)
+        session_id = parts[1]
+        if method == 'POST':
+            return await self._turn(session_id, self._parse_utterance(body))
+        if method == 'DELETE':
+            future = self.sessions.end_session(session_id)
+            if future is not None:
+                await asyncio.wrap_future(future)
+            return {'session': session_id, 'ended': future is not None}
+        raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+
+    @staticmethod
+    def _parse_utterance(body):
+        try:
+            text = body.decode('UTF-8')
+        except UnicodeDecodeError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'The request body has to be UTF-8.')
+        if text.lstrip().startswith('{'):
+            try:
+                text = json.loads(text)['user']
+            except (ValueError, KeyError, TypeError):
+                raise HttpError(HTTPStatus.BAD_REQUEST, 'Expected JSON object with the "user" key.')
+        if not isinstance(text, str):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'The user utterance has to be a string.')
+        return text.strip().lower()
+
+    @staticmethod
+    def _response(status, data, keep_alive):
+        body = json.dumps(data, ensure_ascii=False).encode('UTF-8')
+        head = ('HTTP/1.1 %d %s\r\n' % (status.value, status.phrase) +
+                'Content-Type: application/json; charset=utf-8\r\n' +
+                'Content-Length: %d\r\n' % len(body) +
+                'Connection: %s\r\n\r\n' % ('keep-alive' if keep_alive else 'close'))
+        return head.encode('latin-1') + body
+
+    def _error(self, error, keep_alive):
+        return self._response(error.status, {'error': str(error)}, keep_alive)
+
+    #
+    # WebSocket
+    #
+    async def _websocket(self, reader, writer, path, headers):
+        parts = [x for x in path.split('?')[0].split('/') if x]
+        key = headers.get('sec-websocket-key')
+        if len(parts) != 3 or parts[0] != 'sessions' or parts[2] != 'ws' or key is None:
+            writer.write(self._error(HttpError(HTTPStatus.BAD_REQUEST, 'Not a WebSocket endpoint.'), False))
+            writer.close()
+            return
+        session_id = parts[1]
+        accept = base64.b64encode(hashlib.sha1(key.encode('latin-1') + _WS_GUID).digest()).decode('ascii')
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      'Sec-WebSocket-Accept: %s\r\n\r\n' % accept).encode('latin-1'))
+
+        replies = asyncio.Queue()
+
+        async def send_replies():
+            while True:
+                reply = await replies.get()
+                if reply is None:
+                    return
+                try:
+                    data = await reply
+                except Exception as e:
+                    self.sessions.handler.logger.error('Pipeline failed: %s', e)
+                    data = {'session': session_id, 'error': HTTPStatus.INTERNAL_SERVER_ERROR.phrase}
+                writer.write(_ws_frame(_WS_TEXT, json.dumps(data, ensure_ascii=False).encode('UTF-8')))
+                await writer.drain()
+
+        sender = asyncio.ensure_future(send_replies())
+        try:
+            while True:
+                try:
+                    opcode, payload = await _ws_read_message(reader, self.max_body_size)
+                except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                    break
+                if opcode == _WS_TEXT:
+                    utterance = payload.decode('UTF-8', errors='replace').strip().lower()
+                    await replies.put(asyncio.ensure_future(self._turn(session_id, utterance)))
+                elif opcode == _WS_PING:
+                    writer.write(_ws_frame(_WS_PONG, payload))
+                elif opcode == _WS_CLOSE:
+                    break
+            await replies.put(None)
+            await sender
+            writer.write(_ws_frame(_WS_CLOSE, b''))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+
+
+def _ws_frame(opcode, payload):
+    """Builds an unmasked (server-to-client) WebSocket frame."""
+    length = len(payload)
+    if length < 126:
+        head = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < (1 << 16):
+        head = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return head + payload
+
+
+async def _ws_read_message(reader, max_size):
+    """Reads one (possibly fragmented) message; control frames are returned immediately."""
+    message_opcode, chunks = None, []
+    while True:
+        first, second = await reader.readexactly(2)
+        fin, opcode, masked, length = first & 0x80, first & 0x0F, second & 0x80, second & 0x7F
+        if length == 126:
+            length, = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            length, = struct.unpack('!Q', await reader.readexactly(8))
+        if not masked or length > max_size:
+            raise ValueError('Invalid WebSocket frame.')
+        mask = await reader.readexactly(4)
+        data = await reader.readexactly(length)
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+        if opcode >= 0x8:  # control frames may come in between fragments
+            return opcode, payload
+        if opcode != 0:
+            message_opcode = opcode
+        chunks.append(payload)
+        if fin:
+            return message_opcode, b''.join(chunks)
@@ -0,0 +1,55 @@
+import gzip
+import io
+import json
+import lzma
+
+import pytest
+
+from .text import PlainFileInput, SimpleJSONInput, _iter_json_array
+
+
+def _read_all(reader):
+    result = []
+    while True:
+        item = reader()
+        if item is None:
+            return result
+        result.append(item)
+
+
+@pytest.mark.parametrize('ext,opener', [('', open), ('.gz', gzip.open), ('.xz', lzma.open)])
+def test_plain_file_input(tmp_path, ext, opener):
+    path = str(tmp_path / ('input.tsv' + ext))
+    with opener(path, 'wt', encoding='UTF-8') as fd:
+        fd.write('Hello\tgreet()\nŽluťoučký kůň\tinform()\n')
+    reader = PlainFileInput({'input_file': path})
+    assert _read_all(reader) == ['hello', 'žluťoučký kůň']
+    assert reader.progress_bar.n > 0
+
+
+def test_plain_file_input_empty(tmp_path):
+    path = tmp_path / 'input.txt'
+    path.write_text('')
+    assert _read_all(PlainFileInput({'input_file': str(path)})) == []
+
+
+@pytest.mark.parametrize('name,opener', [('input.json', open), ('input.json.gz', gzip.open),
+                                         ('input.jsonl', open), ('input.jsonl.xz', lzma.open)])
+def test_simple_json_input(tmp_path, name, opener):
+    data = [{'usr': 'hello', 'DA': 'greet()'}, {'usr': 'bye', 'DA': 'goodbye()'}]
+    path = str(tmp_path / name)
+    with opener(path, 'wt', encoding='UTF-8') as fd:
+        if '.jsonl' in name:
+            fd.write(''.join(json.dumps(x) + '\n' for x in data))
+        else:
+            json.dump(data, fd, indent=4)
+    reader = SimpleJSONInput({'input_file': path})
+    assert _read_all(reader) == ['hello', 'bye']
+    assert reader.progress_bar.n == reader.progress_bar.total
+
+
+def test_iter_json_array_small_chunks():
+    data = [{'usr': 'x' * 50, 'n': 12345}, 3.25, [1, 2, {'a': None}], 'str', 1000]
+    text = json.dumps(data, indent=2)
+    assert list(_iter_json_array(io.StringIO(text), chunk_size=3)) == data
+    assert list(_iter_json_array(io.StringIO(' [ ] '))) == []
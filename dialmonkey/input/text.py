@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 
+import gzip
+import io
+import json
+import lzma
+import mmap
+import os
 import sys
 import time
-import json
 import tqdm
 from abc import ABC
 
@@ -17,17 +22,97 @@ class ConsoleInput(Component):
         return input('USER INPUT> ').strip().lower()
 
 
+_COMPRESSED = {'.gz': lambda raw: gzip.GzipFile(fileobj=raw),
+               '.xz': lambda raw: lzma.LZMAFile(raw),
+               '.lzma': lambda raw: lzma.LZMAFile(raw)}
+
+
+def _strip_compression(path):
+    """Returns the file name without the compression suffix (.gz, .xz), if any."""
+    for ext in _COMPRESSED:
+        if path.endswith(ext):
+            return path[:-len(ext)]
+    return path
+
+
+def _open_binary(path):
+    """
+    Opens the given file for binary reading, transparently decompressing gzip and xz files.
+    :param path: path to the file
+    :return: tuple (stream to read from, underlying raw file -- its position tracks the progress)
+    """
+    raw = open(path, 'rb')
+    for ext, opener in _COMPRESSED.items():
+        if path.endswith(ext):
+            return opener(raw), raw
+    return raw, raw
+
+
+def _iter_json_array(stream, chunk_size=1 << 16):
+    """
+    Incrementally parses a top-level JSON array, yielding one item at a time, so that
+    only the currently parsed item (and one chunk of input) is kept in memory.
+    :param stream: text stream with the JSON data
+    :param chunk_size: minimum number of characters to read at once
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof, started = '', 0, False, False
+
+    def read_more(buf, pos):
+        more = stream.read(max(chunk_size, len(buf) - pos))  # grow geometrically for long items
+        return buf[pos:] + more, 0, more == ''
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ',')):
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                raise ValueError('Unexpected end of JSON input.')
+            buf, pos, eof = read_more(buf, pos)
+            continue
+        if not started:
+            if buf[pos] != '[':
+                raise ValueError('JSON input has to be a list.')
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buf, pos, eof = read_more(buf, pos)
+            continue
+        if end == len(buf) and not eof:  # the item might continue in the next chunk
+            buf, pos, eof = read_more(buf, pos)
+            continue
+        yield item
+        pos = end
+
+
 class FileInput(Component, ABC):
-    """Abstract class for all file input readers."""
+    """Abstract class for all file input readers. If the reader knows its byte offset in
+    the input file (see `_position`), the progress is estimated from it and `__len__` should
+    return the file size, otherwise progress is counted in items."""
 
     def __init__(self, *args, **kwargs):
         super(FileInput, self).__init__()
         total_len = len(self) if len(self) > 0 else float('inf')
-        self.progress_bar = tqdm.tqdm(total=total_len)
+        self._last_pos = 0
+        unit = 'it' if self._position() is None else 'B'
+        self.progress_bar = tqdm.tqdm(total=total_len, unit=unit, unit_scale=(unit == 'B'))
 
     def __call__(self, *args):
-        self.progress_bar.update(1)
-        return self._get()
+        result = self._get()
+        pos = self._position()
+        if pos is None:
+            self.progress_bar.update(1)
+        else:
+            self.progress_bar.update(pos - self._last_pos)
+            self._last_pos = pos
+        return result
 
     def __len__(self):
         raise NotImplementedError
@@ -35,46 +120,69 @@ class FileInput(Component, ABC):
     def _get(self):
         raise NotImplementedError
 
+    def _position(self):
+        """Current byte offset in the input file, None if not known."""
+        return None
+
 
 class PlainFileInput(FileInput):
-    """Input from a file, default to standard input (one turn per line)."""
+    """Input from a file, default to standard input (one turn per line).
+    Uncompressed files are memory-mapped, gzip (.gz) and xz (.xz) files are decompressed
+    on the fly; the file is never read in full."""
 
     def __init__(self, config=None):
         self.tsv = False
         self.input_fd = sys.stdin
+        self._raw = None
         self._len = 0
         self.config = config
         # input is not from standard input
         if self.config and 'input_file' in self.config and self.config['input_file'] not in ['', '-']:
-            self.tsv = self.config['input_file'].split('.')[-1] == 'tsv'
-            self.input_fd = open(self.config['input_file'], 'r', encoding='UTF-8')
-            self._len = sum(1 for _ in self.input_fd)
-            self.input_fd.seek(0)
+            path = self.config['input_file']
+            self.tsv = _strip_compression(path).split('.')[-1] == 'tsv'
+            self._len = os.path.getsize(path)
+            self.input_fd, self._raw = _open_binary(path)
+            if self.input_fd is self._raw and self._len > 0:
+                self.input_fd = mmap.mmap(self._raw.fileno(), 0, access=mmap.ACCESS_READ)
         super(PlainFileInput, self).__init__(config)
 
     def _get(self, *args, **kwargs):
         line = self.input_fd.readline()
-        if line == '':  # EOF hit
+        if not line:  # EOF hit
             return None
+        if isinstance(line, bytes):
+            line = line.decode('UTF-8')
         if self.tsv: line = line.split('\t')[0]
         return line.strip().lower()
 
+    def _position(self):
+        if self._raw is None:
+            return None
+        if isinstance(self.input_fd, mmap.mmap):
+            return self.input_fd.tell()
+        return self._raw.tell()
+
     def __len__(self):
         return self._len
 
     def __del__(self):
-        self.input_fd.close()
+        if getattr(self, '_raw', None) is not None:
+            self.input_fd.close()
+            self._raw.close()
 
 
 class SimpleJSONInput(FileInput):
     """Input from configa JSON, expected format: list of dictionaries, using the
-    'usr' key to provide as the input."""
+    'usr' key to provide as the input. The list is parsed incrementally; JSON lines files
+    (.jsonl, one dictionary per line) and gzip/xz-compressed files are also supported."""
 
     def __init__(self, config=None):
         self.config = config
-        with open(self.config['input_file'], 'rt', encoding='UTF-8') as fd:
-            self.data = json.load(fd)
-            self._len = len(self.data)
+        path = self.config['input_file']
+        self._len = os.path.getsize(path)
+        stream, self._raw = _open_binary(path)
+        self.input_fd = io.TextIOWrapper(stream, encoding='UTF-8')
+        self.jsonl = _strip_compression(path).endswith('.jsonl')
         self.gen = self.get_data_gen()
         super(SimpleJSONInput, self).__init__()
 
@@ -82,8 +190,12 @@ class SimpleJSONInput(FileInput):
         return self._len
 
     def get_data_gen(self):
-        for x in self.data:
-            yield x
+        if self.jsonl:
+            for line in self.input_fd:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(self.input_fd)
 
     def _get(self, *args, **kwargs):
         try:
@@ -91,3 +203,10 @@ class SimpleJSONInput(FileInput):
             return x['usr']
         except (StopIteration, KeyError):
             return None
+
+    def _position(self):
+        return self._raw.tell() if not self._raw.closed else self._len
+
+    def __del__(self):
+        if getattr(self, 'input_fd', None) is not None:
+            self.input_fd.close()
@@ -3,27 +3,51 @@ from dialmonkey.dialogue import Dialogue
 from dialmonkey.da import DA, DAI
 import yaml
 import os
-from itertools import groupby
+from itertools import groupby, combinations
+from collections import Counter
+from functools import lru_cache
 import re
 import random
 from string import Formatter
 
+def _format_list(conjunction):
+    def format_list(value):
+        if not isinstance(value, list): value = value.split(',')
+        if len(value) == 1: return value[0]
+        return ', '.join([format(x) for x in value[:-1]]) + f' {conjunction} ' + format(value[-1])
+    return format_list
+
+_list_formats = dict(or_list=_format_list('or'), and_list=_format_list('and'))
+
 class SolarFormatter(Formatter):
     def __init__(self):
         super().__init__()
 
     def format_field(self, value, format_spec):
-        if format_spec == 'or_list':
-            if not isinstance(value, list): value = value.split(',')
-            if len(value) == 1: return value[0]
-            return ', '.join([format(x) for x in value[:-1]]) + ' or ' +format(value[-1]) 
-
-        if format_spec == 'and_list':
-            if not isinstance(value, list): value = value.split(',')
-            if len(value) == 1: return value[0]
-            return ', '.join([format(x) for x in value[:-1]]) + ' and ' +format(value[-1]) 
+        if format_spec in _list_formats:
+            return _list_formats[format_spec](value)
         return super().format_field(value, format_spec)
 
+def _field_formatter(format_spec, conversion):
+    format_value = _list_formats.get(format_spec, lambda value: format(value, format_spec))
+    if conversion is None: return format_value
+    convert = dict(r=repr, s=str, a=ascii)[conversion]
+    return lambda value: format_value(convert(value))
+
+def compile_template(text):
+    """Splits the template text into (literal, field name, format function) segments, the field
+    name being None after the last literal. Returns None for templates using field names or format
+    specs other than plain `{name}`, `{name:spec}` and `{name!r}`, which are rendered by `SolarFormatter`."""
+    segments = []
+    for literal, field, format_spec, conversion in Formatter().parse(text):
+        if field is None:
+            segments.append((literal, None, None))
+        elif not field.isidentifier() or '{' in format_spec:
+            return None
+        else:
+            segments.append((literal, field, _field_formatter(format_spec, conversion)))
+    return segments
+
 _placeholder_regex = re.compile(r'\{(\w+)\}')
 def is_placeholder(string):
     if string is None: return False
@@ -33,89 +57,116 @@ def simplify(x):
     if x is None: return None
     return x.lower()
 
-def is_match(dai1: DAI, dai2: DAI):
-    if dai1.intent != dai1.intent: return False
-    if dai1.slot != dai2.slot: return False
-    if is_placeholder(dai1.value) or is_placeholder(dai2.value): return True
-    return simplify(dai1.value) == simplify(dai2.value)
+# value of template placeholders, and of DAs with a placeholder value, which match any value
+_ANY = object()
+
+class Template:
+    """A template parsed once when the NLG is built: the slots it requires with their simplified
+    values (`_ANY` for placeholders), the placeholders to fill and its priority (more DAIs first,
+    then fewer placeholders)."""
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        da = DA.parse_cambridge_da(key)
+        self.intent = da.dais[0].intent
+        self.dais = tuple((x.slot, _ANY if is_placeholder(x.value) else simplify(x.value)) for x in da.dais)
+        self.placeholders = tuple((x.slot, x.value[1:-1]) for x in da.dais if is_placeholder(x.value))
+        self.slots = frozenset(x.slot for x in da.dais)
+        self.priority = (len(da.dais), -len(self.placeholders))
+        self.segments = compile_template(text)
+
+    def matches(self, values):
+        """Does every DAI of the template match a DAI of the DA (given as slot -> values)?"""
+        return all(value is _ANY or value in values[slot] or _ANY in values[slot] for slot, value in self.dais)
+
+    def collides(self, other):
+        return any(slot1 == slot2 and (value1 is _ANY or value2 is _ANY or value1 == value2)
+                   for slot1, value1 in self.dais for slot2, value2 in other.dais)
+
+    def render(self, values):
+        """Fills in the placeholders from the DA values (given as slot -> list of values)."""
+        replacements = dict()
+        for slot, name in self.placeholders:
+            assert len(values[slot]) == 1 # Single dai can match single gt dai
+            replacements[name] = values[slot][0]
+        if self.segments is None:
+            return SolarFormatter().format(self.text, **replacements)
+        return ''.join(literal if name is None else literal + format_value(replacements[name])
+                       for literal, name, format_value in self.segments)
 
 def render_response(da: DA, matched_set):
-    responses = []
-    formatter = SolarFormatter()
-    for key, value in matched_set:
-        gtda = DA.parse_cambridge_da(key)
-        replacements = dict()
-        for gtdai in gtda.dais:
-            matched_dai = [dai for dai in da if is_match(dai, gtdai)]
-            assert len(matched_dai) == 1 # Single dai can match single gt dai
-            matched_dai = matched_dai[0]
-            if is_placeholder(gtdai.value): replacements[gtdai.value[1:-1]] = matched_dai.value
-        
-        response = formatter.format(value, **replacements)
-        responses.append(response) 
-    return ' '.join(responses)
-
-def compute_da_priority(x): 
-    key, _ = x
-    da = DA.parse_cambridge_da(key)
-    return (len(da.dais), -sum(is_placeholder(x.value) for x in da.dais))
+    values = dict()
+    for dai in da.dais:
+        values.setdefault(dai.slot, []).append(dai.value)
+    return ' '.join(template.render(values) for template in matched_set)
 
 def prioritized_select(available_set):
     # Prioritize and select non-overlaping set of rules
     matched_set = []
-    matched_set_da = set() 
-    matched_set_keys = [] 
-    available_set.sort(key=compute_da_priority, reverse=True)
-    for _, items in groupby(available_set, key=compute_da_priority):
+    matched_set_keys = []
+    available_set = sorted(available_set, key=lambda x: x.priority, reverse=True)
+    for _, items in groupby(available_set, key=lambda x: x.priority):
         items = list(items)
-        while len(items) > 0:
-            item = random.choice(items)
-            items.remove(item)
-            key, value = item
-            cda = DA.parse_cambridge_da(key)
-
+        random.shuffle(items)
+        for item in items:
             # Does the item have any collision with the matched set?
-            if not any(any(is_match(dai1, dai2) for dai1 in cda) for da2 in matched_set_da for dai2 in da2):
+            if not any(item.collides(x[0]) for x in matched_set):
                 # No collision
                 matched_set.append([item])
-                matched_set_da.add(cda)
-                matched_set_keys.append(key)
-            elif key in matched_set_keys:
+                matched_set_keys.append(item.key)
+            elif item.key in matched_set_keys:
                 # We have exact match
                 # Adding the value as an alternative
-                matched_set[matched_set_keys.index(key)].append(item)
+                matched_set[matched_set_keys.index(item.key)].append(item)
 
     # For each group of items in the matched set select an random item
-    matched_set = [random.choice(x) for x in matched_set] 
+    matched_set = [random.choice(x) for x in matched_set]
     return matched_set
 
 
-def build_nlg(templates):
-    intent_getter = lambda x: DA.parse_cambridge_da(x[0]).dais[0].intent
-    templates = list(templates)
-    templates.sort(key=intent_getter)
-    intent_lookup = {k:list(v) for k, v in groupby(templates, key=intent_getter)}
+def build_nlg(templates, cache_size=1024):
+    # intent -> required slots -> templates
+    index = dict()
+    for key, value in templates:
+        template = Template(key, value)
+        index.setdefault(template.intent, dict()).setdefault(template.slots, []).append(template)
+
+    def candidates(by_slots, slots):
+        # templates requiring a subset of the DA slots, enumerating the smaller of the two sets
+        if 2 ** len(slots) >= len(by_slots):
+            return [x for s, templates in by_slots.items() if s <= slots for x in templates]
+        slots = list(slots)
+        subsets = (frozenset(c) for n in range(1, len(slots) + 1) for c in combinations(slots, n))
+        return [x for s in subsets for x in by_slots.get(s, ())]
+
+    # Matching templates and their renderings for a DA given as a canonical multiset of DAIs.
+    # Templates are only rendered once selected, so each cached DA keeps all its alternatives.
+    @lru_cache(maxsize=cache_size)
+    def prepare(dais):
+        values, simplified = dict(), dict()
+        for (intent, slot, value), count in dais:
+            values.setdefault(slot, []).extend([value] * count)
+            simplified.setdefault(slot, set()).add(_ANY if is_placeholder(value) else simplify(value))
+        available_set = [x for x in candidates(index[intent], frozenset(values)) if x.matches(simplified)]
+        return available_set, values, dict()
+
     def lookup(da: DA):
         assert len(da.dais) > 0
         # We will support single intent
         assert len(set(x.intent for x in da.dais)) == 1
 
         # Prepare set of matched rules
-        intent = da.dais[0].intent
-        intent_set = list(intent_lookup[intent])
-        available_set = []
-        for key, value in intent_set:
-            gtda = DA.parse_cambridge_da(key)
-            is_matched = all(any(is_match(x, y) for x in da.dais) for y in gtda.dais)
-            if is_matched:
-                available_set.append((key, value)) 
-
-        matched_set = prioritized_select(available_set) 
+        available_set, values, rendered = prepare(frozenset(Counter((x.intent, x.slot, x.value) for x in da.dais).items()))
+        matched_set = prioritized_select(available_set)
 
         # Return rendered response
         assert matched_set, "Could not find any matching template."
-        return render_response(da, matched_set)
+        for template in matched_set:
+            if template not in rendered:
+                rendered[template] = template.render(values)
+        return ' '.join(rendered[x] for x in matched_set)
 
+    lookup.cache_info = prepare.cache_info
     return lookup
 
 def read_templates(filename): 
@@ -128,7 +179,8 @@ class SolarNLG(Component):
         super().__init__(*args, **kwargs)
 
         default_filename = os.path.join(os.path.dirname(__file__), '../data/solar-nlg-templates.yaml')
-        self._nlg = build_nlg(read_templates(self.config.get('templates_file', default_filename)))
+        self._nlg = build_nlg(read_templates(self.config.get('templates_file', default_filename)),
+                              cache_size=self.config.get('cache_size', 1024))
 
     def __call__(self, dial: Dialogue, logger):
         assert dial.action is not None
@@ -53,3 +53,23 @@ def test_prioritize_longer_templates():
     assert len(responses) == 1
     assert 'price: cheap and rating: good.' in responses
 
+def test_match_slot_subsets():
+    nlg = build_nlg([
+        ('inform(life=yes,name={name})', 'life on {name}.'),
+        ('inform(life=no,name={name})', 'no life on {name}.'),
+        ('inform(habitable={value})', 'habitable: {value}.'),
+        ('inform(mass={mass})', 'mass: {mass}.'),
+        ('request(name)', 'name?')])
+    assert 'life on Mars.' == nlg(DA.parse_cambridge_da('inform(name=Mars,life=YES)'))
+    assert nlg(DA.parse_cambridge_da('inform(name=Mars,life=no,habitable=no)')) in \
+        {'no life on Mars. habitable: no.', 'habitable: no. no life on Mars.'}
+
+def test_compiled_formats_and_cache():
+    nlg = build_nlg([
+        ('inform(names={names})', 'They are {names:and_list}.'),
+        ('inform(names={names})', 'Either {names:or_list} {{or none}}.')])
+    da = DA.parse_cambridge_da('inform(names="Io,Europa,Ganymede")')
+    responses = {nlg(da) for _ in range(100)}
+    assert responses == {'They are Io, Europa and Ganymede.', 'Either Io, Europa or Ganymede {or none}.'}
+    assert nlg.cache_info().misses == 1
+
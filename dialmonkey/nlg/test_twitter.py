@@ -0,0 +1,36 @@
+import pytest
+from .twitter import TemplateNLG
+from dialmonkey.da import DA, DAI
+from dialmonkey.dialogue import Dialogue
+
+
+@pytest.fixture(scope='module')
+def nlg():
+    return TemplateNLG()
+
+
+def respond(nlg, *dais):
+    dial = Dialogue()
+    dial.action = DA([DAI(*x) for x in dais])
+    return nlg(dial, None)['system']
+
+
+def test_alternation_slots(nlg):
+    assert respond(nlg, ('inform', 'user', 'a'), ('inform', 'user', 'b')) in \
+        {'The available users are: a, b. ', 'This is the list of available users: a, b. '}
+    assert respond(nlg, ('inform', 'keyword', 'x')).startswith(('The available keywords', 'This is the list of available keywords'))
+
+
+def test_first_match_wins(nlg):
+    # the specific pattern comes first in the file, before the wildcard one
+    assert respond(nlg, ('warn', 'unknown', 'user_category')) in \
+        {'I do not have such a user category. ', 'I do not follow this category of users. ',
+         'I do not recognize this user category. '}
+    assert respond(nlg, ('warn', 'unknown', 'theme')) in {'I do not have such a theme. ', 'I do not recognize this theme. '}
+    assert respond(nlg, ('ask_user', 'theme', None)) in \
+        {'Can you repeat theme? ', 'What is the theme? ', 'I need to know your desired theme. '}
+
+
+def test_unknown_dais(nlg):
+    assert respond(nlg, ('inform', 'msg', 'hi'), ('unknown_intent', None, None)) == 'hi '
+    assert respond(nlg) == '<EMPTY>'
@@ -1,3 +1,4 @@
+import os
 import yaml
 import random
 from dialmonkey.component import Component
@@ -70,14 +71,56 @@ def translate(template, intent, slot, values, p_intent, p_slot, p_value):
     return result
 
 
+def compile_slot_stage(template, p_slot):
+    """Returns a function of the matched slot, giving the template after the slot stage of `translate`
+    (the value stage is left to `str.replace`)."""
+    if p_slot is not None and p_slot[0] == '{':
+        if '{' not in template or '}' not in template.split('{', maxsplit=1)[1]:
+            return lambda slot: template
+        meat = template.split('{', maxsplit=1)[1].split('}', maxsplit=1)[0]
+        texts = {alternative: template.replace('{' + meat + '}', keyword)
+                 for alternative, keyword in zip(p_slot[1:-1].split('|'), meat.split('|'))}
+        return lambda slot: texts.get(slot, template)
+    if p_slot is not None and p_slot[0] == '(':
+        parts = template.split(p_slot)
+        return lambda slot: slot.join(parts)
+    return lambda slot: template
+
+
+def build_index(patterns):
+    """Indexes the patterns (in the order of the template file) by intent and slot, expanding
+    `{a|b}` slot alternatives. Returns the index ((intent, slot) -> candidate patterns) and the
+    patterns with a `(...)` slot by intent, which match any slot; candidates come in file order
+    and contain the wildcard patterns of the intent as well."""
+    exact, wildcards = {}, {}
+    for order, ((p_intent, p_slot, p_value), templates) in enumerate(patterns.items()):
+        entry = (order, (p_intent, p_slot, p_value), [compile_slot_stage(t, p_slot) for t in templates])
+        slots = {p_slot}
+        if p_slot is not None and p_slot[0] == '{':
+            slots.update(p_slot[1:-1].split('|'))
+        for slot in slots:
+            exact.setdefault((p_intent, slot), []).append(entry)
+        if p_slot is not None and p_slot[0] == '(':
+            wildcards.setdefault(p_intent, []).append(entry)
+    index = {(intent, slot): entries if slot is None else sorted(entries + wildcards.get(intent, []), key=lambda x: x[0])
+             for (intent, slot), entries in exact.items()}
+    return index, wildcards
+
+
 class TemplateNLG(Component):
     def __init__(self, *args, **kwargs):
-        with open("dialmonkey/nlg/twitter.yaml", "r") as f:
+        super().__init__(*args, **kwargs)
+        default_filename = os.path.join(os.path.dirname(__file__), 'twitter.yaml')
+        with open(self.config.get('templates_file', default_filename), "r") as f:
             self._nlg = yaml.safe_load(f)
         self._nlg = {parse_pattern(k): v for k, v in self._nlg.items()}
+        self._index, self._wildcards = build_index(self._nlg)
 
-        super().__init__(*args, **kwargs)
-
+    def _candidates(self, intent, slot):
+        candidates = self._index.get((intent, slot))
+        if candidates is None:
+            candidates = self._wildcards.get(intent, []) if slot is not None else []
+        return candidates
 
     def __call__(self, dial: Dialogue, logger):
         assert dial.action is not None
@@ -94,10 +137,16 @@ class TemplateNLG(Component):
         for (intent, slot), group in grouped:
             group = list(group)
             intent, slot, values = group[0].intent, group[0].slot, list(map(lambda x: x.value, group))
-            for pattern, templates in self._nlg.items():
+            for _, pattern, templates in self._candidates(intent, slot):
                 if match(intent, slot, values, *pattern):
-                    template = random.choice(templates)
-                    response += translate(template, intent, slot, values, *pattern) + " "
+                    result = random.choice(templates)(slot)
+                    p_value = pattern[2]
+                    if p_value is not None:
+                        try:
+                            result = result.replace(p_value, ', '.join(values))
+                        except TypeError:
+                            pass
+                    response += result + " "
                     break
 
         dial.set_system_response(response)
@@ -5,84 +5,146 @@ from ..da import DAI
 import re
 
 
-def add_team_g(string, attributes):
-    if 'tym' in string:
-        if re.search('(muj|moj|meh)[^ ]{0,3} tym', string):
+# All stems the rules look for, looked up in the utterance at once; with a leading space,
+# the stem has to start a word.
+STEMS = ('tym', ' tym', ' hrac', 'dv', 'tr', 'trestn', 'sestk', 'sestek', 'uspesn', 'procent', 'vyher', 'vyhr',
+         'strelec', 'strelc', ' bod', ' nejv', ' nejlepsi', ' dnes', ' zitr', 'zapas', 'utkani',
+         'kolikat', 'mist', 'pozic', 'zmen', 'nastav')
+
+_DEFAULT_TEAM_G = re.compile('(muj|moj|meh)[^ ]{0,3} tym')
+_DEFAULT_TEAM_S = re.compile('(vychozi[^ ]{0,2}|(muj|moj|meh)[^ ]{0,3}) tym')
+_TWO_POINTS = re.compile('dv(.{2}bod|oje?k)')
+_THREE_POINTS = re.compile('tr(.{1,2}bod|oje?k)')
+_NUMBER = re.compile('[0-9]+[^ ]?')
+_TIME = re.compile('[0-9]{1,2}[. ]{1,2}[0-9]{1,2}[.]?')
+_YEAR = re.compile('[0-9]{4}')
+_PLAYER_NAME = re.compile(' hrac.*$')
+_TEAM_NAME = re.compile(' tym.*$')
+
+
+def find_stems(string):
+    return {stem for stem in STEMS if stem in string}
+
+def _team(string):
+    # the words after the last 'tym' (IndexError if there are none, as before)
+    team = string.rpartition('tym')[2].split(' ', 1)[1]
+    if team.startswith('na '):
+        team = team[3:]
+    return team
+
+def add_team_g(string, stems, attributes):
+    if 'tym' in stems:
+        if _DEFAULT_TEAM_G.search(string):
             attributes.append('team=default')
         else:
-            team = string.split('tym')[-1].split(' ', 1)[1]
-            if team.startswith('na '):
-                team = team[3:]
-            attributes.append(f'team={team}')
+            attributes.append(f'team={_team(string)}')
     return attributes
 
-def add_team_s(string, attributes):
-    if 'tym' in string:
-        if re.search('(vychozi[^ ]{0,2}|(muj|moj|meh)[^ ]{0,3}) tym', string):
+def add_team_s(string, stems, attributes):
+    if 'tym' in stems:
+        if ' tym' in stems and _DEFAULT_TEAM_S.search(string):
             attributes.append('default')
-        team = string.split('tym')[-1].split(' ', 1)[1]
-        if team.startswith('na '):
-            team = team[3:]
-        attributes.append(f'team={team}')
+        attributes.append(f'team={_team(string)}')
     return attributes
 
-def add_type(string, attributes):
-    if ' hrac' in string:
+def add_type(string, stems, attributes):
+    if ' hrac' in stems:
         attributes.append('type=player')
-    elif ' tym' in string:
+    elif ' tym' in stems:
         attributes.append('type=team')
     return attributes
 
-def add_nums(string, attributes):
-    nums = re.findall('[0-9]+[^ ]?', string)
-    if len(nums) == 1: 
+def add_nums(string, stems, attributes):
+    nums = _NUMBER.findall(string)
+    if len(nums) == 1:
         num = nums[0]
         if num.endswith('.'):
             attributes.append('rank=' + num.rstrip('.'))
         else:
             attributes.append('value=' + num)
-    elif any([stem in string for stem in [' nejv', ' nejlepsi']]):
+    elif ' nejv' in stems or ' nejlepsi' in stems:
         attributes.append('rank=1')
     return attributes
 
-def add_time(string, attributes):
-    if ' dnes' in string:
+def add_time(string, stems, attributes):
+    if ' dnes' in stems:
         attributes.append('time=today')
-    elif ' zitr' in string:
+    elif ' zitr' in stems:
         attributes.append('time=tommorow')
     else:
-        time = re.findall('[0-9]{1,2}[. ]{1,2}[0-9]{1,2}[.]?', string)
+        time = _TIME.findall(string)
         if len(time) == 1:
             attributes.append(f'time={time[0]}')
     return attributes
 
-def add_name(string, attributes):
-    if re.search('(vychozi[^ ]{0,2}|(muj|moj|meh)[^ ]{0,3}) tym', string):
+def add_name(string, stems, attributes):
+    if ' tym' in stems and _DEFAULT_TEAM_S.search(string):
         attributes.append('name=default')
     else:
-        names = re.findall(' hrac.*$', string) + re.findall(' tym.*$', string)
+        # each of the patterns matches at most once (up to the end of the utterance)
+        names = [m.group() for m in (' hrac' in stems and _PLAYER_NAME.search(string),
+                                     ' tym' in stems and _TEAM_NAME.search(string)) if m]
         if len(names) == 1:
             name = names[0].lstrip().split(' ', 1)
             if len(name) == 2:
                 attributes.append(f'name={name[1]}')
     return attributes
 
-def add_stat(string, attributes):
-    if re.search('dv(.{2}bod|oje?k)', string):
+def add_stat(string, stems, attributes):
+    if 'dv' in stems and _TWO_POINTS.search(string):
         attributes.append('stat=2_pt_made')
-    elif re.search('tr(.{1,2}bod|oje?k)', string):
+    elif 'tr' in stems and _THREE_POINTS.search(string):
         attributes.append('stat=3_pt_made')
-    elif any([stem in string for stem in ['trestn', 'sestk', 'sestek']]):
-        if any([stem in string for stem in ['uspesn', 'procent']]):
+    elif not stems.isdisjoint(('trestn', 'sestk', 'sestek')):
+        if not stems.isdisjoint(('uspesn', 'procent')):
             attributes.append('stat=ft_percentage')
         else:
             attributes.append('stat=ft_made')
-    elif any([stem in string for stem in ['vyher', 'vyhr']]):
+    elif not stems.isdisjoint(('vyher', 'vyhr')):
         attributes.append('stat=wins')
-    elif any([stem in string for stem in ['strelec', 'strelc', ' bod']]):
+    elif not stems.isdisjoint(('strelec', 'strelc', ' bod')):
         attributes.append('stat=points')
     return attributes
 
+def parse(string):
+    """The intent and the attributes of the utterance, with the stems looked up in a single pass."""
+    stems = find_stems(string)
+    intent = ''
+    attributes = []
+    if string.startswith('kde'):
+        intent = 'request_game'
+        attributes.append('place=?')
+        add_team_g(string, stems, attributes)
+    elif string.startswith('kdy'):
+        intent = 'request_game'
+        attributes.append('time=?')
+        add_team_g(string, stems, attributes)
+    elif 'zapas' in stems or 'utkani' in stems:
+        intent = 'request_game'
+        add_time(string, stems, attributes)
+    elif string.startswith(('kolik', 'jaky pocet', 'na jake')):
+        intent = 'request_stats'
+        if not stems.isdisjoint(('kolikat', 'mist', 'pozic')):
+            attributes.append('rank=?')
+        else:
+            attributes.append('value=?')
+        add_stat(string, stems, attributes)
+        add_type(string, stems, attributes)
+        add_name(string, stems, attributes)
+    elif string.startswith(('kter', 'kdo', 'jak')):
+        intent = 'request_stats'
+        attributes.append('name=?')
+        add_type(string, stems, attributes)
+        add_nums(string, stems, attributes)
+        add_stat(string, stems, attributes)
+    elif 'zmen' in stems or 'nastav' in stems:
+        intent = 'set'
+        years = _YEAR.findall(string)
+        if len(years) == 1:
+            attributes.append(f'season={years[0]}')
+        add_team_s(string, stems, attributes)
+    return intent, attributes
+
 def to_DAIs(intent, attributes):
     items = []
     if intent:
@@ -95,44 +157,8 @@ def to_DAIs(intent, attributes):
 
 class BasketballNLU(Component):
     def __call__(self, dial, logger):
-        intent= ''
-        attributes = []
-        if dial['user'].startswith('kde'):
-            intent = 'request_game'
-            attributes.append('place=?')
-            attributes = add_team_g(dial['user'], attributes)
-        elif dial['user'].startswith('kdy'):
-            intent = 'request_game'
-            attributes.append('time=?')
-            attributes = add_team_g(dial['user'], attributes)
-        elif any([stem in dial['user'] for stem in ['zapas', 'utkani']]):
-            intent = 'request_game'
-            attributes = add_time(dial['user'], attributes)
-        elif any([dial['user'].startswith(stem) for stem in ['kolik', 'jaky pocet', 'na jake']]):
-            intent = 'request_stats'
-            if any([stem in dial['user'] for stem in ['kolikat', 'mist', 'pozic']]):
-                attributes.append('rank=?')
-            else:
-                attributes.append('value=?')
-            attributes = add_stat(dial['user'], attributes)
-            attributes = add_type(dial['user'], attributes)
-            attributes = add_name(dial['user'], attributes)
-        elif any([dial['user'].startswith(stem) for stem in ['kter', 'kdo', 'jak']]):
-            intent = 'request_stats'
-            attributes.append('name=?')
-            attributes = add_type(dial['user'], attributes)
-            attributes = add_nums(dial['user'], attributes)
-            attributes = add_stat(dial['user'], attributes)
-        elif any([stem in dial['user'] for stem in ['zmen', 'nastav']]):
-            intent = 'set'
-            years = re.findall('[0-9]{4}', dial['user'])
-            if len(years) == 1:
-                attributes.append(f'season={years[0]}')
-            attributes = add_team_s(dial['user'], attributes)
-                
-            
-        for item in to_DAIs(intent, attributes):
+        for item in to_DAIs(*parse(dial['user'])):
             dial['nlu'].append(item)
-        
+
         logger.info('NLU: %s', str(dial['nlu']))
-        return dial
\ No newline at end of file
+        return dial
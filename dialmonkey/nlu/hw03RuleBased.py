@@ -1,72 +1,101 @@
 from ..component import Component
 from ..da import DAI
+from ..utils import required_literals
 import re
 
+
+def _themes_over_category(s):
+    cat = 'all' if s.group('cat')[:3] == 'all' else s.group('cat')
+    return [DAI('show_tweeting_themes_of_user', 'user', cat),
+            DAI('show_tweeting_themes_of_user', 'time_range', s.group('time'))]
+
+
+def _show_tweet(s):
+    if 'lik' in s.group('metric'):
+        metric = 'likes'
+    elif 'retw' in s.group('metric'):
+        metric = 'RT'
+    elif 'comm' in s.group('metric'):
+        metric = 'comments'
+    else:
+        return [DAI('ask_again')]
+    return [DAI('show_tweet', 'pick_metric', s.group('mode') + '_' + metric)]
+
+
+# The rules in the order they are tried: a list of words (one of them has to be a word of the
+# utterance) or a regex searched in the utterance, and a function giving the DAIs for the match.
+RULES = [
+    (['hello', 'hey', 'hi'], lambda s: [DAI('greet')]),
+    (['bye', 'goodbye', 'good bye', 'see ya', 'see you'], lambda s: [DAI('goodbye')]),
+    (r"\b(show|list|what are|display)\b.*\bthemes\b", lambda s: [DAI('show_themes')]),
+    (r"\b(what|which)\b\s?\w*\s?\bthemes\b", lambda s: [DAI('show_themes')]),
+    (r"\bmost (.*)? themes? (?P<time>.*) over (?P<cat>all user cat|.*)$", _themes_over_category),
+    (r"(what is|show me|show|display) (the )?(?P<keyword>.*) theme",
+     lambda s: [DAI('show_theme_keywords', 'theme', s.group('keyword'))]),
+    (r"(add|append) (keyword|phrase|word|name)?[ ]?(?P<keyword>\w*) to (the )?theme (?P<theme_name>.*)$",
+     lambda s: [DAI('add_keyword_to_theme', 'keyword', s.group('keyword')),
+                DAI('add_keyword_to_theme', 'theme', s.group('theme_name'))]),
+    (r"(add|append) (keyword|phrase|word|name)?[ ]?(?P<keyword>\w*) to (the )?(?P<theme_name>.*) theme",
+     lambda s: [DAI('add_keyword_to_theme', 'keyword', s.group('keyword')),
+                DAI('add_keyword_to_theme', 'theme', s.group('theme_name'))]),
+    (r"(remove|delete) (the )?(?P<keyword>.*) theme", lambda s: [DAI('remove_theme', 'theme', s.group('keyword'))]),
+    (r"(what|which|list|show|show me|display) (user )?categories", lambda s: [DAI('show_user_categories')]),
+    (r"\badd (?P<query>.*) to (the )?(?P<cat>.*?)( user category| category)?$",
+     lambda s: [DAI('search_user', 'query', s.group('query')),
+                DAI('add_user_to_category', 'user', 'RESULT'),
+                DAI('add_user_to_category', 'user_category', s.group('cat'))]),
+    (r"\b(list|show me|display|show).*in (the )?(?P<cat>.*?)( user category| category)?$",
+     lambda s: [DAI('show_users_in_category', 'category', s.group('cat'))]),
+    (r"\b(how prevalent is|how common is|how frequent is|frequency of|prevalence of)( the keyword)? (?P<keyword>.*) in( the) (?P<time>.*)$",
+     lambda s: [DAI('show_keyword_frequency_in_user_category', 'time_range', s.group('time')),
+                DAI('show_keyword_frequency_in_user_category', 'keyword', s.group('keyword')),
+                DAI('show_keyword_frequency_in_user_category', 'user_category', 'all')]),
+    (r"\bwhat does (?P<query>.*) (tweet about|keep tweeting about|mentions|pay attention to) (?P<time>.*)$",
+     lambda s: [DAI('search_user', 'query', s.group('query')),
+                DAI('show_tweeting_themes_of_user', 'user', 'RESULT'),
+                DAI('show_tweeting_themes_of_user', 'time_range', s.group('time'))]),
+    (r"\b(what is|show me)( the| the tweet with the| the tweet with)? (?P<mode>most|least) (?P<metric>\w*)( tweet|$)?",
+     _show_tweet),
+]
+
+
+class RuleTable:
+    """
+    The rules compiled once. For every utterance, the literal strings required by the regexes
+    are looked up at once, and only the regexes whose literals are all present are searched
+    (each a single time, giving both the decision and the groups).
+    """
+    def __init__(self, rules):
+        self._rules = []
+        for condition, action in rules:
+            if isinstance(condition, str):
+                self._rules.append((None, re.compile(condition), required_literals(condition), action))
+            else:
+                self._rules.append((frozenset(condition), None, frozenset(), action))
+        self._literals = sorted(set().union(*(r[2] for r in self._rules)))
+
+    def __call__(self, text):
+        present = {lit for lit in self._literals if lit in text}
+        words = None
+        for keywords, regex, literals, action in self._rules:
+            if keywords is not None:
+                if words is None:
+                    words = set(text.split())
+                if not keywords.isdisjoint(words):
+                    return action(None)
+            elif literals <= present:
+                s = regex.search(text)
+                if s is not None:
+                    return action(s)
+        return []
+
+
 class RuleBased(Component):
+    _rules = RuleTable(RULES)
+
     def __call__(self, dial, logger):
-        # I do realize that copying the regexes two times and not compiling it is a very
-        # bad coding practice but since that isn't the goal of this assignment I decided to
-        # invest the effort to other parts of the assignment
-        if any([w in dial.user.split() for w in ['hello', 'hey', 'hi']]):
-            dial.nlu.append(DAI('greet'))
-        elif any([w in dial.user.split() for w in ['bye', 'goodbye', 'good bye', 'see ya', 'see you']]):
-            dial.nlu.append(DAI('goodbye'))
-        elif re.search(r"\b(show|list|what are|display)\b.*\bthemes\b", dial.user):
-            dial.nlu.append(DAI('show_themes'))
-        elif re.search(r"\b(what|which)\b\s?\w*\s?\bthemes\b", dial.user):
-            dial.nlu.append(DAI('show_themes'))
-        elif re.search(r"\bmost (.*)? themes? (?P<time>.*) over (?P<cat>all user cat|.*)$", dial.user):
-            s = re.search(r"\bmost (.*)? themes? (?P<time>.*) over (?P<cat>all user cat|.*)$", dial.user)
-            cat = 'all' if s.group('cat')[:3] == 'all' else s.group('cat')
-            dial.nlu.append(DAI('show_tweeting_themes_of_user', 'user', cat))
-            dial.nlu.append(DAI('show_tweeting_themes_of_user', 'time_range', s.group('time')))
-        elif re.search(r"(what is|show me|show|display) (the )?(.*) theme", dial.user):
-            theme_name = re.search(r"(what is|show me|show|display) (the )?(?P<keyword>.*) theme", dial.user).group('keyword')
-            dial.nlu.append(DAI('show_theme_keywords', 'theme', theme_name))
-        elif re.search(r"(append|add) (keyword|phrase|word|name)?[ ]?(?P<keyword>\w*) to (the )?theme (?P<theme_name>.*)$", dial.user):
-            s = re.search(r"(add|append) (keyword|phrase|word|name)?[ ]?(?P<keyword>\w*) to (the )?theme (?P<theme_name>.*)$", dial.user)
-            dial.nlu.append(DAI('add_keyword_to_theme', 'keyword', s.group('keyword')))
-            dial.nlu.append(DAI('add_keyword_to_theme', 'theme', s.group('theme_name')))
-        elif re.search(r"(add|append) (keyword|phrase|word|name)?[ ]?(?P<keyword>\w*) to (the )?(?P<theme_name>.*) theme", dial.user):
-            s = re.search(r"(add|append) (keyword|phrase|word|name)?[ ]?(?P<keyword>\w*) to (the )?(?P<theme_name>.*) theme", dial.user)
-            dial.nlu.append(DAI('add_keyword_to_theme', 'keyword', s.group('keyword')))
-            dial.nlu.append(DAI('add_keyword_to_theme', 'theme', s.group('theme_name')))
-        elif re.search(r"(remove|delete) (the )?(?P<keyword>.*) theme", dial.user):
-            s = re.search(r"(remove|delete) (the )?(?P<keyword>.*) theme", dial.user)
-            dial.nlu.append(DAI('remove_theme', 'theme', s.group('keyword')))
-        elif re.search(r"(what|which|list|show|show me|display) (user )?categories", dial.user):
-            dial.nlu.append(DAI('show_user_categories'))
-        elif re.search(r"\badd (?P<query>.*) to (the )?(?P<cat>.*?)( user category| category)?$", dial.user):
-            s = re.search(r"\badd (?P<query>.*) to (the )?(?P<cat>.*?)( user category| category)?$", dial.user)
-            dial.nlu.append(DAI('search_user', 'query', s.group('query')))
-            dial.nlu.append(DAI('add_user_to_category', 'user', 'RESULT'))
-            dial.nlu.append(DAI('add_user_to_category', 'user_category', s.group('cat')))
-        elif re.search(r"\b(list|show me|display|show).*in (the )?(?P<cat>.*?)( user category| category)?$", dial.user):
-            s = re.search(r"\b(list|show me|display|show).*in (the )?(?P<cat>.*?)( user category| category)?$", dial.user)
-            dial.nlu.append(DAI('show_users_in_category', 'category', s.group('cat')))
-        elif re.search(r"\b(how prevalent is|how common is|how frequent is|frequency of|prevalence of)( the keyword)? (?P<keyword>.*) in( the) (?P<time>.*)$", dial.user):
-            s = re.search(r"\b(how prevalent is|how common is|how frequent is|frequency of|prevalence of)( the keyword)? (?P<keyword>.*) in( the) (?P<time>.*)$", dial.user)
-            dial.nlu.append(DAI('show_keyword_frequency_in_user_category', 'time_range', s.group('time')))
-            dial.nlu.append(DAI('show_keyword_frequency_in_user_category', 'keyword', s.group('keyword')))
-            dial.nlu.append(DAI('show_keyword_frequency_in_user_category', 'user_category', 'all'))
-        elif re.search(r"\bwhat does (?P<query>.*) (tweet about|keep tweeting about|mentions|pay attention to) (?P<time>.*)$", dial.user):
-            s = re.search(r"\bwhat does (?P<query>.*) (tweet about|keep tweeting about|mentions|pay attention to) (?P<time>.*)$", dial.user)
-            dial.nlu.append(DAI('search_user', 'query', s.group('query')))
-            dial.nlu.append(DAI('show_tweeting_themes_of_user', 'user', 'RESULT'))
-            dial.nlu.append(DAI('show_tweeting_themes_of_user', 'time_range', s.group('time')))
-        elif re.search(r"\b(what is|show me)( the| the tweet with the| the tweet with)? (?P<mode>most|least) (?P<metric>\w*)( tweet|$)?", dial.user):
-            s = re.search(r"\b(what is|show me)( the| the tweet with the| the tweet with)? (?P<mode>most|least) (?P<metric>\w*)( tweet|$)?", dial.user)
-            metric = None
-            if 'lik' in s.group('metric'):
-                metric = 'likes'
-            elif 'retw' in s.group('metric'):
-                metric = 'RT'
-            elif 'comm' in s.group('metric'):
-                metric = 'comments'
-            else:
-                dial.nlu.append(DAI('ask_again'))
-            if metric is not None:
-                dial.nlu.append(DAI('show_tweet', 'pick_metric', s.group('mode') + '_' + metric))
+        for dai in self._rules(dial.user):
+            dial.nlu.append(dai)
 
         logger.info('NLU: %s', str(dial.nlu))
         return dial
@@ -2,9 +2,10 @@ import pandas as pd
 from hw04.train_model import NULL_TOKEN, NOVAL_TOKEN
 from ..component import Component
 from ..da import DAI
+from .stacked_logreg import StackedLogisticRegression
 import lzma
 import pickle
-import numpy as np
+from scipy import sparse
 
 
 class SNLU(Component):
@@ -22,6 +23,7 @@ class SNLU(Component):
             self.tfidf_chars = pickle.load(model_file)
         with lzma.open(model_path + ".tfidf_word", "rb") as model_file:
             self.tfidf_words = pickle.load(model_file)
+        self.model = StackedLogisticRegression(self.models, self.oe.categories_)
         super().__init__(*args, **kwargs)
 
 
@@ -29,12 +31,9 @@ class SNLU(Component):
         X = [dial.user]
         char_features = self.tfidf_chars.transform(X)
         word_features = self.tfidf_words.transform(X)
-        features = np.append(char_features.toarray(), word_features.toarray(), 1)
+        features = sparse.hstack([char_features, word_features], format='csr')
 
-        predictions = np.empty(shape=(1, len(self.labels)), dtype=int)
-        for idx, model in enumerate(self.models):
-            predictions[:, idx] = model.predict(features)
-        predictions = self.oe.inverse_transform(predictions)
+        predictions = self.model.predict(features)
 
         for idx, (intent, slot) in enumerate(self.labels):
             for value in predictions[:, idx]:
@@ -2,9 +2,10 @@ import pandas as pd
 from hw04.train_model import NULL_TOKEN, NOVAL_TOKEN
 from ..component import Component
 from ..da import DAI
+from .stacked_logreg import StackedLogisticRegression
 import lzma
 import pickle
-import numpy as np
+from scipy import sparse
 
 
 class SNLU(Component):
@@ -22,6 +23,7 @@ class SNLU(Component):
             self.tfidf_chars = pickle.load(model_file)
         with lzma.open(model_path + ".tfidf_word", "rb") as model_file:
             self.tfidf_words = pickle.load(model_file)
+        self.model = StackedLogisticRegression(self.models, self.oe.categories_)
         super().__init__(*args, **kwargs)
 
 
@@ -29,15 +31,10 @@ class SNLU(Component):
         X = [dial.user]
         char_features = self.tfidf_chars.transform(X)
         word_features = self.tfidf_words.transform(X)
-        features = np.append(char_features.toarray(), word_features.toarray(), 1)
-
-        predictions = []
-        for idx, model in enumerate(self.models):
-            probs = {}
-            for c, p in zip(model.classes_, model.predict_proba(features)[0]):
-                class_label = self.oe.categories_[idx][c]
-                probs[class_label] = p
-            predictions.append(probs)
+        features = sparse.hstack([char_features, word_features], format='csr')
+
+        probs = self.model.predict_proba(features)[0]
+        predictions = [dict(zip(classes, p)) for classes, p in zip(self.model.classes, probs)]
 
         for idx, (intent, slot) in enumerate(self.labels):
             for value, confidence in predictions[idx].items():
@@ -4,7 +4,9 @@ from itertools import chain
 from dialmonkey.repositories import SolarRepository
 from collections import deque
 from itertools import starmap
+from functools import lru_cache
 import re
+from dialmonkey.utils import required_literals
 
 def create_intent_formatter(intent, **default_slots):
     def formatter(**x):
@@ -20,6 +22,8 @@ def regex_parser(reg, formatter):
             if callable(formatter): return formatter(**match.groupdict())
             else: return formatter
         return None
+    call.pattern = reg
+    call.formatter = formatter
     return call
 
 def Sequential(*parsers):
@@ -30,6 +34,34 @@ def Sequential(*parsers):
         return None
     return call
 
+# Same as Sequential on regex_parsers, but tries all the rules in a single regex match.
+# Rules that cannot match (some of their literals are missing in the input) are left out
+# of the combined regex, the combined regexes for the candidate rule sets are cached.
+def Compiled(*parsers, cache_size=512):
+    group_regex = re.compile(r'\(\?P([<=])(\w+)')
+    rules = []
+    for i, f in enumerate(parsers):
+        pattern = group_regex.sub(lambda m: f'(?P{m.group(1)}_r{i}_{m.group(2)}', f.pattern)
+        groups = [(f'_r{i}_{name}', name) for name in re.compile(f.pattern).groupindex]
+        rules.append((f'(?P<_r{i}>{pattern})', groups, f.formatter, required_literals(f.pattern)))
+    all_literals = sorted(set().union(*(r[3] for r in rules)))
+
+    @lru_cache(maxsize=cache_size)
+    def combined(candidates):
+        return re.compile('|'.join(rules[i][0] for i in candidates))
+
+    def call(x):
+        present = {lit for lit in all_literals if lit in x}
+        candidates = tuple(i for i, rule in enumerate(rules) if rule[3] <= present)
+        if not candidates: return None
+        match = combined(candidates).match(x)
+        if match is None: return None
+        _, groups, formatter, _ = rules[int(match.lastgroup[2:])]
+        if callable(formatter): return formatter(**{name: match.group(group) for group, name in groups})
+        return formatter
+    call.cache_info = combined.cache_info
+    return call
+
 def simplify(x):
     x = x.lower()
     words = []
@@ -52,22 +84,68 @@ def simplify(x):
     x = re.sub(r'(^|\s)us($|\s)', lambda m: m.group(1) + 'earth' + m.group(2), x)
     return x
 
-# Builds a function which replaces known words with tokens
-def build_tokenize(repo: SolarRepository):
-    objectRegex = re.compile(r'(?:^|\s)(' + "|".join([re.escape(simplify(x['englishName'])) for x in repo.bodies() if x['englishName']]) + r')(?:$|\s)') 
-    def tokenize(x): 
-        matches = []
-        def map_match(x):
-            def fn(match):
-                matches.append(match.group(1))
-                return match.group(0).replace(match.group(1), x)
-            return fn
-        x = objectRegex.sub(map_match('<object>'), x)
-        return x, matches
+# Trie over the words of names: every node maps a word to the next node, the _END key
+# marks nodes where a complete name ends
+_END = None
+def build_trie(names):
+    root = {}
+    for name in names:
+        node = root
+        for word in name.split():
+            node = node.setdefault(word, {})
+        node[_END] = True
+    return root
+
+# Number of names from which the trie is faster than the regex (benchmarks/solar_parser.py)
+TRIE_MIN_NAMES = 150
+
+# Builds a function which replaces known words with tokens. Names are matched on whole words,
+# the longest name wins. A regex alternation of the names is the fastest for small catalogues
+# (e.g. the bundled one), but it tries every name at every word, so large catalogues use a trie
+# of the words of the names instead (whose time per utterance does not depend on their number).
+def build_tokenize(repo: SolarRepository, trie=None):
+    names = {simplify(x['englishName']) for x in repo.bodies() if x['englishName']}
+    if trie is None:
+        trie = len(names) >= TRIE_MIN_NAMES
+    return _trie_tokenize(names) if trie else _regex_tokenize(names)
+
+def _regex_tokenize(names):
+    if not names:
+        return lambda x: (x, [])
+    # longest names first, so that they win over their prefixes; the spaces around are not consumed
+    objectRegex = re.compile(r'(?<!\S)(?:' + '|'.join(map(re.escape, sorted(names, key=len, reverse=True))) + r')(?!\S)')
+    def tokenize(x):
+        matches = objectRegex.findall(x)
+        return (objectRegex.sub('<object>', x) if matches else x), matches
+    return tokenize
+
+def _trie_tokenize(names):
+    trie = build_trie(names)
+    whitespace = re.compile(r'(\s+)')
+    def tokenize(x):
+        parts = whitespace.split(x) # words at even positions, whitespace at odd positions
+        result, matches = [], []
+        i = 0
+        while i < len(parts):
+            node, end, j = trie, -1, i
+            while parts[j] in node:
+                node = node[parts[j]]
+                if _END in node: end = j
+                if j + 2 >= len(parts) or parts[j + 1] != ' ': break # names have single spaces
+                j += 2
+            if end >= 0:
+                matches.append(''.join(parts[i:end + 1]))
+                result.append('<object>')
+                i = end + 1
+            else:
+                result.append(parts[i])
+                i += 1
+        return ''.join(result), matches
     return tokenize
 
-# Build the parser used to parse the expression
-def build_parser():
+# Build the parser used to parse the expression; the rules are tried in the given order,
+# either all at once (compiled) or one by one
+def build_parser(compiled=True):
     free_start = r'^(?:.*\s|)'
     free_end = r'(?:\s.*|)$'
     fr = r'(?:\s.*|)'
@@ -76,7 +154,7 @@ def build_parser():
     propertyval = '|'.join(['gravity'] + list(propertymap.values()))
     def map_object(x):
         return x.replace(' ', '_')
-    return Sequential(
+    rules = (
         # Request planets
         regex_parser(free_start + rf'(?:which|what) is{fr} (?P<f>biggest|largest|smallest|closest|furthest|heaviest|lightest){fr} (?P<o>planet|body|asteroid|moon|gas giant)' + free_end,lambda f, o,**k: f'request(filter={f},object={map_object(o)})'),
         regex_parser(free_start + rf'(?:what|which){fr} (?P<o>planet|body|asteroid|moon|gas giant) is{fr} (?P<f>biggest|largest|smallest|closest|furthest|heaviest|lightest)' + free_end,lambda f, o,**k: f'request(filter={f},object={map_object(o)})'),
@@ -171,11 +249,12 @@ def build_parser():
         regex_parser(free_start + rf'(?:thanks|thank)' + free_end, 'goodbye(thanks)'),
         regex_parser(free_start + rf'(?:ok|goodbye|that is all)' + free_end, 'goodbye()'),
     )
+    return Compiled(*rules) if compiled else Sequential(*rules)
 
 class SolarSystemNLU(Component):
     def __init__(self, *args, repo = None, **kwargs):
         super().__init__(*args,**kwargs)
-        self._repo = repo if repo is not None else SolarRepository()
+        self._repo = repo if repo is not None else SolarRepository.shared()
         self._parser = build_parser()
         self._tokenize = build_tokenize(self._repo)
         self._match_token = re.compile(r'<\w+>')
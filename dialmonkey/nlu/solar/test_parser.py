@@ -44,10 +44,27 @@ def test_tokenize_moons():
     assert result == 'moons'
     assert len(matches) == 0
 
+@pytest.mark.parametrize('trie', [False, True])
+def test_tokenize_longest_match(trie):
+    class DummyRepository:
+        def bodies(self):
+            return [
+                dict(englishName='Halley'),
+                dict(englishName='Halley Comet'),
+                dict(englishName='Io'),
+                dict(englishName=''),
+            ]
+    tokenize = parser.build_tokenize(DummyRepository(), trie=trie)
+    result, matches = tokenize('is halley comet closer than halley or io')
+    assert result == 'is <object> closer than <object> or <object>'
+    assert matches == ['halley comet', 'halley', 'io']
+    assert tokenize('halley  comet io') == ('<object>  comet <object>', ['halley', 'io'])
+    assert tokenize('iota') == ('iota', [])
+
 @pytest.fixture
 def repo():
     from dialmonkey.repositories.solar import SolarRepository
-    return SolarRepository()
+    return SolarRepository(offline=True)
 
 expression_file = os.path.join(os.path.dirname(__file__), '../../../data/solar-expressions.tsv')
 @pytest.mark.parametrize('input,output', [tuple(x.strip().split('\t')) for x in open(expression_file, 'r') if x.strip() != ''])
@@ -120,3 +137,18 @@ def test_solar_nlu_invalid():
     assert isinstance(dial.nlu, DA)
     assert len(dial.nlu.dais) == 0
     assert dial.nlu.to_cambridge_da_string() == ''
+
+def test_compiled_parser_matches_sequential():
+    import random
+    sequential = parser.build_parser(compiled=False)
+    compiled = parser.build_parser()
+    inputs = [parser.simplify(x.split('\t')[0]) for x in open(expression_file, 'r') if x.strip() != '']
+    rnd = random.Random(0)
+    words = ' '.join(inputs).split()
+    inputs += [' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 12))) for _ in range(500)]
+    for x in inputs:
+        assert compiled(x) == sequential(x), x
+
+def test_required_literals():
+    assert parser.required_literals(r'^(?:.*\s|)how many moons(?:\s.*|) it (?:have|has)') == {'how many moons', ' it ha'}  # common prefix of the branches
+    assert parser.required_literals(r'(?:list|list of) them') == {'list', ' them'}
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class StackedLogisticRegression:
+    """Inference for many fitted (binary or multinomial) `LogisticRegression` models over the
+    same features at once.
+
+    The coefficients of all models are stacked into one (features x columns) matrix, a column
+    per class (a binary model gets a zero column for its first class, so that its sigmoid is a
+    softmax over the two columns). The scores of all models are a single product with the
+    (sparse) features, and the per-model softmax runs over a padded (models x classes) grid.
+    Class codes are decoded through `categories` (e.g. `OrdinalEncoder.categories_`) by lookup
+    tables built here, so only the predicted classes are decoded.
+
+    The predictions and probabilities are the same as of the models' `predict`/`predict_proba`.
+    """
+    def __init__(self, models, categories):
+        coefs, intercepts, segments = [], [], []
+        self.classes = []
+        for model, model_categories in zip(models, categories):
+            coef = np.asarray(model.coef_, dtype=float)
+            intercept = np.broadcast_to(np.asarray(model.intercept_, dtype=float), coef.shape[:1])
+            if len(model.classes_) == 2:
+                coef = np.vstack([np.zeros_like(coef), coef])
+                intercept = np.concatenate([[0.0], intercept])
+            start = sum(len(c) for c in coefs)
+            segments.append((start, len(coef)))
+            coefs.append(coef)
+            intercepts.append(intercept)
+            self.classes.append([model_categories[c] for c in model.classes_])
+
+        self._coef = np.ascontiguousarray(np.vstack(coefs).T)
+        self._intercept = np.concatenate(intercepts)
+        width = max(size for _, size in segments)
+        padding = len(self._intercept)  # index of a -inf column appended to the scores
+        self._grid = np.full((len(segments), width), padding)
+        for idx, (start, size) in enumerate(segments):
+            self._grid[idx, :size] = np.arange(start, start + size)
+        self._labels = np.empty(self._grid.shape, dtype=object)
+        for idx, labels in enumerate(self.classes):
+            self._labels[idx, :len(labels)] = labels
+
+    def decision_function(self, X):
+        """Scores of the classes of every model, shape (samples, models, classes), padded with -inf."""
+        scores = X @ self._coef + self._intercept
+        scores = np.concatenate([scores, np.full((scores.shape[0], 1), -np.inf)], axis=1)
+        return scores[:, self._grid]
+
+    def predict(self, X):
+        """Predicted classes (decoded), shape (samples, models)."""
+        best = np.argmax(self.decision_function(X), axis=2)
+        return self._labels[np.arange(len(self._labels)), best]
+
+    def predict_proba(self, X):
+        """Class probabilities of every model, shape (samples, models, classes), padded with zeros;
+        the probabilities of the model `idx` belong to the classes in `self.classes[idx]`."""
+        scores = self.decision_function(X)
+        scores -= scores.max(axis=2, keepdims=True)
+        probs = np.exp(scores)
+        probs /= probs.sum(axis=2, keepdims=True)
+        return probs
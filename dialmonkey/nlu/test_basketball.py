@@ -0,0 +1,101 @@
+from logging import getLogger
+
+import pytest
+
+from .basketball import BasketballNLU, find_stems
+from dialmonkey.dialogue import Dialogue
+
+# outputs of the original implementation (substring checks and re calls per helper)
+GOLDEN = [
+    ('kde hraje muj tym', 'request_game(place=?,team=default)'),
+    ('kde hraje tym na sparta praha', "request_game(place=?,team='sparta praha')"),
+    ('kde hraje tym usk praha', "request_game(place=?,team='usk praha')"),
+    ('kde se hraje', 'request_game(place=?)'),
+    ('kdy hraje moje tym', 'request_game(time=?,team=default)'),
+    ('kdy hraje tym nymburk', 'request_game(time=?,team=nymburk)'),
+    ('kdy hraje meho tym dnes', 'request_game(time=?,team=default)'),
+    ('kdy je dalsi zapas', 'request_game(time=?)'),
+    ('jaky je zapas dnes', 'request_game(time=today)'),
+    ('zapas zitra', 'request_game(time=tommorow)'),
+    ('utkani 12. 5.', "request_game(time='12. 5.')"),
+    ('kdy bude utkani 1.2.', 'request_game(time=?)'),
+    ('jake zapasy se hraji 3 4 a 5 6', 'request_game()'),
+    ('zapas 12.5', 'request_game(time=12.5)'),
+    ('utkani', 'request_game()'),
+    ('mam zapas 1 2', "request_game(time='1 2')"),
+    ('kolik bodu dal hrac jan novak', "request_stats(value=?,stat=points,type=player,name='jan novak')"),
+    ('kolik trojek dal tym sparta', 'request_stats(value=?,stat=3_pt_made,type=team,name=sparta)'),
+    ('kolik dvojek ma hrac petr', 'request_stats(value=?,stat=2_pt_made,type=player,name=petr)'),
+    ('kolikaty je tym nymburk', 'request_stats(rank=?,type=team,name=nymburk)'),
+    ('kolik trestnych hodu dal hrac karel', 'request_stats(value=?,stat=ft_made,type=player,name=karel)'),
+    ('kolik procent uspesnych sestek ma hrac karel', 'request_stats(value=?,stat=ft_percentage,type=player,name=karel)'),
+    ('kolik vyher ma muj tym', 'request_stats(value=?,stat=wins,type=team,name=default)'),
+    ('kolik vyhranych zapasu ma vychozi tym', 'request_game()'),
+    ('kolik bodu ma strelec', 'request_stats(value=?,stat=points)'),
+    ('jaky pocet bodu ma hrac novak', 'request_stats(value=?,stat=points,type=player,name=novak)'),
+    ('na jake pozici je tym brno', 'request_stats(rank=?,type=team,name=brno)'),
+    ('na jakem miste je hrac novak', 'request_stats(rank=?,type=player,name=novak)'),
+    ('kolik dvoubodovych hodu dal tym', 'request_stats(value=?,stat=2_pt_made,type=team)'),
+    ('kolik tribodovych', 'request_stats(value=?,stat=3_pt_made)'),
+    ('kolik trojek', 'request_stats(value=?,stat=3_pt_made)'),
+    ('kolik', 'request_stats(value=?)'),
+    ('kolik strelcu', 'request_stats(value=?,stat=points)'),
+    ('kolik bodu ma hrac', 'request_stats(value=?,stat=points,type=player)'),
+    ('kolik bodu ma hrac novak a tym brno', 'request_stats(value=?,stat=points,type=player)'),
+    ('kdo dal nejvic bodu', 'request_stats(name=?,rank=1,stat=points)'),
+    ('kdo je nejlepsi strelec', 'request_stats(name=?,rank=1,stat=points)'),
+    ('kdo je 3. nejlepsi hrac', 'request_stats(name=?,type=player,rank=3)'),
+    ('kdo ma 20 bodu', 'request_stats(name=?,value=20,stat=points)'),
+    ('ktery tym ma nejvic vyher', 'request_stats(name=?,type=team,rank=1,stat=wins)'),
+    ('ktery hrac dal 5 trojek', 'request_stats(name=?,type=player,value=5,stat=3_pt_made)'),
+    ('jaky hrac je nejlepsi', 'request_stats(name=?,type=player,rank=1)'),
+    ('kdo ma 10 a 20 bodu', 'request_stats(name=?,stat=points)'),
+    ('kdo vyhral', 'request_stats(name=?,stat=wins)'),
+    ('kter tym 2.', 'request_stats(name=?,type=team,rank=2)'),
+    ('jak se jmenuje nejlepsi strelec', 'request_stats(name=?,rank=1,stat=points)'),
+    ('kdo dal nejvice trestnych hodu', 'request_stats(name=?,rank=1,stat=ft_made)'),
+    ('kdo ma nejvetsi procento uspesnosti sestek', 'request_stats(name=?,rank=1,stat=ft_percentage)'),
+    ('zmen sezonu na 2019', 'set(season=2019)'),
+    ('nastav muj tym na sparta', 'set(default,team=sparta)'),
+    ('nastav vychozi tym nymburk', 'set(default,team=nymburk)'),
+    ('zmen tym na brno', 'set(team=brno)'),
+    ('nastav sezonu 2018 a 2019', 'set()'),
+    ('zmenit sezonu 2020 tym usk', 'set(season=2020,team=usk)'),
+    ('zmen neco', 'set()'),
+    ('ahoj', ''),
+    ('', ''),
+    ('dobry den', ''),
+    ('hrac novak', ''),
+    ('tym brno', ''),
+    ('kde hraje nase tym brno', 'request_game(place=?,team=brno)'),
+    ('kolik bodu dal hrac\nnovak', 'request_stats(value=?,stat=points,type=player)'),
+    ('kdo dal dvojku', 'request_stats(name=?,stat=2_pt_made)'),
+    ('kdo dal trojku', 'request_stats(name=?,stat=3_pt_made)'),
+    ('kdo ma nejvic doskoku', 'request_stats(name=?,rank=1)'),
+    ('kolik trestnych hodu a procent', 'request_stats(value=?,stat=ft_percentage)'),
+    ('kdo ma 12. misto', 'request_stats(name=?,rank=12)'),
+]
+
+# no team name after "tym" (the original implementation fails the same way)
+FAILING = ['kde hraje tym', 'nastav tym', 'kdy hraje tymy', 'kde hraje muj  tym']
+
+
+@pytest.mark.parametrize('utterance,da', GOLDEN)
+def test_golden(utterance, da):
+    dial = Dialogue()
+    dial.user = utterance
+    assert BasketballNLU()(dial, getLogger()).nlu.to_cambridge_da_string() == da
+
+
+@pytest.mark.parametrize('utterance', FAILING)
+def test_missing_team(utterance):
+    dial = Dialogue()
+    dial.user = utterance
+    with pytest.raises(IndexError):
+        BasketballNLU()(dial, getLogger())
+
+
+def test_find_stems():
+    string = 'kolik bodu dal hrac novak z tymu'
+    assert find_stems(string) == {' bod', ' hrac', 'tym', ' tym'}
+    assert find_stems('kdo dal nejvic trojek') == {' nejv', 'tr'}
@@ -0,0 +1,57 @@
+from logging import getLogger
+
+import pytest
+
+from .hw03RuleBased import RuleBased
+from dialmonkey.dialogue import Dialogue
+
+# outputs of the original if/elif implementation
+GOLDEN = [
+    ("hello", "greet()"),
+    ("bye", "goodbye()"),
+    ("show me available themes", "show_themes()"),
+    ("what is the covid theme", "show_theme_keywords(theme=covid)"),
+    ("add keyword Johnson to the covid theme", "add_keyword_to_theme(keyword=Johnson,theme=covid)"),
+    ("remove covid theme please", "remove_theme(theme=covid)"),
+    ("delete covid theme please", "remove_theme(theme=covid)"),
+    ("what user categories do you follow", "show_user_categories()"),
+    ("add dominik feri to the czech politicians user category",
+     "search_user(query='dominik feri')&add_user_to_category(user=RESULT,user_category='czech politicians')"),
+    ("list users in the czech politicians category", "show_users_in_category(category='czech politicians')"),
+    ("i was wondering how prevalent is the keyword covid in the last month",
+     "show_keyword_frequency_in_user_category(time_range='last month',keyword=covid,user_category=all)"),
+    ("I was wondering what is the most frequent theme this month over all user categories",
+     "show_tweeting_themes_of_user(user=all,time_range='this month')"),
+    ("what does kamala harris tweet about this week",
+     "search_user(query='kamala harris')&show_tweeting_themes_of_user(user=RESULT,time_range='this week')"),
+    ("what is the most retweeted tweet", "show_tweet(pick_metric=most_RT)"),
+    ("show me the tweet with most likes", "show_tweet(pick_metric=most_likes)"),
+    ("show me the most liked tweet", "show_tweet(pick_metric=most_likes)"),
+    ("hi there", "greet()"),
+    ("say goodbye now", "goodbye()"),
+    ("which themes do you have", "show_themes()"),
+    ("list all themes please", "show_themes()"),
+    ("append word vaccine to theme covid", "add_keyword_to_theme(keyword=vaccine,theme=covid)"),
+    ("add rusko to the zeman theme", "add_keyword_to_theme(keyword=rusko,theme=zeman)"),
+    ("show me the zeman theme", "show_theme_keywords(theme=zeman)"),
+    ("display users in the artists category", "show_users_in_category(category=artists)"),
+    ("frequency of covid in the last week",
+     "show_keyword_frequency_in_user_category(time_range='last week',keyword=covid,user_category=all)"),
+    ("what does andrej babis keep tweeting about last year",
+     "search_user(query='andrej babis')&show_tweeting_themes_of_user(user=RESULT,time_range='last year')"),
+    ("what is the least commented tweet", "show_tweet(pick_metric=least_comments)"),
+    ("show me the most boring tweet", "ask_again()"),
+    ("which user categories", "show_user_categories()"),
+    ("nothing matches here", ""),
+    ("Hello", ""),
+    ("what is the most popular theme last week over czech politicians",
+     "show_tweeting_themes_of_user(user='czech politicians',time_range='last week')"),
+    ("add lil nas x to artists", "search_user(query='lil nas x')&add_user_to_category(user=RESULT,user_category=artists)"),
+]
+
+
+@pytest.mark.parametrize('utterance,da', GOLDEN)
+def test_golden(utterance, da):
+    dial = Dialogue()
+    dial.user = utterance
+    assert RuleBased()(dial, getLogger()).nlu.to_cambridge_da_string() == da
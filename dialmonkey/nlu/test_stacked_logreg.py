@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import OrdinalEncoder
+
+from .stacked_logreg import StackedLogisticRegression
+
+UTTERANCES = ['i want a cheap restaurant', 'looking for expensive food in the north', 'hello',
+              'thank you goodbye', 'what is the phone number', 'cheap chinese food in the south',
+              'is there anything moderately priced', 'the address please', 'bye', 'any italian place',
+              'expensive indian restaurant in the centre', 'what about the east part of town']
+# (intent, slot) -> value for every utterance, as in hw04/train_model.py
+TARGETS = [
+    ['null', 'null', 'hello', 'null', 'null', 'null', 'null', 'null', 'null', 'null', 'null', 'null'],
+    ['cheap', 'expensive', 'null', 'null', 'null', 'cheap', 'moderate', 'null', 'null', 'null', 'expensive', 'null'],
+    ['null', 'north', 'null', 'null', 'null', 'south', 'null', 'null', 'null', 'null', 'centre', 'east'],
+    ['null', 'null', 'null', 'null', 'phone', 'null', 'null', 'addr', 'null', 'null', 'null', 'null'],
+]
+
+
+@pytest.fixture(scope='module')
+def trained():
+    tfidf_chars = TfidfVectorizer(analyzer='char_wb', ngram_range=(1, 3), max_features=300)
+    tfidf_words = TfidfVectorizer(ngram_range=(1, 2))
+    features = sparse.hstack([tfidf_chars.fit_transform(UTTERANCES), tfidf_words.fit_transform(UTTERANCES)],
+                             format='csr')
+    oe = OrdinalEncoder(dtype=int)
+    target = oe.fit_transform(np.array(TARGETS, dtype=object).T)
+    models = [LogisticRegression(C=100, class_weight='balanced', max_iter=500) for _ in TARGETS]
+    for idx, model in enumerate(models):
+        model.fit(features.toarray(), target[:, idx])
+    test = ['cheap food in the north', 'hello there', 'phone number of an expensive place', 'xyz', '']
+    test_features = sparse.hstack([tfidf_chars.transform(test), tfidf_words.transform(test)], format='csr')
+    return models, oe, test_features
+
+
+def test_predict(trained):
+    models, oe, features = trained
+    expected = oe.inverse_transform(np.stack([model.predict(features.toarray()) for model in models], axis=1))
+    assert (StackedLogisticRegression(models, oe.categories_).predict(features) == expected).all()
+
+
+def test_predict_proba(trained):
+    models, oe, features = trained
+    stacked = StackedLogisticRegression(models, oe.categories_)
+    probs = stacked.predict_proba(features)
+    for idx, model in enumerate(models):
+        expected = model.predict_proba(features.toarray())
+        assert stacked.classes[idx] == [oe.categories_[idx][c] for c in model.classes_]
+        assert np.allclose(probs[:, idx, :len(model.classes_)], expected)
+        assert (probs[:, idx, len(model.classes_):] == 0).all()
+
+
+def test_single_sample(trained):
+    models, oe, features = trained
+    stacked = StackedLogisticRegression(models, oe.categories_)
+    assert (stacked.predict(features[1]) == stacked.predict(features)[1:2]).all()
+    assert stacked.predict(features[1])[0, 0] == 'hello'
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+from .text import FileOutput
+
+
+@pytest.mark.parametrize('batch_size,background', [(1, False), (7, False), (1, True), (16, True)])
+def test_order_and_close(tmp_path, batch_size, background):
+    path = tmp_path / 'output.txt'
+    output = FileOutput({'output_file': str(path), 'output_batch_size': batch_size,
+                         'output_background': background, 'output_queue_size': 2})
+    for num in range(1000):
+        output(f'line {num}')
+    output.close()
+    assert path.read_text().splitlines() == [f'line {num}' for num in range(1000)]
+
+
+def test_flush(tmp_path):
+    path = tmp_path / 'output.txt'
+    output = FileOutput({'output_file': str(path), 'output_batch_size': 100, 'output_background': True})
+    output('hello')
+    assert path.read_text() == ''
+    output.flush()
+    assert path.read_text() == 'hello\n'
+    output.close()
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / 'output.jsonl'
+    output = FileOutput({'output_file': str(path), 'output_format': 'jsonl'})
+    output('Hi!', user='hello', dialogue=1, turn=0, duration=0.5)
+    output.close()
+    assert json.loads(path.read_text()) == {'dialogue': 1, 'turn': 0, 'user': 'hello',
+                                            'system': 'Hi!', 'duration': 0.5}
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 
+import atexit
+import json
+import queue
 import sys
+import threading
+
 from ..component import Component
 
 
@@ -15,17 +20,102 @@ class ConsoleOutput(Component):
 
 
 class FileOutput:
-    """Print output to the given file (default to stdout), one utterance per line."""
+    """Print output to the given file (default to stdout), one utterance per line.
+
+    Configuration options:
+     - `output_format`: `text` (default) for plain utterances, `jsonl` for one JSON object per turn
+       with the dialogue and turn number, the user input, the system response and the turn duration
+     - `output_batch_size`: number of lines collected before they are written out at once (default 1)
+     - `output_background`: write in a background thread, fed through a bounded queue (default false)
+     - `output_queue_size`: maximum number of batches waiting in the queue (default 1024)
+
+    Lines are always written in the order they were produced. All pending lines are written
+    out on `close()`, which is also called at interpreter exit.
+    """
 
     def __init__(self, config, *args):
         super(FileOutput, self).__init__()
-        self.config = config
+        self.config = config if config is not None else {}
         self.output_fd = sys.stdout
-        if config and config.get('output_file', '') not in ['', '-']:
-            self.output_fd = open(self.config['output_file'], 'wt')
+        if self.config.get('output_file', '') not in ['', '-']:
+            self.output_fd = open(self.config['output_file'], 'wt', encoding='UTF-8')
+        self.format = self.config.get('output_format', 'text')
+        assert self.format in ['text', 'jsonl'], 'Unknown output format "%s"' % self.format
+        self.batch_size = max(1, self.config.get('output_batch_size', 1))
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._error = None
+        self._queue = None
+        if self.config.get('output_background', False):
+            self._queue = queue.Queue(maxsize=self.config.get('output_queue_size', 1024))
+            self._writer = threading.Thread(target=self._write_loop, name='FileOutput writer', daemon=True)
+            self._writer.start()
+        atexit.register(self.close)
 
     def __call__(self, utterance, *args, **kwargs):
-        print(utterance, file=self.output_fd)
+        if self.format == 'jsonl':
+            line = json.dumps({'dialogue': kwargs.get('dialogue'),
+                               'turn': kwargs.get('turn'),
+                               'user': kwargs.get('user'),
+                               'system': utterance,
+                               'duration': kwargs.get('duration')}, ensure_ascii=False)
+        else:
+            line = str(utterance)
+        with self._lock:
+            self._buffer.append(line + '\n')
+            if len(self._buffer) >= self.batch_size:
+                self._flush_buffer()
+
+    def _flush_buffer(self):
+        if self._error is not None:
+            raise IOError('Writing the output failed') from self._error
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        if self._queue is not None:
+            self._queue.put(data)  # blocks while the queue is full, nothing is ever dropped
+        else:
+            self.output_fd.write(data)
+
+    def _write_loop(self):
+        while True:
+            data = self._queue.get()
+            try:
+                if data is None:
+                    return
+                self.output_fd.write(data)
+                if self._queue.empty():
+                    self.output_fd.flush()
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Write out all collected lines (when writing in background, wait until they are written)."""
+        with self._lock:
+            self._flush_buffer()
+        if self._queue is not None:
+            self._queue.join()
+        self.output_fd.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            self._flush_buffer()
+        if self._queue is not None:
+            self._queue.put(None)
+            self._writer.join()
+        self.output_fd.flush()
+        if self.output_fd is not sys.stdout:
+            self.output_fd.close()
+        atexit.unregister(self.close)
+        if self._error is not None:
+            raise IOError('Writing the output failed') from self._error
 
     def __del__(self):
-        self.output_fd.close()
+        self.close()
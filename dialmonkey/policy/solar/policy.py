@@ -42,39 +42,51 @@ class RequestQueryMapper:
     #
     # Planets
     #
-    def _planet_filter(self, collection, name, filter):
-        top = None
-        if filter == 'support_life': 
-            collection = [x for x in collection if x['isHabitable'] == True]
-        elif filter == 'smaller':
-            y = self._find_body(name())
-            collection = [x for x in collection if x['meanRadius'] < y['meanRadius']]
-            top_obj = collection.sort(key = lambda x: x['meanRadius'])
-            top = ('inform', 'min_radius',f"{collection[0]['meanRadius']:.0f}km")
-        elif filter == 'larger' or filter == 'bigger':
-            y = self._find_body(name())
-            collection = [x for x in collection if x['meanRadius'] > y['meanRadius']]
-            top_obj = collection.sort(key = lambda x: -x['meanRadius'])
-            top = ('inform', 'max_radius',f"{collection[0]['meanRadius']:.0f}km")
-        elif filter == "lower_gravity":
-            y = self._find_body(name())
-            collection = [x for x in collection if x['gravity'] < y['gravity']]
-            top_obj = collection.sort(key = lambda x: x['gravity'])
-            top = ('inform', 'min_gravity',f"{collection[0]['gravity'] / scipy.constants.g:.1f}g") 
-        elif filter == "higher_gravity":
-            y = self._find_body(name())
-            collection = [x for x in collection if x['gravity'] > y['gravity']]
-            top_obj = collection.sort(key = lambda x: -x['gravity'])
-            top = ('inform', 'max_gravity',f"{collection[0]['gravity'] / scipy.constants.g:.1f}g") 
-        else:
+    # filter -> (property, comparison with the named body, slot informing about the first planet)
+    _comparison_filters = dict(
+        smaller=('meanRadius', '<', 'min_radius'),
+        larger=('meanRadius', '>', 'max_radius'),
+        bigger=('meanRadius', '>', 'max_radius'),
+        lower_gravity=('gravity', '<', 'min_gravity'),
+        higher_gravity=('gravity', '>', 'max_gravity'),
+        lower_mass=('mass', '<', 'min_mass'),
+        higher_mass=('mass', '>', 'max_mass'),
+    )
+
+    # filter -> (property, descending, slot informing about the value)
+    _superlative_filters = dict(
+        largest=('meanRadius', True, 'radius'),
+        biggest=('meanRadius', True, 'radius'),
+        smallest=('meanRadius', False, 'radius'),
+        heaviest=('mass', True, 'mass'),
+        lightest=('mass', False, 'mass'),
+        closest=('distance', False, 'mean_distance'),
+        furthest=('distance', True, 'mean_distance'),
+    )
+
+    _formats = dict(
+        meanRadius=lambda b: f"{b['meanRadius']:.0f}km",
+        gravity=lambda b: f"{b['gravity'] / scipy.constants.g:.1f}g",
+        mass=lambda b: f"{b['mass']['massValue']:0.1f} x {b['mass']['massExponent']}",
+    )
+
+    def _planet_filter(self, name, filter):
+        query = self._repo.query('planet')
+        if filter == 'support_life':
+            return query.where('isHabitable').top(), None
+        if filter not in self._comparison_filters:
             raise ValueError('unknown filter %s' % filter)
-        return collection, top 
+        key, op, slot = self._comparison_filters[filter]
+        y = self._find_body(name())
+        collection = query.where(key, op, self._repo.value(y, key)).order_by(key, descending=op == '>').top()
+        top = ('inform', slot, self._formats[key](collection[0])) if collection else None
+        return collection, top
 
     def count_planets(self, context, filter=None): 
-        planets = [x for x in self._repo.bodies() if x['isPlanet']]
+        planets = self._repo.subset('planet')
         result = [('inform', 'count', f'{len(planets)}'), ('inform', 'object', 'planet')]
         if filter is not None:
-            planets, top = self._planet_filter(planets, lambda: context.try_get('name', 'earth'), filter) 
+            planets, top = self._planet_filter(lambda: context.try_get('name', 'earth'), filter)
             result[0] = ('inform', 'count', f'{len(planets)}')
             if top is not None:
                 result.append(top)
@@ -83,10 +95,10 @@ class RequestQueryMapper:
         return result
 
     def request_planets(self, context, filter=None): 
-        planets = [x for x in self._repo.bodies() if x['isPlanet']]
+        planets = self._repo.subset('planet')
         result = [('inform', 'count', f'{len(planets)}'), ('inform', 'object', 'planet')]
         if filter is not None:
-            planets, top = self._planet_filter(planets, lambda: context.try_get('name', 'earth'), filter) 
+            planets, top = self._planet_filter(lambda: context.try_get('name', 'earth'), filter)
             result[0] = ('inform', 'count', f'{len(planets)}')
             if top is not None:
                 result.append(top)
@@ -121,8 +133,8 @@ class RequestQueryMapper:
             ('inform', 'could_support_life', 'yes' if body['couldSupportLife'] else 'no')]
 
     def request_best_life_conditions(self):
-        habitable = [x for x in self._repo.bodies() if x['isHabitable']]
-        bodies = [x for x in self._repo.bodies() if x['couldSupportLife']]
+        habitable = self._repo.subset('habitable')
+        bodies = self._repo.subset('could_support_life')
         return [('inform', 'habitable_bodies', ','.join([x['englishName'] for x in habitable])),
                 ('inform', 'habitable_bodies_count', f'{len(habitable)}'),
             ('inform', 'life_supportable_bodies', ','.join([x['englishName'] for x in bodies]))]
@@ -137,44 +149,22 @@ class RequestQueryMapper:
         if object is None and name is None: 
             name = context.require('name')
         if name is None:
-            bodies = self._repo.bodies()
-            if object == 'planet':
-                bodies = (x for x in bodies if x['isPlanet'])
+            if object == 'planet' or object == 'gas_giant':
+                bodies_kind = object
             elif object == 'solar_body' or object == 'body':
-                pass
-            elif object == 'gas_giant':
-                bodies = (x for x in bodies if x['isPlanet'] and x['planetType'] == 'gas_giant')
+                bodies_kind = 'body'
             else: raise ValueError('unknown object type %s' % object)
-
-            append_info = None
-            if filter == 'largest' or filter == 'biggest':
-                body = max(bodies, key=lambda x: x['meanRadius'])
-                append_info = ('inform', 'radius', f"{body['meanRadius']:.0f}km")
-            elif filter == 'smallest':
-                body = min(bodies, key=lambda x: x['meanRadius'])
-                append_info = ('inform', 'radius', f"{body['meanRadius']:.0f}km")
-            elif filter == 'lightest':
-                body = max(bodies, key=lambda x: (x['mass']['massExponent'], x['mass']['massValue']))
-                append_info = ('inform', 'mass', f"{body['mass']['massValue']:0.1f} x {body['mass']['massExponent']}")
-            elif filter == 'heaviest':
-                body = min(bodies, key=lambda x: (x['mass']['massExponent'], x['mass']['massValue']))
-                append_info = ('inform', 'mass', f"{body['mass']['massValue']:0.1f} x {body['mass']['massExponent']}")
-            elif filter == 'closest':
-                body = min(bodies, key=lambda x: self._repo.measure_distance(x['id'], 'terre')[1])
-                _, distance, _ = self._repo.measure_distance(body['id'], 'terre')
-                append_info = ('inform', 'mean_distance', f"{distance / km_au:0.2f}au") 
-
-            elif filter == 'furthest':
-                body = min(bodies, key=lambda x: -self._repo.measure_distance(x['id'], 'terre')[1])
-                _,distance, _ = self._repo.measure_distance(body['id'], 'terre')
-                append_info = ('inform', 'mean_distance', f"{distance / km_au:0.2f}au") 
-
-            else: raise ValueError('unknown filter %s' % filter)
-
-            result = [('inform', 'name', body['englishName']), ('inform', 'object', object), ('inform', 'filter', filter)]
-            if append_info is not None:
-                result.append(append_info)
-            return result
+            if filter not in self._superlative_filters:
+                raise ValueError('unknown filter %s' % filter)
+            key, descending, slot = self._superlative_filters[filter]
+            body = self._repo.query(bodies_kind, origin='terre').order_by(key, descending).first()
+            if key == 'distance':
+                append_info = ('inform', slot, f"{self._repo.measure_distance('terre', body['id'])[1] / km_au:0.2f}au")
+            else:
+                append_info = ('inform', slot, self._formats[key](body))
+
+            return [('inform', 'name', body['englishName']), ('inform', 'object', object), ('inform', 'filter', filter),
+                    append_info]
         else:
             body = self._find_body(name)
             return [
@@ -224,9 +214,9 @@ class RequestQueryMapper:
         return [('inform', 'count', f'{moons}'), ('inform', 'object', 'moon'), ('inform', 'names', ','.join((x['moon'] for x in planet['moons'])))]
 
     def _find_body(self, name): 
-        body = [x for x in self._repo.bodies() if x['englishName'].lower() == name]
-        if len(body) == 0: raise DirectResponse([('error', 'not_found', None), ('error', 'name', name)])
-        return body[0]
+        body = self._repo.find(name)
+        if body is None: raise DirectResponse([('error', 'not_found', None), ('error', 'name', name)])
+        return body
 
 
     def __call__(self, intent, values, state_values):
@@ -287,7 +277,7 @@ class SolarPolicy(Component):
     def __init__(self, *args, repo = None, **kwargs):
         super().__init__(*args, **kwargs)
         self._treshold = 0.7
-        self._repository = repo if repo is not None else SolarRepository()
+        self._repository = repo if repo is not None else SolarRepository.shared()
         self._mapper = RequestQueryMapper(self._repository)
 
     def _map_call(self, da: DA, state) -> DA:
@@ -9,7 +9,7 @@ from dialmonkey.da import DA, DAI
 @pytest.fixture(scope='module')
 def repo():
     from dialmonkey.repositories.solar import SolarRepository
-    return SolarRepository()
+    return SolarRepository(offline=True)
 
 @pytest.fixture
 def logger():
@@ -30,3 +30,21 @@ def test_does_not_fail(input, output, repo, logger):
     assert dial.action is not None
     assert dial.action.to_cambridge_da_string() != ''
 
+
+
+def _inform(repo, intent, **slots):
+    mapper = policy.RequestQueryMapper(repo)
+    return {slot: value for _, slot, value in mapper(intent, slots, {})}
+
+def test_superlatives(repo):
+    assert _inform(repo, 'request', object='planet', filter='heaviest')['name'] == 'Jupiter'
+    assert _inform(repo, 'request', object='planet', filter='lightest')['name'] == 'Mercury'
+    assert _inform(repo, 'request', object='planet', filter='smallest')['radius'] == '2439km'
+
+def test_mass_filters(repo):
+    result = _inform(repo, 'request_planets', filter='lower_mass', name='earth')
+    assert result['names'] == 'Mercury,Mars,Venus' and result['min_mass'] == '3.3 x 23'
+    assert _inform(repo, 'count_planets', filter='higher_mass', name='saturn')['count'] == '1'
+    # nothing is smaller than Mercury
+    result = _inform(repo, 'request_planets', filter='smaller', name='mercury')
+    assert result['count'] == '0' and 'min_radius' not in result
@@ -0,0 +1,94 @@
+import pytest
+
+from .twitter import TwitterPolicy
+
+
+@pytest.fixture
+def policy(tmp_path):
+    return TwitterPolicy(dict(backend='offline', cache_file=str(tmp_path / 'tweets.json')))
+
+
+def test_offline_policy(policy):
+    [dai] = policy.show_tweeting_themes_of_user(user='SampleDeputy')
+    assert (dai.slot, dai.value) == ('theme', 'zeman')
+    [dai] = policy.show_keyword_frequency_in_user_category(user_category='czech politicians', keyword='covid')
+    assert dai.value == '5 in last month'
+    assert policy.show_tweet(pick_metric='most_likes')[0].slot == 'tweet_text'
+    assert policy.search_user(query='minister')[0].value == 'SampleMinister'
+
+
+def test_category_users_fetched_once(policy):
+    calls = []
+    user_timeline = policy.store.backend.user_timeline
+    policy.store.backend.user_timeline = lambda user, since_id=None: calls.append(user) or user_timeline(user, since_id)
+    policy.show_keyword_frequency_in_user_category(user_category='all', keyword='covid')
+    assert sorted(calls) == ['sampledeputy', 'samplesinger']
+
+
+def test_partial_results(policy):
+    policy.users['czech politicians'].append('nobody')
+    user_timeline = policy.store.backend.user_timeline
+
+    def fail_nobody(user, since_id=None):
+        if user == 'nobody':
+            raise OSError('not found')
+        return user_timeline(user, since_id)
+    policy.store.backend.user_timeline = fail_nobody
+    frequency, msg = policy.show_keyword_frequency_in_user_category(user_category='czech politicians', keyword='covid')
+    assert frequency.value == '5 in last month'
+    assert (msg.slot, msg.value) == ('msg', 'could not get tweets of nobody, the result is without them')
+
+
+def run_turn(policy, *dais):
+    from dialmonkey.da import DA, DAI
+    from dialmonkey.dialogue import Dialogue
+    dial = Dialogue()
+    dial.nlu = DA([DAI(*x) for x in dais])
+    for x in dial.nlu:
+        if x.slot is not None:
+            dial.state[x.slot] = {x.value: 1.0}
+    return [(x.intent, x.slot, x.value) for x in policy(dial, None).action]
+
+
+def test_results_resolved_once(policy):
+    calls = []
+    search_users = policy.store.backend.search_users
+    policy.store.backend.search_users = lambda query, count=1: calls.append(query) or search_users(query, count)
+    actions = run_turn(policy, ('search_user', 'query', 'minister'), ('add_user_to_category', 'user', 'RESULT'),
+                       ('add_user_to_category', 'user_category', 'czech politicians'))
+    assert actions == [('inform', 'user', 'SampleMinister'), ('success', None, None)]
+    assert calls == ['minister'] and policy.users['czech politicians'][-1] == 'SampleMinister'
+
+    actions = run_turn(policy, ('search_user', 'query', 'deputy'), ('show_tweeting_themes_of_user', 'user', 'RESULT'),
+                       ('show_themes', None, None))
+    assert actions == [('inform', 'user', 'SampleDeputy'), ('inform', 'theme', 'zeman'), ('inform', 'theme', 'covid'),
+                       ('inform', 'theme', 'zeman')]
+
+
+def test_unresolvable_result_asked(policy):
+    assert run_turn(policy, ('show_tweeting_themes_of_user', 'user', 'RESULT')) == [('ask_user', 'user', None)]
+
+
+def test_modifying_turn_sequential(policy):
+    running, peak = [], []
+
+    def reader(f):
+        def run(**kwargs):
+            running.append(f)
+            peak.append(len(running))
+            try:
+                return f(**kwargs)
+            finally:
+                running.remove(f)
+        return run
+    policy.show_users_in_category = reader(policy.show_users_in_category)
+    policy.show_user_categories = reader(policy.show_user_categories)
+    for n in range(20):
+        actions = run_turn(policy, ('add_user_to_category', 'user', 'user%d' % n),
+                           ('add_user_to_category', 'user_category', 'artists'),
+                           ('show_user_categories', None, None), ('show_users_in_category', 'user_category', 'artists'))
+        # in the order of the intents, the reader sees the added user
+        assert actions[:4] == [('success', None, None), ('inform', 'user_category', 'czech politicians'),
+                               ('inform', 'user_category', 'artists'), ('inform', 'user', 'SampleSinger')]
+        assert actions[4:] == [('inform', 'user', 'user%d' % i) for i in range(n + 1)]
+    assert max(peak) == 1
@@ -1,9 +1,9 @@
-import numpy as np
-from datetime import datetime
-import twitter as tw
-import json
+from datetime import datetime, timedelta, timezone
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from inspect import signature
 from ..component import Component
+from ..repositories.twitter import TweetStore, ApiBackend, OfflineBackend, SAMPLE_TWEETS
 from ..utils import choose_one
 from itertools import groupby
 from functools import wraps
@@ -19,6 +19,19 @@ def filter_map(filter_f, map_f, dictionary):
     return mapped
 
 
+def handler(produces=(), modifies=False):
+    '''
+    Declares the slots an intent handler produces (its inform DAIs fill them in other intents of
+    the turn that have them set to 'RESULT') and whether it modifies the policy state (the users,
+    themes or the last tweet set; the handlers of a turn run one after another if any of them does).
+    '''
+    def decorate(f):
+        f.produces = frozenset(produces)
+        f.modifies = modifies
+        return f
+    return decorate
+
+
 def one_hot(dct, threshold=0.7):
     '''
     Returns highest-value key from {str: float} dictionary if the highest value is equal
@@ -35,50 +48,78 @@ def one_hot(dct, threshold=0.7):
 class TwitterPolicy(Component):
 
     def __init__(self, *args, **kwargs):
-        with open('twitter_conf.json', 'r') as f:
-            twitter_cfg = json.load(f)
+        super().__init__(*args, **kwargs)
 
-        self.t = tw.Twitter(auth=tw.OAuth(**twitter_cfg))
-        self.fmt = '%a %b %d %X %z %Y'
-        self.last_tweet_set = None
+        # 'api' (credentials in twitter_conf.json) or 'offline' (sample tweets, no network, not stored)
+        if self.config.get('backend', 'api') == 'offline':
+            backend = OfflineBackend(self.config.get('tweets_file', SAMPLE_TWEETS))
+        else:
+            backend = ApiBackend(self.config.get('twitter_conf', 'twitter_conf.json'))
+        self.store = TweetStore(backend, cache_file=self.config.get('cache_file'), ttl=self.config.get('ttl', 15 * 60),
+                                workers=self.config.get('fetch_workers', 8))
+        self.last_tweet_set = None # (user, start of the time range) of the last query
 
         # {theme: list of keywords}
         self.themes = {'zeman': ['bor', 'vod', 'rus'],
                        'covid': ['vakc', 'covid']}
 
-        # {user_category: list of users' screen_names}
+        # {user_category: list of users' screen_names}, the offline tweets come with their own
         self.users = {'czech politicians': ['lilnasx', 'dominikferi'],
                       'artists': ['LilNasX']}
+        if getattr(backend, 'categories', None):
+            self.users = {category: list(users) for category, users in backend.categories.items()}
 
-        super().__init__(*args, **kwargs)
+        # runs independent intent handlers of a turn concurrently
+        self._executor = ThreadPoolExecutor(self.config.get('handler_workers', 4), thread_name_prefix='intents')
 
 
     def __call__(self, dial, logger):
         dst = {k: one_hot(distr) for k, distr in dial.state.items()}
-        intents = np.unique(list(map(lambda x: x.intent, dial.nlu))).tolist()
-
-        # loop until no further resolution is needed
-        items = intents
-        while items:
-            items2 = []
-
-            for intent in items:
-                actions = getattr(self, intent)(**dst)
-
-                # check if resolution is needed
-                if 'resolve' in map(lambda x: x.intent, actions):
-                    items2.append(intent)
+        intents = sorted(set(map(lambda x: x.intent, dial.nlu)))
+        dial.action.dais.extend(self.execute(intents, dst))
+        return dial
 
-                dial.action.dais.extend(filter(lambda x: x.intent != 'resolve', actions))
 
-            # update states waiting for resolution
-            for dai in filter(lambda x: x.intent == 'inform', dial.action):
-                if dai.slot in dst and dst[dai.slot] == 'RESULT':
+    def execute(self, intents, dst):
+        '''
+        Runs the handler of each intent once. Handlers consuming a slot set to 'RESULT' run after the
+        handlers producing it (with the produced value). Independent handlers run concurrently if none
+        of them modifies the state, otherwise one after another (in the order of the intents).
+        Results that nothing produces (or that depend on each other) are asked for.
+        '''
+        handlers = {intent: getattr(self, intent) for intent in intents}
+        producers = defaultdict(set)
+        for intent, f in handlers.items():
+            for slot in getattr(f, 'produces', ()):
+                producers[slot].add(intent)
+        depends = {intent: {p for slot in signature(f).parameters if dst.get(slot) == 'RESULT'
+                            for p in producers[slot] if p != intent}
+                   for intent, f in handlers.items()}
+
+        actions, done = [], set()
+        while len(done) < len(handlers):
+            level = [intent for intent in intents if intent not in done and depends[intent] <= done]
+            if not level: # cyclic dependencies
+                level = [intent for intent in intents if intent not in done]
+            # results still missing cannot be produced any more
+            args = {k: None if v == 'RESULT' else v for k, v in dst.items()}
+            results = self._run_level([handlers[intent] for intent in level], args)
+            for dai in results:
+                if dai.intent == 'inform' and dst.get(dai.slot) == 'RESULT':
                     dst[dai.slot] = dai.value
+            actions.extend(results)
+            done.update(level)
+        return actions
 
-            items = items2
 
-        return dial
+    def _run_level(self, level, args):
+        # readers only see the state, so they can run concurrently; with a handler modifying it,
+        # the readers would iterate it while it changes (and see it before or after the change)
+        if len(level) == 1 or any(getattr(f, 'modifies', False) for f in level):
+            outputs = [f(**args) for f in level]
+        else:
+            outputs = [future.result() for future in [self._executor.submit(f, **args) for f in level]]
+        return [dai for output in outputs for dai in output]
 
 
     def check_unassigned(self, keywords):
@@ -148,6 +189,7 @@ class TwitterPolicy(Component):
             return [DAI('warn', 'unknown', 'user_category')]
 
 
+    @handler(modifies=True)
     def add_user_to_category(self, user_category=None, user=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -159,6 +201,7 @@ class TwitterPolicy(Component):
             return [DAI('warn', 'unknown', 'user_category')]
 
 
+    @handler(modifies=True)
     def remove_user_from_category(self, user_category=None, user=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -173,6 +216,7 @@ class TwitterPolicy(Component):
             return [DAI('warn', 'unknown', 'user_category')]
 
 
+    @handler(modifies=True)
     def add_user_category(self, user_category=None, user=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -184,6 +228,7 @@ class TwitterPolicy(Component):
             return [DAI('inform', 'msg', 'category already exists')]
 
 
+    @handler(modifies=True)
     def remove_user_category(self, user_category=None, user=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -195,6 +240,7 @@ class TwitterPolicy(Component):
             return [DAI('inform', 'msg', 'category does not exist')]
 
 
+    @handler(modifies=True)
     def add_keyword_to_theme(self, keyword=None, theme=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -206,6 +252,7 @@ class TwitterPolicy(Component):
             return [DAI('warn', 'unknown', 'theme')]
 
 
+    @handler(modifies=True)
     def remove_keyword_from_theme(self, keyword=None, theme=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -220,6 +267,7 @@ class TwitterPolicy(Component):
             return [DAI('warn', 'unknown', 'theme')]
 
 
+    @handler(modifies=True)
     def add_theme(self, theme=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -231,6 +279,7 @@ class TwitterPolicy(Component):
             return [DAI('inform', 'msg', 'theme already exists')]
 
 
+    @handler(modifies=True)
     def remove_theme(self, theme=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
@@ -263,18 +312,15 @@ class TwitterPolicy(Component):
                 'favourites': 'favorite_count',
                 'favs': 'favorite_count'}[unit]
 
-        tweet = method(self.last_tweet_set, key=lambda x: x[unit])
+        tweet = method(self.store.tweets_since(*self.last_tweet_set), key=lambda x: x[unit])
 
         return [DAI('inform', 'tweet_text', tweet['text'])]
 
 
-    def get_user_tweets(self, user, time_range):
-
-        def parse_time_and_substract(string):
-            parsed = datetime.strptime(string, self.fmt)
-            difference = datetime.now(parsed.tzinfo) - parsed
-            return difference
-
+    def time_range_start(self, time_range):
+        '''
+        Start of the time range (number of days or e.g. 'last week'), older tweets are left out.
+        '''
         if isinstance(time_range, int):
             limit = time_range
         else:
@@ -284,24 +330,21 @@ class TwitterPolicy(Component):
                      'last week.': 7,
                      'this week': 7,
                      'last year': 365}[time_range]
-
-        tweets = self.t.statuses.user_timeline(screen_name=user)
-        tweets = list(filter(lambda x: parse_time_and_substract(x['created_at']).days < limit, tweets))
-        self.last_tweet_set = tweets
-        tweets = ' '.join(map(lambda x: x['text'], tweets)).lower()
-
-        return tweets
+        return datetime.now(timezone.utc) - timedelta(days=limit)
 
 
+    @handler(produces=['theme'], modifies=True)
     def show_tweeting_themes_of_user(self, user=None, time_range='last month', **kwargs):
         da = self.check_args(locals())
         if da: return da
 
-        tweets = self.get_user_tweets(user, time_range)
+        self.store.timeline(user)
+        since = self.time_range_start(time_range)
+        self.last_tweet_set = (user, since)
 
         scores, max_score, max_theme = {}, -1, None
         for theme, keywords in self.themes.items():
-            score = sum(tweets.count(keyword) for keyword in keywords)
+            score = sum(self.store.keyword_count(user, keyword, since) for keyword in keywords)
             scores[theme] = score
             if score > max_score:
                 max_score = score
@@ -309,35 +352,52 @@ class TwitterPolicy(Component):
         return [DAI('inform', 'theme', max_theme)]
 
 
+    @handler(modifies=True)
     def show_keyword_frequency_in_user_category(self, user_category=None, keyword=None, time_range='last month', **kwargs):
         da = self.check_args(locals())
         if da: return da
 
         if user_category == 'all':
+            # fetch every user once, concurrently, before going through the categories
+            failed = self.store.refresh_all([user for users in self.users.values() for user in users])
             da = []
             for user_category in self.users:
-                da.extend(self.show_keyword_frequency_in_user_category(user_category,
-                                                                       keyword,
-                                                                       time_range, **kwargs))
-            return da
-
+                da.extend(self._keyword_frequency(user_category, keyword, time_range))
+            return da + self._fetch_failures(failed)
 
         if user_category not in self.users:
             return [DAI('warn', 'unknown', 'user_category')]
 
+        failed = self.store.refresh_all(self.users[user_category])
+        return self._keyword_frequency(user_category, keyword, time_range) + self._fetch_failures(failed)
+
+
+    def _keyword_frequency(self, user_category, keyword, time_range):
+        # timelines are refreshed already, users whose tweets could not be fetched have none
+        since = self.time_range_start(time_range)
         scores = []
         for user in self.users[user_category]:
-            tweets = self.get_user_tweets(user, time_range)
-            scores.append(tweets.count(keyword))
+            self.last_tweet_set = (user, since)
+            scores.append(self.store.keyword_count(user, keyword, since))
 
         return [DAI('inform', 'frequency', str(sum(scores)) + ' in ' + time_range)]
 
 
+    def _fetch_failures(self, failed):
+        '''
+        Partial results: informs about the users whose tweets could not be fetched.
+        '''
+        if not failed:
+            return []
+        return [DAI('inform', 'msg', 'could not get tweets of ' + ', '.join(failed) + ', the result is without them')]
+
+
+    @handler(produces=['user'])
     def search_user(self, query=None, **kwargs):
         da = self.check_args(locals())
         if da: return da
 
-        users = self.t.users.search(q=query, count=1)
+        users = self.store.backend.search_users(query, count=1)
         if len(users) == 0:
             return [DAI('warn', 'msg', 'unable to find user')]
 
@@ -1 +1,2 @@
 from .solar import SolarRepository
+from .twitter import TweetStore
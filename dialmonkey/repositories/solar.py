@@ -2,11 +2,124 @@ import requests
 from scipy.special import ellipe
 import scipy.constants
 import math
+import heapq
+import numpy as np
+import json
+import os
+import threading
+import time
+import logzero
+
+SNAPSHOT_VERSION = 1
+BUNDLED_SNAPSHOT = os.path.join(os.path.dirname(__file__), '../data/solar-bodies.json')
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'dialmonkey', 'solar-bodies.json')
+
+def body_mass(b):
+    """Mass of the body in kg, None if unknown."""
+    mass = b.get('mass')
+    return mass['massValue'] * 10.0 ** mass['massExponent'] if mass else None
+
+class SortedColumn:
+    """Bodies sorted by a numeric property (bodies without the property are left out),
+    so that range queries are binary searches. Bodies with equal values keep their order."""
+    def __init__(self, bodies, value):
+        pairs = [(value(b), b) for b in bodies]
+        pairs = [(v, b) for v, b in pairs if v is not None]
+        values = np.array([v for v, _ in pairs], dtype=float)
+        order = np.argsort(values, kind='stable')
+        self.values = values[order]
+        self.bodies = [pairs[i][1] for i in order]
+        self._descending = [pairs[i][1] for i in np.argsort(-values, kind='stable')]
+
+    def below(self, value):
+        """Bodies with the property lower than value, in ascending order."""
+        return self.bodies[:np.searchsorted(self.values, value, 'left')]
+
+    def above(self, value):
+        """Bodies with the property higher than value, in descending order."""
+        return self._descending[:len(self.values) - np.searchsorted(self.values, value, 'right')]
+
+class Query:
+    """Declarative query over the bodies of one kind (see `SolarRepository.subset`), e.g.
+    `repo.query('planet').where('meanRadius', '<', 6371).order_by('meanRadius').top(3)`.
+    Conditions are evaluated on whole NumPy columns; keys are body properties, `mass` (in kg),
+    or `distance` (mean distance from the query's origin body)."""
+    _ops = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal,
+            '==': np.equal, '!=': np.not_equal}
+
+    def __init__(self, repo, kind, origin=None):
+        self._repo = repo
+        self._kind = kind
+        self._origin = origin
+        self._mask = np.ones(len(repo.subset(kind)), dtype=bool)
+        self._conditions = []
+        self._order = None
+
+    def _values(self, key):
+        return self._repo.values(self._kind, key, self._origin)
+
+    def where(self, key, op=None, value=None):
+        """Keeps the bodies with the property satisfying `op` (`<`, `>`, `==` ...) with the given
+        value, or just with a true property if no `op` is given. Unknown values never match."""
+        values = self._values(key)
+        with np.errstate(invalid='ignore'):
+            self._mask &= values > 0 if op is None else self._ops[op](values, value)
+        self._conditions.append((key, op, value))
+        return self
+
+    def order_by(self, key, descending=False):
+        self._order = (key, descending)
+        return self
+
+    def count(self):
+        return int(self._mask.sum())
+
+    def top(self, k=None):
+        """Returns (the first k of) the selected bodies, ordered if `order_by` was used;
+        bodies with an unknown ordering property are left out."""
+        if self._order is None:
+            bodies = [b for b, selected in zip(self._repo.subset(self._kind), self._mask) if selected]
+            return bodies[:k] if k is not None else bodies
+        key, descending = self._order
+        if key in self._repo._column_values and len(self._conditions) == 1 and self._conditions[0][0] == key and \
+                self._conditions[0][1] == ('>' if descending else '<'):
+            # a range of a sorted column (only the properties in `_column_values` have one)
+            column = self._repo.column(self._kind, key)
+            bodies = column.above(self._conditions[0][2]) if descending else column.below(self._conditions[0][2])
+            return bodies[:k] if k is not None else bodies
+        values = self._values(key)
+        selected = np.flatnonzero(self._mask & ~np.isnan(values))
+        sign = -1 if descending else 1
+        sort_key = lambda i: (sign * values[i], i)
+        selected = heapq.nsmallest(k, selected, key=sort_key) if k is not None else sorted(selected, key=sort_key)
+        bodies = self._repo.subset(self._kind)
+        return [bodies[i] for i in selected]
+
+    def first(self):
+        """The first selected body, or None if there is none."""
+        bodies = self.top(1)
+        return bodies[0] if bodies else None
 
 class SolarRepository:
+    """Solar System bodies from api.le-systeme-solaire.net.
+
+    The API response is kept in a local JSON snapshot (`cache_file`) and only fetched again
+    when it is older than `ttl` seconds (using its ETag, so unchanged data is not downloaded).
+    If the API is not reachable, a stale snapshot or the bundled (curated, smaller) snapshot
+    is used. With `offline` set (or the `DIALMONKEY_OFFLINE` environment variable), the network
+    is never used. Use `SolarRepository.shared()` to get a single repository per process."""
     _url = 'https://api.le-systeme-solaire.net/rest'
+    _column_values = dict(meanRadius=lambda b: b.get('meanRadius'), gravity=lambda b: b.get('gravity'), mass=body_mass)
+    _shared = None
+    _shared_lock = threading.Lock()
 
-    def __init__(self):
+    def __init__(self, cache_file=None, ttl=7 * 24 * 3600, offline=None, timeout=10):
+        self._cache_file = cache_file if cache_file is not None else \
+            os.environ.get('DIALMONKEY_SOLAR_CACHE', DEFAULT_CACHE_FILE)
+        self._ttl = ttl
+        self._offline = offline if offline is not None else bool(os.environ.get('DIALMONKEY_OFFLINE'))
+        self._timeout = timeout
+        self._lock = threading.Lock()
         self._bodies = None
         self._details = dict()
         self._planets = ['mercury','venus','earth','mars','jupiter','saturn','uranus','neptune']
@@ -16,15 +129,135 @@ class SolarRepository:
         self._human_landed_bodies = ['moon', 'earth']
         pass 
 
+    @classmethod
+    def shared(cls):
+        """Returns the repository instance shared by all components in this process."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
     def bodies(self):
         if self._bodies is None:
-            bodies = requests.get(SolarRepository._url + '/bodies')
-            self._bodies = list(map(self._fix_single, bodies.json()['bodies'])) 
-            self._details = {x['id']:x for x in self._bodies }
-            for b in self._bodies:
-                self._fix_moons(b)
+            with self._lock:
+                if self._bodies is None:
+                    self._load(self._snapshot()['bodies'])
         return self._bodies
 
+    def _load(self, bodies):
+        self._details = {x['id']:x for x in map(self._fix_single, bodies)}
+        for b in self._details.values():
+            self._fix_moons(b)
+        bodies = list(self._details.values())
+        self._by_name = {}
+        for b in bodies:
+            self._by_name.setdefault(b['englishName'].casefold(), b)
+        self._subsets = dict(
+            body=bodies,
+            planet=[b for b in bodies if b['isPlanet']],
+            gas_giant=[b for b in bodies if b['isPlanet'] and b['planetType'] == 'gas_giant'],
+            habitable=[b for b in bodies if b['isHabitable']],
+            could_support_life=[b for b in bodies if b['couldSupportLife']],
+        )
+        self._columns = {}
+        self._value_arrays = {}
+        self._radii = None
+        self._bodies = bodies # set last, the indexes are ready once bodies are loaded
+
+    def find(self, name):
+        """Returns the body with the given English name (case-insensitive), or None."""
+        self.bodies()
+        return self._by_name.get(name.casefold())
+
+    def subset(self, kind):
+        """Bodies of the given kind: body (all), planet, gas_giant, habitable or could_support_life."""
+        self.bodies()
+        return self._subsets[kind]
+
+    def query(self, kind='body', origin=None):
+        """Starts a `Query` over the bodies of the given kind; `origin` is the id of the body
+        the `distance` property is measured from."""
+        return Query(self, kind, origin)
+
+    def values(self, kind, key, origin=None):
+        """Values of a property for all bodies of the given kind (in `subset` order) as a NumPy
+        array, NaN where unknown. The `distance` key gives mean distances from the `origin` body."""
+        if key == 'distance':
+            self._orbits()
+            return self._distance_row(self._index[origin])[self._subset_index(kind)]
+        values = self._value_arrays.get((kind, key))
+        if values is None:
+            values = np.array([self.value(b, key) for b in self.subset(kind)], dtype=float) # None -> NaN
+            self._value_arrays[(kind, key)] = values
+        return values
+
+    def value(self, body, key):
+        """Value of a body property as used in queries (e.g. the mass in kg), None if unknown."""
+        return self._column_values.get(key, lambda b: b.get(key))(body)
+
+    def _subset_index(self, kind):
+        index = self._value_arrays.get((kind, None))
+        if index is None:
+            index = self._value_arrays[(kind, None)] = np.array([self._index[b['id']] for b in self.subset(kind)],
+                                                                dtype=int)
+        return index
+
+    def column(self, kind, key):
+        """Bodies of the given kind sorted by the given property (meanRadius, gravity or mass)."""
+        column = self._columns.get((kind, key))
+        if column is None:
+            column = self._columns[(kind, key)] = SortedColumn(self.subset(kind), lambda b: self.value(b, key))
+        return column
+
+    @staticmethod
+    def _read_snapshot(path):
+        try:
+            with open(path, 'rt', encoding='UTF-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # the file may be anything, e.g. another cache with a version of its own
+        if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+            return None
+        bodies = snapshot.get('bodies')
+        if not isinstance(bodies, list) or not all(isinstance(b, dict) and 'id' in b and 'englishName' in b
+                                                   for b in bodies):
+            return None
+        return snapshot
+
+    def _write_snapshot(self, snapshot):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self._cache_file)), exist_ok=True)
+            tmp_file = '%s.%d.tmp' % (self._cache_file, os.getpid())
+            with open(tmp_file, 'wt', encoding='UTF-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_file, self._cache_file) # atomic, concurrent readers see old or new
+        except OSError as e:
+            logzero.logger.warning('Could not store Solar System snapshot in "%s": %s', self._cache_file, e)
+
+    def _snapshot(self):
+        cached = self._read_snapshot(self._cache_file)
+        if self._offline:
+            return cached or self._read_snapshot(BUNDLED_SNAPSHOT)
+        if cached is not None and cached.get('retrieved', 0) + self._ttl > time.time():
+            return cached
+        try:
+            headers = {'If-None-Match': cached['etag']} if cached is not None and cached.get('etag') else {}
+            response = requests.get(SolarRepository._url + '/bodies', headers=headers, timeout=self._timeout)
+            if response.status_code == 304:
+                snapshot = cached
+            else:
+                response.raise_for_status()
+                snapshot = dict(version=SNAPSHOT_VERSION, source=SolarRepository._url + '/bodies', curated=False,
+                                etag=response.headers.get('ETag'), bodies=response.json()['bodies'])
+            snapshot['retrieved'] = time.time()
+            self._write_snapshot(snapshot)
+            return snapshot
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logzero.logger.warning('Could not download Solar System data (%s), using %s snapshot.', e,
+                                   'a stale' if cached is not None else 'the bundled offline')
+            return cached or self._read_snapshot(BUNDLED_SNAPSHOT)
+
     def _fix_single(self, b):
         b['isPlanet'] = b['englishName'].lower() in self._planets
         if b['isPlanet'] and b['englishName'].lower() in self._gas_giants:
@@ -53,32 +286,56 @@ class SolarRepository:
     def _index_from_rel(self, rel):
         return rel[rel.rindex('/') + 1:]
 
+    def _orbits(self):
+        """Heliocentric (min, mean, max) orbit radii of all bodies as NumPy arrays, computed once.
+        Moons' distances from their planet are added to the planet's distances from the Sun."""
+        bodies = self.bodies()
+        if self._radii is None:
+            index = {b['id']: i for i, b in enumerate(bodies)}
+            mean = np.array([b['semimajorAxis'] for b in bodies], dtype=float)
+            min_d = np.array([b['perihelion'] for b in bodies], dtype=float)
+            max_d = np.array([b['aphelion'] for b in bodies], dtype=float)
+            unknown = (min_d == 0) | (max_d == 0)
+            min_d[unknown] = mean[unknown]
+            max_d[unknown] = mean[unknown]
+            parent = np.array([index.get(self._index_from_rel(b['aroundPlanet']['rel']), -1)
+                               if b.get('aroundPlanet') else -1 for b in bodies])
+            own = np.stack([min_d, mean, max_d])
+            radii = own.copy()
+            current = parent.copy()
+            while (current >= 0).any(): # walk up the aroundPlanet chains, one level at a time
+                has_parent = current >= 0
+                radii[:, has_parent] += own[:, current[has_parent]]
+                current[has_parent] = parent[current[has_parent]]
+            self._index = index
+            self._mean_distances = np.full((len(bodies), len(bodies)), np.nan)
+            self._filled_rows = np.zeros(len(bodies), dtype=bool)
+            self._radii = radii
+        return self._radii
+
+    def _distance_row(self, i):
+        """Mean distances from body i to all bodies, the matrix row is filled on first use."""
+        if not self._filled_rows[i]:
+            r1, r2 = self._radii[1, i], self._radii[1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                row = math.pi / 2 * (r1 + r2) * ellipe(2 * np.sqrt(r1 * r2) / (r1 + r2))
+            self._mean_distances[i] = row
+            self._mean_distances[:, i] = row # symmetric, single entries of other rows are ready
+            self._filled_rows[i] = True
+        return self._mean_distances[i]
+
     def measure_distance(self, id1, id2):
-        b1 = self.body(id1)
-        b2 = self.body(id2)
-        assert b1 is not None
-        assert b2 is not None
-
-        def sun_distance(b):
-            mean = b['semimajorAxis'] 
-            min_dd, max_dd = b['perihelion'], b['aphelion']
-            if min_dd == 0 or max_dd == 0:
-                min_dd = mean
-                max_dd = mean
-            if 'aroundPlanet' in b and b['aroundPlanet'] is not None:
-                min_d, mean_d, max_d = sun_distance(self.body(self._index_from_rel(b['aroundPlanet']['rel'])))
-                min_dd += min_d
-                max_dd += max_d
-                mean += mean_d
-            return min_dd, mean, max_dd
-
-        def mean_distance(r1, r2):
-            return math.pi / 2 * (r1 + r2) * ellipe(2 * math.sqrt(r1 * r2)/(r1 + r2))
-
-        min_d1, r1, max_d1 = sun_distance(b1)
-        min_d2, r2, max_d2 = sun_distance(b2) 
-        return abs(min_d1 - min_d2), mean_distance(r1, r2), max_d1 + max_d2 
+        """Returns the (minimal, mean, maximal) distance of two bodies in km."""
+        radii = self._orbits()
+        i, j = self._index[id1], self._index[id2]
+        return float(abs(radii[0, i] - radii[0, j])), float(self._distance_row(i)[j]), float(radii[2, i] + radii[2, j])
 
+    def closest(self, kind, id, furthest=False):
+        """Returns the body of the given kind (see `subset`) with the lowest (or highest) mean
+        distance to the given body, together with the distance."""
+        distances = self.values(kind, 'distance', id)
+        best = np.nanargmax(distances) if furthest else np.nanargmin(distances)
+        return self.subset(kind)[best], float(distances[best])
 
     def properties(self): 
         return dict(
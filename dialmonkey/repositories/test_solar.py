@@ -0,0 +1,126 @@
+import json
+
+import pytest
+import requests
+
+from . import solar
+from .solar import SolarRepository
+
+
+class StubResponse:
+    def __init__(self, status_code, bodies=None, etag=None):
+        self.status_code = status_code
+        self.headers = {'ETag': etag} if etag else {}
+        self._bodies = bodies
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(self.status_code)
+
+    def json(self):
+        return {'bodies': self._bodies}
+
+
+@pytest.fixture
+def bundled():
+    with open(solar.BUNDLED_SNAPSHOT, 'rt', encoding='UTF-8') as f:
+        return json.load(f)['bodies']
+
+
+def test_offline_uses_bundled_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(requests, 'get', lambda *args, **kwargs: pytest.fail('network used'))
+    repo = SolarRepository(cache_file=str(tmp_path / 'cache.json'), offline=True)
+    names = {x['englishName'] for x in repo.bodies()}
+    assert {'Sun', 'Earth', 'Jupiter', 'Moon', 'Europa'} <= names
+    earth = repo.body('terre')
+    assert earth['isPlanet'] and earth['hasLife']
+    assert [m['moon'] for m in earth['moons']] == ['Moon']
+    assert repo.body('jupiter')['planetType'] == 'gas_giant'
+
+
+def test_foreign_cache_file_refetched(tmp_path, monkeypatch, bundled):
+    monkeypatch.setattr(requests, 'get', lambda *args, **kwargs: StubResponse(200, bundled[:3], etag='"v1"'))
+    cache_file = tmp_path / 'cache.json'
+    for content in [dict(version=solar.SNAPSHOT_VERSION, users={}), dict(version=solar.SNAPSHOT_VERSION, bodies={}),
+                    [1, 2], dict(version=solar.SNAPSHOT_VERSION, bodies=[{'id': 'x'}])]:
+        cache_file.write_text(json.dumps(content))
+        assert len(SolarRepository(cache_file=str(cache_file)).bodies()) == 3
+        assert len(json.loads(cache_file.read_text())['bodies']) == 3
+
+
+def test_cache_and_etag_refresh(tmp_path, monkeypatch, bundled):
+    calls = []
+
+    def get(url, headers=None, timeout=None):
+        calls.append(headers)
+        if headers.get('If-None-Match') == '"v1"':
+            return StubResponse(304)
+        return StubResponse(200, bundled[:3], etag='"v1"')
+    monkeypatch.setattr(requests, 'get', get)
+    cache_file = str(tmp_path / 'cache.json')
+
+    assert len(SolarRepository(cache_file=cache_file).bodies()) == 3
+    assert calls == [{}]
+    # fresh cache, no request
+    assert len(SolarRepository(cache_file=cache_file).bodies()) == 3
+    assert len(calls) == 1
+    # expired cache, revalidated using the ETag
+    assert len(SolarRepository(cache_file=cache_file, ttl=0).bodies()) == 3
+    assert calls[-1] == {'If-None-Match': '"v1"'}
+
+
+def test_network_failure_falls_back(tmp_path, monkeypatch):
+    def get(*args, **kwargs):
+        raise requests.ConnectionError('no network')
+    monkeypatch.setattr(requests, 'get', get)
+    repo = SolarRepository(cache_file=str(tmp_path / 'cache.json'))
+    assert any(x['englishName'] == 'Earth' for x in repo.bodies())
+
+
+def test_shared_instance():
+    assert SolarRepository.shared() is SolarRepository.shared()
+
+
+def test_indexes(tmp_path):
+    repo = SolarRepository(cache_file=str(tmp_path / 'cache.json'), offline=True)
+    assert repo.find('JUPITER') is repo.body('jupiter')
+    assert repo.find('vulcan') is None
+    assert [x['englishName'] for x in repo.subset('gas_giant')] == ['Jupiter', 'Saturn', 'Uranus', 'Neptune']
+    earth = repo.find('earth')
+    radius = repo.column('planet', 'meanRadius')
+    assert [x['englishName'] for x in radius.below(earth['meanRadius'])] == ['Mercury', 'Mars', 'Venus']
+    assert [x['englishName'] for x in radius.above(earth['meanRadius'])] == ['Jupiter', 'Saturn', 'Uranus', 'Neptune']
+    assert radius.below(0) == []
+    mass = repo.column('body', 'mass')
+    assert mass.bodies[0]['englishName'] == 'Deimos' and mass.bodies[-1]['englishName'] == 'Sun'
+
+
+def test_distances(tmp_path):
+    repo = SolarRepository(cache_file=str(tmp_path / 'cache.json'), offline=True)
+    min_d, mean_d, max_d = repo.measure_distance('terre', 'lune')
+    assert min_d == 363300 and max_d == 152100000 + 152100000 + 405500
+    assert repo.measure_distance('lune', 'terre')[1] == pytest.approx(mean_d)
+    # rows filled through the symmetric columns must still be computed in full
+    assert repo.measure_distance('mars', 'io')[1] == pytest.approx(1822928050.15487)
+    body, distance = repo.closest('planet', 'terre')
+    assert body['englishName'] == 'Mercury' and distance == pytest.approx(repo.measure_distance('mercure', 'terre')[1])
+    assert repo.closest('body', 'terre', furthest=True)[0]['englishName'] == 'Charon'
+
+
+def test_query(tmp_path):
+    repo = SolarRepository(cache_file=str(tmp_path / 'cache.json'), offline=True)
+    names = lambda bodies: [x['englishName'] for x in bodies]
+    earth = repo.find('earth')
+    assert names(repo.query('planet').where('meanRadius', '<', earth['meanRadius']).order_by('meanRadius').top()) == \
+        names(repo.column('planet', 'meanRadius').below(earth['meanRadius']))
+    lighter = repo.query('planet').where('mass', '<', repo.value(earth, 'mass')).where('gravity', '>', 3)
+    assert lighter.count() == 3
+    assert names(lighter.order_by('mass', descending=True).top(2)) == ['Venus', 'Mars']
+    assert names(repo.query('planet').where('isHabitable').top()) == ['Earth']
+    assert repo.query('planet').where('meanRadius', '<', 0).first() is None
+    assert repo.query('body').order_by('mass').first()['englishName'] == 'Deimos'
+    assert repo.query('body', origin='terre').order_by('distance', descending=True).first() is \
+        repo.closest('body', 'terre', furthest=True)[0]
+    near = repo.query('planet', origin='terre').where('distance', '<', repo.measure_distance('terre', 'jupiter')[1])
+    assert near.count() == 4
+    assert names(near.order_by('distance').top()) == ['Mercury', 'Venus', 'Earth', 'Mars']
@@ -0,0 +1,155 @@
+import pytest
+
+from .twitter import TweetStore, OfflineBackend
+
+
+class CountingBackend:
+    def __init__(self, backend):
+        self.backend = backend
+        self.calls = []
+
+    def user_timeline(self, user, since_id=None):
+        self.calls.append((user, since_id))
+        return self.backend.user_timeline(user, since_id=since_id)
+
+
+@pytest.fixture
+def backend():
+    return CountingBackend(OfflineBackend())
+
+
+def test_offline_backend():
+    backend = OfflineBackend()
+    tweets = backend.user_timeline('samplesinger')
+    assert len(tweets) == 10 and tweets == sorted(tweets, key=lambda t: t['id'], reverse=True)
+    assert backend.user_timeline('SampleSinger', since_id=tweets[2]['id']) == tweets[:2]
+    assert backend.search_users('deputy') == [{'screen_name': 'SampleDeputy'}]
+
+
+def test_store_refresh_and_dedupe(tmp_path, backend):
+    cache_file = str(tmp_path / 'tweets.json')
+    store = TweetStore(backend, cache_file=cache_file)
+    tweets = store.timeline('SampleSinger')
+    assert len(tweets) == 10
+    # same user in a different case, fresh timeline: no request
+    assert store.timeline('samplesinger') == tweets
+    assert backend.calls == [('SampleSinger', None)]
+
+    # expired, only newer tweets requested, persisted timeline reused
+    store = TweetStore(backend, cache_file=cache_file, ttl=0)
+    assert store.timeline('samplesinger') == tweets
+    assert backend.calls[-1] == ('samplesinger', tweets[0]['id'])
+
+
+def test_store_keeps_stale_tweets(tmp_path, backend):
+    cache_file = str(tmp_path / 'tweets.json')
+    tweets = TweetStore(backend, cache_file=cache_file).timeline('SampleDeputy')
+
+    def fail(user, since_id=None):
+        raise OSError('no network')
+    backend.user_timeline = fail
+    assert TweetStore(backend, cache_file=cache_file, ttl=0).timeline('SampleDeputy') == tweets
+    with pytest.raises(OSError):
+        TweetStore(backend, cache_file=cache_file, ttl=0).timeline('SampleMinister')
+
+
+def test_refresh_all_concurrently(tmp_path, backend):
+    import threading
+    import time
+    from .twitter import RateLimited
+    active, peak, limited = [0], [0], []
+    lock = threading.Lock()
+
+    def user_timeline(user, since_id=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            time.sleep(0.05)
+            if user == 'SampleMinister' and not limited:
+                limited.append(user)
+                raise RateLimited(0.01)
+            if user == 'nobody':
+                raise OSError('not found')
+            return backend.backend.user_timeline(user, since_id)
+        finally:
+            with lock:
+                active[0] -= 1
+    backend.user_timeline = user_timeline
+    store = TweetStore(backend, cache_file=str(tmp_path / 'tweets.json'), workers=2)
+    failed = store.refresh_all(['SampleSinger', 'samplesinger', 'SampleDeputy', 'SampleMinister', 'nobody'])
+    assert peak[0] == 2 and limited == ['SampleMinister']
+    assert list(failed) == ['nobody']
+    assert all(store.is_fresh(user) for user in ['SampleSinger', 'SampleDeputy', 'SampleMinister'])
+
+
+def test_index_counts_as_text(tmp_path):
+    import random
+    from datetime import datetime, timedelta, timezone
+    from .twitter import TIME_FORMAT, TweetIndex
+    rnd = random.Random(3)
+    words = ['covid', 'Covidu', 'vakcína', 'borůvky', 'bor', 'o', 'vodu,', 'rus-ko', 'RUSKO']
+    now = datetime(2021, 5, 20, 12, tzinfo=timezone.utc)
+    tweets = [dict(id=i, id_str=str(i), text=' '.join(rnd.choice(words) for _ in range(rnd.randint(1, 12))),
+                   created_at=(now - timedelta(hours=rnd.randint(0, 24 * 10))).strftime(TIME_FORMAT))
+              for i in range(200)]
+    index = TweetIndex()
+    index.add('User', tweets[:100])
+    index.add('user', tweets[50:])
+    for keyword in ['covid', 'bor', 'o', 'rus', 'vod', 'kv', 'zeman', 'Rusko']:
+        for since in [None, now - timedelta(days=3), now - timedelta(hours=49), now - timedelta(days=7)]:
+            selected = [t for t in tweets if since is None or datetime.strptime(t['created_at'], TIME_FORMAT) > since]
+            assert index.count(keyword, 'USER', since) == ' '.join(t['text'] for t in selected).lower().count(keyword)
+    assert index.count('covid', 'someone else') == 0
+    # tokens added after a keyword was looked up
+    index.add('user', [dict(id=1000, id_str='1000', text='COVIDOVÝ covid-19', created_at=tweets[0]['created_at'])])
+    assert index.count('covid', 'user') == ' '.join(t['text'] for t in tweets).lower().count('covid') + 2
+
+
+def test_offline_store_not_persisted(tmp_path):
+    cache_file = tmp_path / 'tweets.json'
+    store = TweetStore(OfflineBackend(), cache_file=str(cache_file))
+    assert len(store.timeline('SampleSinger')) == 10
+    store.flush()
+    assert not cache_file.exists()
+
+
+def test_store_keyed_by_backend(tmp_path, backend):
+    cache_file = str(tmp_path / 'tweets.json')
+    TweetStore(backend, cache_file=cache_file).timeline('SampleSinger')
+
+    class OtherBackend(CountingBackend):
+        name = 'other'
+    other = OtherBackend(OfflineBackend())
+    TweetStore(other, cache_file=cache_file).timeline('SampleSinger')
+    assert other.calls == [('SampleSinger', None)]
+
+
+def test_store_history_and_writes(tmp_path):
+    from datetime import datetime, timedelta, timezone
+    from .twitter import TIME_FORMAT
+    now = datetime.now(timezone.utc)
+    tweets = [dict(id=i, id_str=str(i), text='covid t%d' % i,
+                   created_at=(now - timedelta(hours=30 - i)).strftime(TIME_FORMAT)) for i in range(30)]
+
+    class ListBackend:
+        def __init__(self):
+            self.tweets = tweets[:25]
+
+        def user_timeline(self, user, since_id=None):
+            return [t for t in reversed(self.tweets) if since_id is None or t['id'] > since_id]
+    backend = ListBackend()
+    cache_file = tmp_path / 'tweets.json'
+    store = TweetStore(backend, cache_file=str(cache_file), ttl=0, history=20, save_interval=3600)
+    assert [t['id'] for t in store.timeline('user')] == list(range(24, 4, -1))
+    assert store.keyword_count('user', 'covid') == 20
+    assert store.keyword_count('user', 't5') == 1 and store.keyword_count('user', 't4') == 0
+
+    # the first write is immediate, the next ones wait for the interval (or a flush)
+    written = cache_file.stat().st_mtime_ns
+    backend.tweets = tweets
+    assert [t['id'] for t in store.timeline('user')] == list(range(29, 9, -1))
+    assert store.keyword_count('user', 't5') == 0 and store.keyword_count('user', 't29') == 1
+    assert cache_file.stat().st_mtime_ns == written
+    store.flush()
+    assert [t['id'] for t in TweetStore(backend, cache_file=str(cache_file)).timeline('user')] == list(range(29, 9, -1))
@@ -0,0 +1,339 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import logzero
+
+STORE_VERSION = 2
+SAMPLE_TWEETS = os.path.join(os.path.dirname(__file__), '../data/twitter-sample-tweets.json')
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'dialmonkey', 'tweets.json')
+TIME_FORMAT = '%a %b %d %X %z %Y'
+HISTORY = 20 # tweets per user, the API's default timeline length
+
+class RateLimited(Exception):
+    """Raised by backends when the API refuses requests for now; `retry_after` is in seconds (None if unknown)."""
+    def __init__(self, retry_after=None):
+        super().__init__('rate limit exceeded' + (', retry after %.0fs' % retry_after if retry_after is not None else ''))
+        self.retry_after = retry_after
+
+def tweet_time(tweet):
+    """Time of the tweet as an aware datetime."""
+    return datetime.strptime(tweet['created_at'], TIME_FORMAT)
+
+class ApiBackend:
+    """Fetches timelines from the Twitter API (through the `twitter` package), with the
+    credentials read from a JSON file with the `twitter.OAuth` arguments."""
+    name = 'api'
+    persistent = True
+
+    def __init__(self, config_file='twitter_conf.json', client=None):
+        if client is None:
+            import twitter as tw
+            with open(config_file, 'r') as f:
+                client = tw.Twitter(auth=tw.OAuth(**json.load(f)))
+        self.client = client
+
+    def user_timeline(self, user, since_id=None, count=HISTORY):
+        """The newest `count` tweets of the user (newest first), only those newer than since_id if given."""
+        import twitter as tw
+        kwargs = dict(screen_name=user, count=count)
+        if since_id is not None:
+            kwargs['since_id'] = since_id
+        try:
+            return self.client.statuses.user_timeline(**kwargs)
+        except tw.TwitterHTTPError as e:
+            if e.e.code != 429:
+                raise
+            reset = e.e.headers.get('x-rate-limit-reset')
+            raise RateLimited(max(float(reset) - time.time(), 0) if reset else None) from e
+
+    def search_users(self, query, count=1):
+        return self.client.users.search(q=query, count=count)
+
+class OfflineBackend:
+    """Serves timelines from a JSON file (`{"users": {screen_name: [tweets]}}`) instead of the API,
+    so that the Twitter policy can be used without credentials or network. With `rebase` set,
+    tweet times are shifted so that the newest tweet in the file is from now. The file may also
+    give the user categories to use with it (`categories`).
+
+    The tweets are not persisted by `TweetStore`: they are rebased again on every start, and the
+    stored copies would get older and older."""
+    name = 'offline'
+    persistent = False
+
+    def __init__(self, tweets_file=SAMPLE_TWEETS, rebase=True):
+        with open(tweets_file, 'rt', encoding='UTF-8') as f:
+            data = json.load(f)
+        users = data['users']
+        self.categories = data.get('categories', {})
+        if rebase:
+            times = [tweet_time(t) for tweets in users.values() for t in tweets]
+            shift = datetime.now(timezone.utc) - max(times) if times else None
+            users = {user: [dict(t, created_at=(tweet_time(t) + shift).strftime(TIME_FORMAT)) for t in tweets]
+                     for user, tweets in users.items()}
+        self._users = {user.casefold(): sorted(tweets, key=lambda t: t['id'], reverse=True)
+                       for user, tweets in users.items()}
+        self._names = {user.casefold(): user for user in users}
+
+    def user_timeline(self, user, since_id=None, count=HISTORY):
+        tweets = self._users.get(user.casefold(), [])
+        return [t for t in tweets if since_id is None or t['id'] > since_id][:count]
+
+    def search_users(self, query, count=1):
+        query = query.casefold()
+        return [dict(screen_name=name) for key, name in self._names.items() if query in key][:count]
+
+class TweetIndex:
+    """Inverted index of tweets: token -> user -> day -> {tweet id: occurrences}, where tokens are
+    the lowercased, whitespace-separated words of the tweet texts and days are UTC day numbers.
+
+    A keyword without whitespace occurs in a text exactly as many times as in its tokens, so its
+    count is a sum over the tokens containing it; the matching tokens are cached per keyword and
+    kept up to date as tweets are added. Counts over a time range sum whole days, and only the
+    tweets from the first day are checked one by one."""
+    def __init__(self):
+        self._postings = {}
+        self._times = {}
+        self._keyword_tokens = {}
+        self._lock = threading.Lock()
+
+    def add(self, user, tweets):
+        """Adds tweets of the user (tweets already in the index are skipped)."""
+        user = user.casefold()
+        with self._lock:
+            for tweet in tweets:
+                if tweet['id_str'] in self._times:
+                    continue
+                timestamp = tweet_time(tweet).timestamp()
+                self._times[tweet['id_str']] = timestamp
+                day = int(timestamp // 86400)
+                for token, count in Counter(tweet['text'].lower().split()).items():
+                    if token not in self._postings:
+                        self._postings[token] = {}
+                        for keyword, tokens in self._keyword_tokens.items():
+                            if keyword in token:
+                                tokens.append(token)
+                    days = self._postings[token].setdefault(user, {})
+                    days.setdefault(day, {})[tweet['id_str']] = count
+
+    def remove(self, user, tweets):
+        """Removes indexed tweets of the user."""
+        user = user.casefold()
+        with self._lock:
+            for tweet in tweets:
+                timestamp = self._times.pop(tweet['id_str'], None)
+                if timestamp is None:
+                    continue
+                day = int(timestamp // 86400)
+                for token in set(tweet['text'].lower().split()):
+                    days = self._postings[token][user]
+                    del days[day][tweet['id_str']]
+                    if not days[day]:
+                        del days[day]
+
+    def time(self, tweet):
+        """Time of an indexed tweet as a timestamp."""
+        return self._times[tweet['id_str']]
+
+    def count(self, keyword, user, since=None):
+        """Occurrences of the keyword (no whitespace) in the tweets of the user newer than `since`
+        (an aware datetime), the same as `str.count` on the lowercased texts joined by spaces."""
+        assert keyword and len(keyword.split()) == 1 and keyword.split()[0] == keyword
+        user = user.casefold()
+        since = since.timestamp() if since is not None else None
+        first_day = int(since // 86400) if since is not None else None
+        total = 0
+        with self._lock:
+            tokens = self._keyword_tokens.get(keyword)
+            if tokens is None:
+                tokens = self._keyword_tokens[keyword] = [x for x in self._postings if keyword in x]
+            for token in tokens:
+                per_token = token.count(keyword)
+                for day, tweets in self._postings[token].get(user, {}).items():
+                    if first_day is None or day > first_day:
+                        total += per_token * sum(tweets.values())
+                    elif day == first_day:
+                        total += per_token * sum(n for id_str, n in tweets.items() if self._times[id_str] > since)
+        return total
+
+class TweetStore:
+    """Local store of user timelines, keyed by user and tweet id and persisted in a JSON file.
+
+    A timeline is fetched from the backend again only when it is older than `ttl` seconds, and
+    then only the tweets newer than the newest stored one (`since_id`) are requested. Screen names
+    are case-insensitive, so a user listed in several categories is stored and fetched once.
+    If the backend fails, the stored (stale) timeline is used. Only the newest `history` tweets
+    of each user are kept, as many as the backends fetch at once. The store is written at most once
+    per `save_interval` seconds (and at exit); a store written for a different backend is not used,
+    and backends that are not `persistent` are kept in memory only.
+
+    Timelines of many users are fetched concurrently by `refresh_all`, with at most `workers`
+    requests at a time. When the backend is rate limited, all requests wait (the time given by
+    the API, or exponential backoff from `backoff` seconds) and are retried up to `retries` times,
+    unless the wait would be longer than `max_wait` seconds."""
+    def __init__(self, backend, cache_file=None, ttl=15 * 60, workers=8, retries=3, backoff=1.0, max_wait=30,
+                 history=HISTORY, save_interval=60):
+        self.backend = backend
+        self._backend_name = getattr(backend, 'name', type(backend).__name__)
+        if not getattr(backend, 'persistent', True):
+            self._cache_file = None
+        else:
+            self._cache_file = cache_file if cache_file is not None else \
+                os.environ.get('DIALMONKEY_TWEET_CACHE', DEFAULT_CACHE_FILE)
+            atexit.register(self.flush)
+        self._ttl = ttl
+        self._history = history
+        self._save_interval = save_interval
+        self._saved_at = 0
+        self._dirty = False
+        self._workers = workers
+        self._retries = retries
+        self._backoff = backoff
+        self._max_wait = max_wait
+        self._resume_at = 0 # no requests before this time when rate limited
+        self._executor = None
+        self._lock = threading.RLock()
+        self._users = None
+        self._index = TweetIndex()
+
+    def _load(self):
+        if self._users is None:
+            with self._lock:
+                if self._users is None:
+                    users = {}
+                    try:
+                        if self._cache_file is not None:
+                            with open(self._cache_file, 'rt', encoding='UTF-8') as f:
+                                stored = json.load(f)
+                            if stored.get('version') == STORE_VERSION and stored.get('backend') == self._backend_name:
+                                users = {user: dict(fetched=x['fetched'],
+                                                    tweets={t['id_str']: t for t in x['tweets']})
+                                         for user, x in stored['users'].items()}
+                    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                        pass
+                    for user, x in users.items():
+                        self._index.add(user, x['tweets'].values())
+                    self._users = users
+        return self._users
+
+    def _save(self):
+        with self._lock:
+            self._dirty = False
+            self._saved_at = time.time()
+            if self._cache_file is None:
+                return
+            stored = dict(version=STORE_VERSION, backend=self._backend_name, users={
+                user: dict(fetched=x['fetched'], tweets=list(x['tweets'].values())) for user, x in self._users.items()})
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self._cache_file)), exist_ok=True)
+                tmp_file = '%s.%d.%d.tmp' % (self._cache_file, os.getpid(), threading.get_ident())
+                with open(tmp_file, 'wt', encoding='UTF-8') as f:
+                    json.dump(stored, f, ensure_ascii=False)
+                os.replace(tmp_file, self._cache_file) # atomic, concurrent readers see old or new
+            except OSError as e:
+                logzero.logger.warning('Could not store tweets in "%s": %s', self._cache_file, e)
+
+    def flush(self):
+        """Writes the store if it changed since it was last written."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def is_fresh(self, user):
+        entry = self._load().get(user.casefold())
+        return entry is not None and entry['fetched'] + self._ttl > time.time()
+
+    def _fetch(self, user, since_id):
+        for attempt in range(self._retries + 1):
+            delay = self._resume_at - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                return self.backend.user_timeline(user, since_id=since_id)
+            except RateLimited as e:
+                wait = e.retry_after if e.retry_after is not None else self._backoff * 2 ** attempt
+                if attempt == self._retries or wait > self._max_wait:
+                    raise
+                with self._lock:
+                    self._resume_at = max(self._resume_at, time.time() + wait)
+
+    def refresh(self, user, save=True):
+        """Fetches the tweets of the user newer than the stored ones. Returns the number of new tweets.
+        The store is written unless `save` is False or it was written less than `save_interval` ago."""
+        key = user.casefold()
+        with self._lock:
+            entry = self._load().get(key)
+            since_id = max((t['id'] for t in entry['tweets'].values()), default=None) if entry else None
+        tweets = self._fetch(user, since_id)
+        with self._lock:
+            entry = self._users.setdefault(key, dict(fetched=0, tweets={}))
+            new = [t for t in tweets if t['id_str'] not in entry['tweets']]
+            entry['tweets'].update((t['id_str'], t) for t in new)
+            entry['fetched'] = time.time()
+            self._index.add(key, new)
+            if len(entry['tweets']) > self._history:
+                old = sorted(entry['tweets'].values(), key=lambda t: t['id'], reverse=True)[self._history:]
+                for t in old:
+                    del entry['tweets'][t['id_str']]
+                self._index.remove(key, old)
+            self._dirty = True
+            if save and time.time() >= self._saved_at + self._save_interval:
+                self._save()
+        return len(new)
+
+    def _try_refresh(self, user, save=True):
+        # returns the error if the refresh failed and there are no stored tweets to use instead
+        try:
+            self.refresh(user, save=save)
+        except Exception as e: # the backends raise their own network errors
+            if user.casefold() not in self._load():
+                return e
+            logzero.logger.warning('Could not refresh tweets of "%s" (%s), using stored ones.', user, e)
+        return None
+
+    def refresh_all(self, users):
+        """Refreshes the timelines of the users that are not fresh, concurrently. Returns the users
+        whose timelines could not be fetched (and have no stored tweets), with the errors."""
+        pending = {}
+        for user in users:
+            if user.casefold() not in pending and not self.is_fresh(user):
+                pending[user.casefold()] = user
+        if not pending:
+            return {}
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._workers, thread_name_prefix='tweets')
+        futures = [(user, self._executor.submit(self._try_refresh, user, save=False)) for user in pending.values()]
+        failed = {user: future.result() for user, future in futures}
+        self.flush()
+        return {user: error for user, error in failed.items() if error is not None}
+
+    def timeline(self, user, refresh=True):
+        """All stored tweets of the user, newest first, refreshed first (unless `refresh` is False)
+        if the stored ones are too old."""
+        if refresh and not self.is_fresh(user):
+            error = self._try_refresh(user)
+            if error is not None:
+                raise error
+        with self._lock:
+            entry = self._load().get(user.casefold())
+            tweets = list(entry['tweets'].values()) if entry else []
+        return sorted(tweets, key=lambda t: t['id'], reverse=True)
+
+    def keyword_count(self, user, keyword, since=None):
+        """Occurrences of the keyword in the stored tweets of the user newer than `since` (an aware
+        datetime), counted in the lowercased texts. Keywords with whitespace are counted in the texts."""
+        self._load()
+        if len(keyword.split()) == 1 and keyword.split()[0] == keyword:
+            return self._index.count(keyword, user, since)
+        return ' '.join(t['text'] for t in self.tweets_since(user, since)).lower().count(keyword)
+
+    def tweets_since(self, user, since=None):
+        """Stored tweets of the user newer than `since` (an aware datetime), newest first."""
+        self._load()
+        since = since.timestamp() if since is not None else None
+        return [t for t in self.timeline(user, refresh=False) if since is None or self._index.time(t) > since]
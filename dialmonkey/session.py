@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class _Session:
+    """A single user's dialogue and the queue of their turns waiting to be processed."""
+
+    def __init__(self, dial):
+        self.dial = dial
+        self.pending = deque()
+        self.scheduled = False
+
+
+class SessionManager:
+    """Runs many dialogues at once through a single ConversationHandler, one dialogue per
+    session (e.g. per chat or per user). Turns of different sessions are processed in parallel
+    on a worker pool, turns of one session are processed one at a time in the order they came.
+
+    Note that all sessions share the same pipeline components, so components should keep any
+    per-dialogue information in the Dialogue object. Components are not reset between dialogues.
+    """
+
+    def __init__(self, handler, max_workers=4):
+        self.handler = handler
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dialmonkey-session')
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id, utterance):
+        """
+        Queues a user utterance for the given session (starting a new dialogue if needed).
+        :param session_id: any hashable session identifier
+        :param utterance: user input
+        :return: a `concurrent.futures.Future` with the tuple (system response, end of dialogue)
+        """
+        future = Future()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(self.handler.new_dialogue())
+            self._schedule(session, utterance, future)
+        return future
+
+    def _schedule(self, session, utterance, future):
+        # must be called with the lock held
+        session.pending.append((utterance, future))
+        if not session.scheduled:
+            session.scheduled = True
+            self._executor.submit(self._process, session)
+
+    def _process(self, session):
+        while True:
+            with self._lock:
+                if not session.pending:
+                    session.scheduled = False
+                    return
+                utterance, future = session.pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if utterance is None:  # end of session
+                    if session.dial.history:
+                        self.handler.finish_dialogue(session.dial)
+                    future.set_result(None)
+                    continue
+                response, eod = self.handler.get_response(session.dial, utterance)
+                if eod:  # following turns of this session start a new dialogue
+                    self.handler.finish_dialogue(session.dial)
+                    session.dial = self.handler.new_dialogue()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result((response, eod))
+
+    def end_session(self, session_id):
+        """
+        Ends the dialogue of the given session, after all its queued turns are processed.
+        :return: a `concurrent.futures.Future` that is done once the dialogue is stored, or None
+                 if there is no such session
+        """
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is None:
+                return None
+            future = Future()
+            self._schedule(session, None, future)
+        return future
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def close(self):
+        """Waits for all queued turns and stores the histories of all unfinished dialogues."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            if session.dial.history:
+                self.handler.finish_dialogue(session.dial)
@@ -1,37 +1,50 @@
-import time
-from telegram import Update
-from telegram.ext import Updater, CommandHandler, CallbackContext, MessageHandler, Filters
 import threading
+from telegram import Update
+from telegram.ext import Updater, CallbackContext, MessageHandler, Filters
 
-class TelegramIO:
-    def __init__(self, *args, **kwargs):
-        self._output, self._input = None, None
-
-        updater = Updater(kwargs['telegram']['token'])
-
-        updater.dispatcher.add_handler(MessageHandler(Filters.text, self._text_input))
-
-        threading.Thread(target=updater.start_polling, daemon=True).start()
-        #updater.idle()
-
-
-    def input(self, *args, **kwargs):
-        while self._input is None:
-            time.sleep(0.5)
-        text = self._input.strip().lower()
-        self._input = None
-        assert text is not None
-        return text
-
+from .session import SessionManager
 
-    def output(self, utterance, *args, **kwargs):
-        self._output = utterance
 
+class TelegramIO:
+    """Telegram front-end (use as `special_stream_type`). Every chat gets its own dialogue.
+    Messages are passed to the pipeline as soon as they arrive -- in parallel for different chats,
+    in order within one chat -- and the reply is sent as soon as the pipeline finishes.
+
+    Configuration (the `telegram` section): `token`, optionally `workers` (default 4).
+    Instead of using the token, an `updater` object can be passed directly (e.g. a local
+    stand-in for testing); it must provide `dispatcher.add_handler`, `start_polling` and `stop`
+    like `telegram.ext.Updater`.
+    """
+
+    def __init__(self, *args, updater=None, **kwargs):
+        self.config = kwargs.get('telegram', {})
+        self.updater = updater if updater is not None else Updater(self.config['token'])
+        self.sessions = None
+        self._stopped = threading.Event()
+
+    def serve(self, handler):
+        """Runs the dialogues through the given ConversationHandler until `stop` is called."""
+        self.sessions = SessionManager(handler, self.config.get('workers', 4))
+        self.updater.dispatcher.add_handler(MessageHandler(Filters.text, self._text_input))
+        self.updater.start_polling()
+        try:
+            self._stopped.wait()
+        finally:
+            self.updater.stop()
+            self.sessions.close()
+
+    def stop(self):
+        self._stopped.set()
 
     def _text_input(self, update: Update, context: CallbackContext) -> None:
-        self._input = update.message.text
-        while self._output is None:
-            time.sleep(0.5)
-        update.message.reply_text(self._output)
-        self._output = None
-
+        text = update.message.text.strip().lower()
+        future = self.sessions.submit(update.effective_chat.id, text)
+        future.add_done_callback(lambda f: self._reply(update, f))
+
+    def _reply(self, update: Update, future):
+        if future.exception() is not None:
+            self.sessions.handler.logger.error('Pipeline failed: %s', future.exception())
+            update.message.reply_text('Sorry, something went wrong.')
+            return
+        response, _ = future.result()
+        update.message.reply_text(response)
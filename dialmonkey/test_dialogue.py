@@ -0,0 +1,85 @@
+from .dialogue import Dialogue, UncheckedDialogue
+from .utils import dotdict, snapshot
+
+
+def _run_turn(dial, **slots):
+    for slot, value in slots.items():
+        dial.state[slot] = value
+    dial.end_turn()
+
+
+def test_history_snapshots_are_independent():
+    dial = Dialogue()
+    _run_turn(dial, food={'chinese': 0.7, None: 0.3})
+    dial.state['food']['chinese'] = 0.9
+    _run_turn(dial)
+
+    assert dial.history[0]['state'] == {'food': {'chinese': 0.7, None: 0.3}}
+    assert dial.history[1]['state'] == {'food': {'chinese': 0.9, None: 0.3}}
+    assert isinstance(dial.history[1]['state'], dotdict)
+    assert dial.history[1]['state'].food['chinese'] == 0.9
+
+
+def test_unchanged_slots_are_shared():
+    dial = Dialogue()
+    _run_turn(dial, food={'chinese': 1.0}, area={'north': 1.0})
+    _run_turn(dial, area={'south': 1.0})
+    _run_turn(dial)
+
+    first, second, third = (turn['state'] for turn in dial.history)
+    assert second['food'] is first['food']
+    assert second['area'] is not first['area']
+    assert third is second
+
+
+def test_state_delta():
+    dial = Dialogue()
+    _run_turn(dial, food={'chinese': 1.0})
+    _run_turn(dial, area={'north': 1.0})
+    del dial.state['food']
+    _run_turn(dial)
+
+    assert dial.state_delta(0) == ({'food': {'chinese': 1.0}}, [])
+    assert dial.state_delta(1) == ({'area': {'north': 1.0}}, [])
+    assert dial.state_delta(-1) == ({}, ['food'])
+
+
+def test_state_delta_empty_history():
+    dial = Dialogue()
+    assert dial.state_delta(-1) == ({}, [])
+    dial.state['food'] = {'chinese': 1.0}
+    assert dial.state_delta(0) == ({'food': {'chinese': 1.0}}, [])
+
+
+def test_snapshot_keeps_value_types():
+    previous = snapshot({'count': 1})
+    current = snapshot({'count': 1.0}, previous)
+    assert current is not previous
+    assert isinstance(current['count'], float)
+
+
+def test_validation():
+    dial = Dialogue()
+    for key, value in [('user', 1), ('eod', 'yes'), ('nlu', 'greet()'), ('state', {})]:
+        try:
+            dial[key] = value
+        except AssertionError:
+            continue
+        assert False, f'Setting "{key}" to {value!r} should fail'
+
+
+def test_custom_attributes():
+    dial = Dialogue()
+    dial['raw_input'] = 'Hello'
+    dial.user = 'hello'
+    assert dial['raw_input'] == 'Hello'
+    assert dial['user'] == 'hello'
+    assert dial['missing'] is None
+
+
+def test_unchecked_dialogue():
+    dial = UncheckedDialogue()
+    dial.user = None
+    dial.end_turn()
+    assert dial['user'] == ''
+    assert len(dial.history) == 1
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from .da import DA
+from .dialogue import Dialogue
+from .dialogue_log import DialogueLogReader, convert_json, write_log, DAJSONEncoder
+
+
+def _history():
+    history = []
+    for num in range(3):
+        dial = Dialogue()
+        for turn in range(num + 2):
+            dial.set_user_input(f'hello {num} {turn}')
+            dial.nlu = DA.parse_cambridge_da('inform(food=chinese,area=\'north east\')')
+            dial.state['food'] = {'chinese': 0.5 + turn / 10, None: 0.5 - turn / 10}
+            dial.action = DA.parse_cambridge_da('request(area)')
+            dial.set_system_response(f'Where? ({turn})')
+            dial.end_turn()
+        history.append(dial.history)
+    return history
+
+
+def _as_json(history):
+    return json.loads(json.dumps(history, cls=DAJSONEncoder))
+
+
+@pytest.mark.parametrize('codec', ['none', 'lzma'])
+def test_roundtrip(tmp_path, codec):
+    history = _history()
+    path = str(tmp_path / 'history.dmlog')
+    write_log(history, path, codec)
+
+    with DialogueLogReader(path) as reader:
+        assert reader.codec == codec
+        assert len(reader) == 3
+        assert [reader.num_turns(k) for k in range(3)] == [2, 3, 4]
+        assert list(reader) == _as_json(history)
+        assert reader.turn(2, 3) == _as_json(history)[2][3]
+        assert reader.turn(1, 0)['user'] == 'hello 1 0'
+
+
+def test_parse_das(tmp_path):
+    path = str(tmp_path / 'history.dmlog')
+    write_log(_history(), path)
+    with DialogueLogReader(path, parse_das=True) as reader:
+        turn = reader.turn(0, 1)
+    assert turn['nlu'] == DA.parse_cambridge_da('inform(food=chinese,area=\'north east\')')
+    assert turn['action'] == DA.parse_cambridge_da('request(area)')
+
+
+def test_convert_json(tmp_path):
+    history = _as_json(_history())
+    json_path, log_path = tmp_path / 'history.json', str(tmp_path / 'history.dmlog')
+    json_path.write_text(json.dumps(history))
+
+    assert convert_json(str(json_path), log_path, 'lzma') == 3
+    with DialogueLogReader(log_path) as reader:
+        assert list(reader) == history
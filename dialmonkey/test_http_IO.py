@@ -0,0 +1,122 @@
+import base64
+import json
+import os
+import socket
+import struct
+import threading
+
+from .conversation_handler import ConversationHandler
+
+
+def _start_server(tmp_path):
+    handler = ConversationHandler({
+        'special_stream_type': 'dialmonkey.http_IO.HttpIO',
+        'http': {'port': 0, 'workers': 2},
+        'history_fn': str(tmp_path / 'history.json'),
+        'components': ['dialmonkey.nlu.dummy.DummyNLU', 'dialmonkey.policy.dummy.ReplyWithNLU'],
+        'break_words': ['quit'],
+    })
+    server = threading.Thread(target=handler.main_loop)
+    server.start()
+    assert handler.special_stream.started.wait(5)
+    return handler, server
+
+
+def _request(method, path, body=b'', headers=''):
+    return ('%s %s HTTP/1.1\r\nHost: test\r\nContent-Length: %d\r\n%s\r\n' %
+            (method, path, len(body), headers)).encode('latin-1') + body
+
+
+def _read_response(fd):
+    status = fd.readline().split()[1]
+    headers = {}
+    line = fd.readline()
+    while line != b'\r\n':
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.lower()] = value.strip()
+        line = fd.readline()
+    return int(status), json.loads(fd.read(int(headers['content-length'])))
+
+
+def _ws_send(sock, text):
+    payload, mask = text.encode('UTF-8'), os.urandom(4)
+    sock.sendall(struct.pack('!BB', 0x81, 0x80 | len(payload)) + mask +
+                 bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+
+
+def _ws_receive(fd):
+    first, length = fd.read(2)
+    return first & 0x0F, fd.read(length)
+
+
+def test_pipelined_requests(tmp_path):
+    handler, server = _start_server(tmp_path)
+    try:
+        with socket.create_connection(('127.0.0.1', handler.special_stream.port), timeout=5) as sock:
+            sock.sendall(_request('POST', '/sessions/a', b'Hello') +
+                         _request('POST', '/sessions/b', json.dumps({'user': 'bye'}).encode()) +
+                         _request('POST', '/sessions/a', b'quit') +
+                         _request('GET', '/health') +
+                         _request('POST', '/sessions/b', b'{"text": 1}') +
+                         _request('DELETE', '/sessions/b') +
+                         _request('GET', '/nothing', headers='Connection: close\r\n'))
+            fd = sock.makefile('rb')
+            responses = [_read_response(fd) for _ in range(7)]
+            assert fd.read() == b''  # closed as requested
+    finally:
+        handler.special_stream.stop()
+        server.join(5)
+    assert not server.is_alive()
+    assert responses[:3] == [(200, {'session': 'a', 'system': 'greet()', 'eod': False}),
+                             (200, {'session': 'b', 'system': 'goodbye()', 'eod': False}),
+                             (200, {'session': 'a', 'system': '<EMPTY>', 'eod': True})]
+    assert responses[3][0] == 200 and responses[3][1]['status'] == 'ok'
+    assert [status for status, _ in responses[4:]] == [400, 200, 404]
+    assert responses[5][1] == {'session': 'b', 'ended': True}
+    users = sorted([turn['user'] for turn in dialogue] for dialogue in handler.history)
+    assert users == [['bye'], ['hello', 'quit']]
+
+
+def test_websocket(tmp_path):
+    handler, server = _start_server(tmp_path)
+    try:
+        with socket.create_connection(('127.0.0.1', handler.special_stream.port), timeout=5) as sock:
+            key = base64.b64encode(os.urandom(16)).decode('ascii')
+            sock.sendall(_request('GET', '/sessions/ws1/ws', headers='Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                                  'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n' % key))
+            fd = sock.makefile('rb')
+            assert fd.readline().split()[1] == b'101'
+            while fd.readline() != b'\r\n':
+                pass
+            _ws_send(sock, 'Hello')
+            _ws_send(sock, 'bye')
+            sock.sendall(struct.pack('!BB', 0x89, 0x80) + os.urandom(4))  # empty ping
+            replies = [_ws_receive(fd) for _ in range(3)]
+            sock.sendall(struct.pack('!BB', 0x88, 0x80) + os.urandom(4))  # close
+            assert _ws_receive(fd)[0] == 0x8
+    finally:
+        handler.special_stream.stop()
+        server.join(5)
+    assert (0xA, b'') in replies
+    texts = [json.loads(payload)['system'] for opcode, payload in replies if opcode == 0x1]
+    assert texts == ['greet()', 'goodbye()']
+    assert [turn['user'] for turn in handler.history[0]] == ['hello', 'bye']
+
+
+def test_invalid_content_length(tmp_path):
+    handler, server = _start_server(tmp_path)
+    statuses = []
+    try:
+        for length in ['Content-Length: abc\r\n', 'Content-Length: -5\r\n', '']:
+            with socket.create_connection(('127.0.0.1', handler.special_stream.port), timeout=5) as sock:
+                sock.sendall(('POST /sessions/a HTTP/1.1\r\nHost: test\r\n%s\r\nHello' % length).encode('latin-1'))
+                fd = sock.makefile('rb')
+                statuses.append(_read_response(fd)[0])
+                assert fd.read() == b''  # closed after the error
+        with socket.create_connection(('127.0.0.1', handler.special_stream.port), timeout=5) as sock:
+            sock.sendall(_request('GET', '/health', headers='Connection: close\r\n'))
+            assert _read_response(sock.makefile('rb'))[0] == 200  # the server still works
+    finally:
+        handler.special_stream.stop()
+        server.join(5)
+    assert statuses == [400, 400, 411]
@@ -0,0 +1,68 @@
+import threading
+from types import SimpleNamespace
+
+from .conversation_handler import ConversationHandler
+
+
+class StubMessage:
+    def __init__(self, text):
+        self.text = text
+        self.replies = []
+        self.replied = threading.Event()
+
+    def reply_text(self, text):
+        self.replies.append(text)
+        self.replied.set()
+
+
+class StubUpdater:
+    """Local stand-in for telegram.ext.Updater."""
+
+    def __init__(self):
+        self.dispatcher = self
+        self.handlers = []
+        self.polling = threading.Event()
+
+    def add_handler(self, handler):
+        self.handlers.append(handler)
+
+    def start_polling(self):
+        self.polling.set()
+
+    def stop(self):
+        self.polling.clear()
+
+    def send(self, chat_id, text):
+        message = StubMessage(text)
+        update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=chat_id))
+        for handler in self.handlers:
+            handler.callback(update, None)
+        return message
+
+
+def test_chats_are_separate_dialogues(tmp_path):
+    updater = StubUpdater()
+    handler = ConversationHandler({
+        'special_stream_type': 'dialmonkey.telegram_IO.TelegramIO',
+        'telegram': {'workers': 2},
+        'updater': updater,
+        'history_fn': str(tmp_path / 'history.json'),
+        'components': ['dialmonkey.nlu.dummy.DummyNLU', 'dialmonkey.policy.dummy.ReplyWithNLU'],
+        'break_words': ['quit'],
+    })
+    server = threading.Thread(target=handler.main_loop)
+    server.start()
+    assert updater.polling.wait(5)
+
+    messages = [updater.send(1, 'Hello'), updater.send(2, 'bye'), updater.send(1, 'quit'),
+                updater.send(2, 'ok')]
+    for message in messages:
+        assert message.replied.wait(5)
+    assert [m.replies for m in messages] == [['greet()'], ['goodbye()'], ['<EMPTY>'], ['<EMPTY>']]
+
+    handler.special_stream.stop()
+    server.join(5)
+    assert not server.is_alive()
+    users = sorted([turn['user'] for turn in dialogue] for dialogue in handler.history)
+    assert users == [['bye', 'ok'], ['hello', 'quit']]
+    assert (tmp_path / 'history.json').exists()
@@ -3,6 +3,10 @@
 import logging
 import pydoc
 import random
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
 from typing import TypeVar, List, Callable
 
 import yaml
@@ -110,6 +114,76 @@ class dotdict(dict):
     __delattr__ = dict.__delitem__
 
 
+_MISSING = object()
+
+
+def required_literals(pattern: str) -> frozenset:
+    """
+    Literal strings that every match of the regex contains (sequences of plain characters
+    outside of alternatives, repetitions and classes), used to skip regexes that cannot match.
+    :param pattern: the regex
+    :return: set of the required literals (longer than one non-space character)
+    """
+    literals, current = [], []
+    def flush():
+        if len(''.join(current).strip()) > 1: literals.append(''.join(current))
+        current.clear()
+    def walk(items):
+        for op, av in items:
+            if op is sre_parse.LITERAL: current.append(chr(av))
+            elif op is sre_parse.SUBPATTERN: walk(av[-1]) # a plain group is matched exactly once
+            else: flush()
+    walk(sre_parse.parse(pattern))
+    flush()
+    return frozenset(literals)
+
+
+def snapshot(value, previous=None):
+    """
+    Creates a read-only copy of a (nested) state dictionary that shares structure with the
+    previous snapshot. Every sub-dictionary whose contents did not change since `previous`
+    is reused as is, so a snapshot only costs the slots that changed in between.
+    Snapshots must never be modified in place, since they may be shared among turns.
+    :param value: the current (live) value, typically a dialogue state dict
+    :param previous: snapshot of the same value from the previous turn, if any
+    :return: a dotdict snapshot (or the value itself, if it is not a dict)
+    """
+    if not isinstance(value, dict):
+        return value
+    shared = isinstance(previous, dotdict) and len(previous) == len(value)
+    if not isinstance(previous, dotdict):
+        previous = {}
+    items = {}
+    for key, val in value.items():
+        old = previous.get(key, _MISSING)
+        new = snapshot(val, old) if isinstance(val, dict) else val
+        if new is not old and (type(new) is not type(old) or isinstance(new, dict) or new != old):
+            shared = False
+        else:
+            new = old
+        items[key] = new
+    if shared:
+        return previous
+    result = dotdict()
+    dict.update(result, items)  # children are snapshots already, no need to copy again
+    return result
+
+
+def state_delta(previous, current):
+    """
+    Computes the difference between two state snapshots created by `snapshot`.
+    Relies on structural sharing -- unchanged slots are identical objects, so only
+    identities are compared.
+    :param previous: older snapshot (or None for an empty state)
+    :param current: newer snapshot
+    :return: tuple (dict of added/changed slots, list of removed slots)
+    """
+    previous = previous if previous is not None else {}
+    changed = {k: v for k, v in current.items() if previous.get(k, _MISSING) is not v}
+    removed = [k for k in previous if k not in current]
+    return changed, removed
+
+
 class DialMonkeyFormatter(LogFormatter):
     def __init__(self, path_prefix, *args, **kwargs):
         self.path_prefix = path_prefix